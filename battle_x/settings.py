@@ -167,7 +167,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  
+        'users.middleware.RequestJWTAuthentication',  
         'users.middleware.GuestAuthentication',  
         'rest_framework.authentication.SessionAuthentication',  
         'rest_framework.authentication.TokenAuthentication',
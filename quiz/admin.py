@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Quiz, Category, Item, Question, Option, QuizAttempt, Leaderboard
+from .models import Quiz, Category, Item, Question, Option, QuizAttempt, Leaderboard, QuestionImportJob, QuestionImportChunk
 
 # Register the Option model inline for the Question model
 class OptionInline(admin.TabularInline):
@@ -26,16 +26,12 @@ class QuizAdmin(admin.ModelAdmin):
     readonly_fields = ('total_questions',)  # Make total_questions field readonly
     list_filter = ('created_at', 'updated_at')
 
-    def save_model(self, request, obj, form, change):
-        # Automatically calculate total_questions before saving
-        obj.total_questions = obj.calculate_total_questions()
-        super().save_model(request, obj, form, change)
-
 # Custom admin for Category model
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('title', 'category_type', 'quiz', 'access_mode')
+    list_display = ('title', 'category_type', 'quiz', 'access_mode', 'total_questions')
     list_filter = ('category_type', 'access_mode')
     search_fields = ('title',)
+    readonly_fields = ('total_questions',)
 
 # Custom admin for QuizAttempt model
 class QuizAttemptAdmin(admin.ModelAdmin):
@@ -48,15 +44,28 @@ class LeaderboardAdmin(admin.ModelAdmin):
     list_display = ('user', 'item', 'score', 'rank', 'attempt_date')
     list_filter = ('attempt_date',)
     search_fields = ('user__username', 'item__title')
-
-    def save_model(self, request, obj, form, change):
-        # Update the rank before saving the leaderboard entry
-        obj.rank = obj.calculate_rank()
-        super().save_model(request, obj, form, change)
+    # Maintained by Leaderboard.save
+    readonly_fields = ('rank',)
 
 
 class OptionAdmin(admin.ModelAdmin):
     list_display =('option_text', 'is_correct')
+
+
+class QuestionImportChunkInline(admin.TabularInline):
+    model = QuestionImportChunk
+    extra = 0
+    fields = ('index', 'first_row', 'last_row', 'status', 'rows', 'imported', 'failed', 'error', 'seconds')
+    readonly_fields = fields
+    can_delete = False
+
+
+# Custom admin for background question imports
+class QuestionImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'target_id', 'status', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('started_at', 'finished_at', 'created_at')
+    inlines = [QuestionImportChunkInline]
 # Registering the models with the admin site
 admin.site.register(Quiz, QuizAdmin)
 admin.site.register(Category, CategoryAdmin)
@@ -65,3 +74,4 @@ admin.site.register(Question, QuestionAdmin)
 admin.site.register(Option, OptionAdmin)
 admin.site.register(QuizAttempt, QuizAttemptAdmin)
 admin.site.register(Leaderboard, LeaderboardAdmin)
+admin.site.register(QuestionImportJob, QuestionImportJobAdmin)
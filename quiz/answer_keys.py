@@ -0,0 +1,123 @@
+"""
+Answer-key store shared by quiz and tournament grading.
+
+For each question it keeps the set of correct option ids and the set of all of
+its option ids, so grading a submission is pure set comparison in memory.
+
+Lookups go process-local LRU -> Redis -> one bulk query for whatever is left.
+Every question has a version stamp in the cache; Option/Question save and
+delete signals (quiz/signals.py) replace it, which orphans both cached tiers.
+"""
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Question
+from .utils.lru import LRUCache
+
+AnswerKey = namedtuple('AnswerKey', ['correct_option_ids', 'option_ids'])
+
+ANSWER_KEY_CACHE_TIMEOUT = 60 * 60 * 24
+_local = LRUCache(maxsize=getattr(settings, 'ANSWER_KEY_LRU_SIZE', 20000))
+
+
+def _version_key(question_id):
+    return f"quiz:question:{question_id}:v"
+
+
+def _entry_key(question_id):
+    return f"quiz:answerkey:{question_id}"
+
+
+def question_versions(question_ids):
+    """Current version stamp per question id, creating stamps that are missing."""
+    keys = {_version_key(qid): qid for qid in question_ids}
+    found = cache.get_many(list(keys))
+    versions = {keys[k]: v for k, v in found.items()}
+
+    missing = {_version_key(qid): uuid.uuid4().hex for qid in question_ids if qid not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update({keys[k]: v for k, v in missing.items()})
+    return versions
+
+
+def bump_question_versions(question_ids):
+    """Invalidate cached data for these questions once the current transaction commits."""
+    question_ids = [qid for qid in question_ids if qid is not None]
+    if not question_ids:
+        return
+
+    def bump():
+        cache.set_many({_version_key(qid): uuid.uuid4().hex for qid in question_ids}, None)
+        for qid in question_ids:
+            _local.delete(qid)
+    transaction.on_commit(bump)
+
+
+def _fetch(question_ids):
+    """One LEFT JOIN over questions/options; questions that don't exist are left out."""
+    correct = {}
+    options = {}
+    rows = Question.objects.filter(id__in=question_ids).values_list('id', 'options__id', 'options__is_correct')
+    for question_id, option_id, is_correct in rows:
+        correct.setdefault(question_id, set())
+        options.setdefault(question_id, set())
+        if option_id is None:
+            continue
+        options[question_id].add(option_id)
+        if is_correct:
+            correct[question_id].add(option_id)
+    return {
+        qid: AnswerKey(frozenset(correct[qid]), frozenset(options[qid]))
+        for qid in options
+    }
+
+
+def get_answer_keys(question_ids):
+    """
+    Map question id -> AnswerKey for the given ids. Ids of questions that do not
+    exist are absent from the result. Costs one cache round-trip for the version
+    stamps when everything is warm, and at most one SQL query otherwise.
+    """
+    question_ids = {int(qid) for qid in question_ids}
+    if not question_ids:
+        return {}
+
+    versions = question_versions(question_ids)
+    keys = {}
+
+    remaining = []
+    for qid in question_ids:
+        hit = _local.get(qid)
+        if hit is not None and hit[0] == versions[qid]:
+            keys[qid] = hit[1]
+        else:
+            remaining.append(qid)
+
+    if remaining:
+        cached = cache.get_many([_entry_key(qid) for qid in remaining])
+        still_missing = []
+        for qid in remaining:
+            entry = cached.get(_entry_key(qid))
+            if entry is not None and entry[0] == versions[qid]:
+                key = AnswerKey(frozenset(entry[1]), frozenset(entry[2]))
+                keys[qid] = key
+                _local.set(qid, (versions[qid], key))
+            else:
+                still_missing.append(qid)
+
+        if still_missing:
+            fetched = _fetch(still_missing)
+            cache.set_many({
+                _entry_key(qid): (versions[qid], tuple(key.correct_option_ids), tuple(key.option_ids))
+                for qid, key in fetched.items()
+            }, ANSWER_KEY_CACHE_TIMEOUT)
+            for qid, key in fetched.items():
+                keys[qid] = key
+                _local.set(qid, (versions[qid], key))
+
+    return keys
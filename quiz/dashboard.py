@@ -0,0 +1,193 @@
+"""
+Dashboard payload assembly.
+
+The catalog (quizzes -> categories -> items with their top leaderboard
+entries, tournaments and active puzzles) is the same for every caller of an
+audience: 'anonymous' callers don't see private categories and items,
+'authenticated' callers see everything. It is built from a fixed handful of
+queries and cached per audience under a stamp that catalog writes replace
+(quiz/signals.py), so most requests read it with one cache GET.
+
+Only the caller's attempt overlay is computed per request, with one query.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min, Prefetch
+from django.utils import timezone
+
+from tournaments.models import Tournament
+from wordMaster.models import WordPuzzle
+from .models import LEADERBOARD_ORDERING, Category, Item, Leaderboard, Quiz, QuizAttempt
+from .ranking import Ranking
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60 * 5)
+DASHBOARD_LEADERBOARD_SIZE = 10
+AUDIENCES = ('anonymous', 'authenticated')
+
+_STAMP_KEY = "quiz:dashboard:stamp"
+
+
+def _catalog_key(audience, stamp):
+    return f"quiz:dashboard:{audience}:{stamp}"
+
+
+def invalidate_dashboard():
+    """Orphan both cached catalogs once the current transaction commits."""
+    transaction.on_commit(lambda: cache.set(_STAMP_KEY, uuid.uuid4().hex, None))
+
+
+def _top_entries(item_ids):
+    """item id -> its top leaderboard entries, in one windowed query."""
+    ranking = Ranking(Leaderboard.objects.filter(item_id__in=item_ids), LEADERBOARD_ORDERING, partition_by=['item_id'])
+    rows = (
+        ranking.annotated('position')
+        .filter(position__lte=DASHBOARD_LEADERBOARD_SIZE)
+        .values('item_id', 'user__name', 'score', 'rank')
+    )
+    entries = {}
+    for row in rows:
+        entries.setdefault(row['item_id'], []).append({
+            "user": row['user__name'],
+            "score": row['score'],
+            "rank": row['rank'],
+        })
+    return entries
+
+
+def _build_quizzes(authenticated):
+    categories = Category.objects.order_by('id')
+    items = Item.objects.order_by('id')
+    if not authenticated:
+        categories = categories.exclude(access_mode='private')
+        items = items.exclude(access_mode='private')
+    quizzes = list(Quiz.objects.order_by('id').prefetch_related(
+        Prefetch('categories', queryset=categories),
+        Prefetch('categories__items', queryset=items),
+    ))
+
+    item_ids = [item.id for quiz in quizzes for category in quiz.categories.all() for item in category.items.all()]
+    top_entries = _top_entries(item_ids) if item_ids else {}
+
+    quiz_data = []
+    for quiz in quizzes:
+        filtered_categories = []
+        for category in quiz.categories.all():
+            filtered_items = [
+                {
+                    "item_id": str(item.id),
+                    "item_title": item.title,
+                    "item_subtitle": item.subtitle,
+                    "item_button_label": item.button_label or "Play",
+                    "access_mode": item.access_mode or "public",
+                    "item_type": item.item_type or "default",
+                    "quiz_attempt": None,
+                    "leaderboard": top_entries.get(item.id, []),
+                }
+                for item in category.items.all()
+            ]
+            if filtered_items:
+                filtered_categories.append({
+                    "category_id": str(category.id),
+                    "category_title": category.title,
+                    "category_type": category.category_type or "default",
+                    "access_mode": category.access_mode,
+                    "task_items": filtered_items,
+                })
+
+        quiz_data.append({
+            "quiz_id": str(quiz.id),
+            "quiz_title": quiz.title,
+            "quiz_description": quiz.description,
+            "total_questions": quiz.total_questions,
+            "created_at": quiz.created_at,
+            "updated_at": quiz.updated_at,
+            "categories": filtered_categories,
+        })
+    return quiz_data
+
+
+def _build_catalog(authenticated, now):
+    tournaments = list(Tournament.objects.order_by('-start_date'))
+    catalog = {
+        "quizzes": _build_quizzes(authenticated),
+        "tournaments": [
+            {
+                "id": str(tournament.id),
+                "title": tournament.title,
+                "start_date": tournament.start_date,
+                "end_date": tournament.end_date,
+                "status": tournament.status_at(now),
+            }
+            for tournament in tournaments
+        ],
+        "puzzles": [
+            {
+                "id": puzzle.id,
+                "title": puzzle.title,
+                "banner": puzzle.banner.url if puzzle.banner else None,
+                "start_date": puzzle.start_date,
+                "end_date": puzzle.end_date,
+                "status": puzzle.status,
+            }
+            for puzzle in WordPuzzle.objects.filter(status="active")
+        ],
+    }
+
+    # Tournament statuses follow the clock: expire by the next start/end boundary
+    timeout = DASHBOARD_CACHE_TIMEOUT
+    for tournament in tournaments:
+        for boundary in (tournament.start_date, tournament.end_date):
+            if boundary > now:
+                timeout = min(timeout, (boundary - now).total_seconds())
+    return catalog, max(1, int(timeout))
+
+
+def get_catalog(authenticated):
+    """The cached catalog for an audience, building it on a miss."""
+    audience = AUDIENCES[authenticated]
+    stamp = cache.get(_STAMP_KEY)
+    if stamp is None:
+        stamp = uuid.uuid4().hex
+        cache.add(_STAMP_KEY, stamp, None)
+        stamp = cache.get(_STAMP_KEY, stamp)
+
+    key = _catalog_key(audience, stamp)
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog, timeout = _build_catalog(authenticated, timezone.now())
+        cache.set(key, catalog, timeout)
+    return catalog
+
+
+def _attempt_overlay(user):
+    """item id -> the user's first attempt on it, in one query."""
+    first_attempts = QuizAttempt.objects.filter(user=user).values('item_id').annotate(first_id=Min('id')).values('first_id')
+    rows = QuizAttempt.objects.filter(id__in=first_attempts).values(
+        'item_id', 'total_questions', 'correct_answers', 'wrong_answers', 'score',
+    )
+    return {str(row.pop('item_id')): row for row in rows}
+
+
+def dashboard_data(user):
+    """Quizzes, tournaments and puzzles for this caller, with their attempt overlay."""
+    authenticated = bool(user and getattr(user, "is_authenticated", False))
+    catalog = get_catalog(authenticated)
+    if not authenticated:
+        return catalog
+
+    attempts = _attempt_overlay(user)
+    if not attempts:
+        return catalog
+    quizzes = [
+        {**quiz, "categories": [
+            {**category, "task_items": [
+                {**item, "quiz_attempt": attempts.get(item["item_id"])} for item in category["task_items"]
+            ]}
+            for category in quiz["categories"]
+        ]}
+        for quiz in catalog["quizzes"]
+    ]
+    return {**catalog, "quizzes": quizzes}
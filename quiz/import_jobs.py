@@ -0,0 +1,185 @@
+"""
+Background question import jobs.
+
+An upload is saved to disk as a QuestionImportJob and handed to a small
+process-local thread pool once the creating transaction commits, so the HTTP
+request returns right away. The worker streams the workbook chunk by chunk
+through the job's importer (quiz/question_import.py). Each chunk's
+QuestionImportChunk row is written in the same transaction as its questions,
+so a retry resumes after the last committed chunk and never imports a row
+twice.
+
+Clients poll job_progress() through ImportJobStatusView. Jobs left pending by
+a restarted process are picked up by `python manage.py process_import_jobs`.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import QuestionImportChunk, QuestionImportJob
+from .question_import import read_chunks
+
+logger = logging.getLogger(__name__)
+
+IMPORTERS = {
+    'item': 'quiz.question_import.ItemQuestionImporter',
+    'tournament': 'tournaments.question_import.TournamentQuestionImporter',
+}
+CHUNK_SIZE = getattr(settings, 'QUESTION_IMPORT_CHUNK_SIZE', 1000)
+WORKERS = getattr(settings, 'QUESTION_IMPORT_WORKERS', 2)
+# Cap on failed rows listed in a status response
+MAX_REPORTED_ROW_ERRORS = 100
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='question-import')
+    return _executor
+
+
+def create_job(kind, file, user=None, target_id=None):
+    """Save the upload and queue it for import."""
+    job = QuestionImportJob.objects.create(
+        kind=kind, file=file, target_id=target_id, created_by=user, chunk_size=CHUNK_SIZE,
+    )
+    enqueue(job.pk)
+    return job
+
+
+def enqueue(job_id):
+    transaction.on_commit(lambda: _get_executor().submit(_work, job_id))
+
+
+def _work(job_id):
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception("Question import job %s crashed", job_id)
+    finally:
+        # Worker threads hold their own connections
+        connections.close_all()
+
+
+def retry_job(job):
+    """Re-queue a failed job; chunks that already committed are skipped."""
+    if not QuestionImportJob.objects.filter(pk=job.pk, status='failed').update(status='pending'):
+        raise ValueError("Only failed import jobs can be retried.")
+    enqueue(job.pk)
+
+
+def _process_chunk(job, importer, index, df):
+    started = time.monotonic()
+    first_row, last_row = int(df.index[0]), int(df.index[-1])
+    try:
+        rows, errors = importer.validate(df)
+        with transaction.atomic():
+            imported = importer.write(rows) if rows else 0
+            QuestionImportChunk.objects.update_or_create(job=job, index=index, defaults={
+                'first_row': first_row,
+                'last_row': last_row,
+                'status': 'done',
+                'rows': len(df),
+                'imported': imported,
+                'failed': len(errors),
+                'row_errors': [[error.row, error.message] for error in errors],
+                'error': '',
+                'seconds': time.monotonic() - started,
+            })
+    except Exception as e:
+        logger.exception("Question import job %s: chunk %s failed", job.pk, index)
+        QuestionImportChunk.objects.update_or_create(job=job, index=index, defaults={
+            'first_row': first_row,
+            'last_row': last_row,
+            'status': 'failed',
+            'rows': len(df),
+            'imported': 0,
+            'failed': len(df),
+            'row_errors': [],
+            'error': str(e),
+            'seconds': time.monotonic() - started,
+        })
+
+
+def run_job(job_id):
+    """Import every chunk of a pending job that has not been committed yet."""
+    claimed = QuestionImportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now(), finished_at=None, error='',
+    )
+    if not claimed:
+        return
+
+    job = QuestionImportJob.objects.get(pk=job_id)
+    try:
+        importer = import_string(IMPORTERS[job.kind])(job)
+        done = set(job.chunks.filter(status='done').values_list('index', flat=True))
+        with job.file.open('rb') as file:
+            for index, df in enumerate(read_chunks(file, job.chunk_size)):
+                if index == 0:
+                    missing = [c for c in importer.required_columns if c not in df.columns]
+                    if missing:
+                        raise ValueError("Excel file is missing required columns.")
+                if index not in done:
+                    _process_chunk(job, importer, index, df)
+    except Exception as e:
+        logger.exception("Question import job %s failed", job_id)
+        QuestionImportJob.objects.filter(pk=job_id).update(status='failed', error=str(e), finished_at=timezone.now())
+        return
+
+    status = 'failed' if job.chunks.filter(status='failed').exists() else 'completed'
+    QuestionImportJob.objects.filter(pk=job_id).update(status=status, finished_at=timezone.now())
+    if status == 'completed':
+        # Nothing left to retry
+        job.file.delete(save=False)
+
+
+def job_progress(job):
+    """Status payload for polling: counts, failed rows/chunks and throughput."""
+    totals = job.chunks.aggregate(
+        processed=Sum('rows'),
+        imported=Sum('imported'),
+        failed=Sum('failed'),
+        seconds=Sum('seconds'),
+    )
+    processed = totals['processed'] or 0
+    seconds = totals['seconds'] or 0
+
+    failed_rows = []
+    failed_chunks = []
+    for chunk in job.chunks.filter(Q(status='failed') | Q(failed__gt=0)):
+        if chunk.status == 'failed':
+            failed_chunks.append({
+                "chunk": chunk.index,
+                "first_row": chunk.first_row,
+                "last_row": chunk.last_row,
+                "error": chunk.error,
+            })
+        elif len(failed_rows) < MAX_REPORTED_ROW_ERRORS:
+            failed_rows.extend({"row": row, "error": message} for row, message in chunk.row_errors)
+
+    return {
+        "job_id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "error": job.error,
+        "rows_processed": processed,
+        "rows_imported": totals['imported'] or 0,
+        "rows_failed": totals['failed'] or 0,
+        "failed_rows": failed_rows[:MAX_REPORTED_ROW_ERRORS],
+        "failed_chunks": failed_chunks,
+        "rows_per_second": round(processed / seconds, 1) if seconds else None,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -0,0 +1,11 @@
+from quiz.models import ItemParticipantStats, QuizAttempt
+from users.participant_stats import ParticipantStatsCommand
+
+
+class Command(ParticipantStatsCommand):
+    help = (
+        "Backfill ItemParticipantStats from raw QuizAttempt rows, "
+        "or compare the two with --verify."
+    )
+    model = ItemParticipantStats
+    attempt_model = QuizAttempt
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from quiz.import_jobs import run_job
+from quiz.models import QuestionImportJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Run pending question import jobs in this process, e.g. jobs queued by a "
+        "worker that restarted before picking them up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--job', type=int, action='append', dest='job_ids',
+            help="Import job ID to run (repeatable). A job stuck in 'running' is reset first.",
+        )
+
+    def handle(self, *args, **options):
+        jobs = QuestionImportJob.objects.all()
+        if options['job_ids']:
+            jobs = jobs.filter(pk__in=options['job_ids'])
+            jobs.filter(status='running').update(status='pending')
+
+        for job_id in jobs.filter(status='pending').order_by('created_at').values_list('pk', flat=True):
+            run_job(job_id)
+            job = QuestionImportJob.objects.get(pk=job_id)
+            self.stdout.write(f"Import job {job_id}: {job.status}.")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from quiz.models import Leaderboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored Leaderboard ranks with a window function. Saves keep "
+        "ranks current; this repairs rows written before that or by raw SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--item', type=int, action='append', dest='item_ids',
+            help="Item ID to rebuild (repeatable). Defaults to every item with entries.",
+        )
+        parser.add_argument(
+            '--missing', action='store_true',
+            help="Only rebuild items that have entries without a stored rank.",
+        )
+
+    def handle(self, *args, **options):
+        if options['missing']:
+            item_ids = Leaderboard.unranked_item_ids()
+        else:
+            item_ids = options['item_ids'] or (
+                Leaderboard.objects.order_by('item_id').values_list('item_id', flat=True).distinct()
+            )
+        for item_id in item_ids:
+            corrected = Leaderboard.rebuild_ranks(item_id)
+            self.stdout.write(f"Item {item_id}: {corrected} rank(s) corrected.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from quiz.question_counts import recount_questions
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Category.total_questions and Quiz.total_questions from one "
+        "grouped aggregate. Signals keep them current; this repairs drift."
+    )
+
+    def handle(self, *args, **options):
+        categories, quizzes = recount_questions()
+        self.stdout.write(f"Corrected {categories} category and {quizzes} quiz counter(s).")
@@ -84,8 +84,9 @@ class Force200Middleware(MiddlewareMixin):
         try:
             response = self.get_response(request)
 
-            # If response status is 200, return as is
-            if response.status_code == 200:
+            # If response status is 200, return as is. 304 is a successful
+            # ETag revalidation and must keep its status to mean anything.
+            if response.status_code in (200, 304):
                 return response
 
             # Try to access response content
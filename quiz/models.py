@@ -1,8 +1,25 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 User = get_user_model()
-from users.models import UserOpenAccount
-class Quiz(models.Model):
+from users.models import ParticipantStats, UserOpenAccount
+from .ranking import Ranking
+class MaintainedQuestionCount:
+    """
+    total_questions is kept current with F() updates (quiz/question_counts.py),
+    so a plain save of an existing row must not write back a stale copy.
+    """
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'total_questions'
+            ]
+        super().save(*args, **kwargs)
+
+
+class Quiz(MaintainedQuestionCount, models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     total_questions = models.PositiveIntegerField(default=0)
@@ -17,14 +34,10 @@ class Quiz(models.Model):
         return self.title
 
     def calculate_total_questions(self):
-        """Calculate the total number of questions in the quiz and return the value."""
-        total_questions = 0
-        for category in self.categories.all():  # Access categories related to the quiz
-            for item in category.items.all():  # Access items related to the category
-                total_questions += item.questions.count()  # Count questions in each item
-        return total_questions or 0
-
-class Category(models.Model):
+        """Count the quiz's item/question links with one aggregate query."""
+        return Item.questions.through.objects.filter(item__category__quiz=self).count()
+
+class Category(MaintainedQuestionCount, models.Model):
     title = models.CharField(max_length=200)
     category_type = models.CharField(max_length=100, choices=[
         ('default', 'Default'),
@@ -37,12 +50,9 @@ class Category(models.Model):
         ('public', 'Public'),
         ('private', 'Private'),
     ], default='public')
-    
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.quiz:
-            self.quiz.calculate_total_questions()
+    # Item/question links in this category, maintained by quiz/question_counts.py
+    total_questions = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.title
 
@@ -113,6 +123,34 @@ class QuizAttempt(models.Model):
 
 
 
+class ItemParticipantStats(ParticipantStats):
+    """
+    Running per-participant totals over every QuizAttempt on an item.
+
+    Maintained incrementally by SubmitAnswersView so the item leaderboards are
+    a single indexed read. Rebuild or verify against QuizAttempt with
+    `manage.py backfill_item_stats`.
+    """
+    scope = 'item'
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='participant_stats')
+
+    class Meta:
+        verbose_name = "Item Participant Stats"
+        verbose_name_plural = "Item Participant Stats"
+        unique_together = ('item', 'participant')
+        indexes = [
+            models.Index(
+                fields=['item', '-total_score', 'attempts', 'first_attempt_date'],
+                name='quiz_item_stats_rank_idx',
+            ),
+        ]
+
+
+# Highest score first, earliest entry first among equal scores
+LEADERBOARD_ORDERING = ['-score', 'attempt_date', 'id']
+
+
 class Leaderboard(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     item = models.ForeignKey(Item, on_delete=models.CASCADE)  # Or Quiz if you want leaderboard at quiz level
@@ -126,18 +164,141 @@ class Leaderboard(models.Model):
     class Meta:
         # Optional: You can order the leaderboard by score and attempt date (descending order)
         ordering = ['-score', 'attempt_date']
+        indexes = [
+            # Counting the rows ahead of an entry, and shifting a rank range
+            models.Index(fields=['item', '-score', 'attempt_date', 'id'], name='quiz_lb_order_idx'),
+            models.Index(fields=['item', 'rank'], name='quiz_lb_item_rank_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        # Update rank based on the score before saving
-        self.rank = self.calculate_rank()
-        super().save(*args, **kwargs)
+        """
+        Save and keep every stored rank in the item correct. Only the rows
+        between the entry's old and new position are shifted, with one UPDATE.
+        """
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Leaderboard.objects.filter(pk=self.pk).values('item_id', 'rank').first()
+            items = {self.item_id} | ({previous['item_id']} if previous else set())
+            # Serializes rank writes per item
+            list(Item.objects.select_for_update().filter(pk__in=items).order_by('pk').values_list('pk', flat=True))
+
+            old_rank = None
+            if previous and previous['item_id'] != self.item_id:
+                self._close_gap(previous['item_id'], previous['rank'])
+            elif previous:
+                old_rank = previous['rank']
+
+            super().save(*args, **kwargs)
+
+            others = Leaderboard.objects.filter(item_id=self.item_id).exclude(pk=self.pk)
+            if (previous and old_rank is None and previous['item_id'] == self.item_id) or (
+                others.filter(rank__isnull=True).exists()
+            ):
+                # The item has rows without a stored rank (written before ranks were
+                # maintained), so there is nothing to shift from: rank it from scratch
+                Leaderboard.rebuild_ranks(self.item_id)
+                self.rank = Leaderboard.objects.filter(pk=self.pk).values_list('rank', flat=True).get()
+                return
+
+            new_rank = self.calculate_rank()
+            if old_rank is None:
+                others.filter(rank__gte=new_rank).update(rank=F('rank') + 1)
+            elif new_rank < old_rank:
+                others.filter(rank__gte=new_rank, rank__lt=old_rank).update(rank=F('rank') + 1)
+            elif new_rank > old_rank:
+                others.filter(rank__gt=old_rank, rank__lte=new_rank).update(rank=F('rank') - 1)
+            if new_rank != self.rank:
+                Leaderboard.objects.filter(pk=self.pk).update(rank=new_rank)
+                self.rank = new_rank
+
+    @staticmethod
+    def _close_gap(item_id, rank):
+        if rank is not None:
+            Leaderboard.objects.filter(item_id=item_id, rank__gt=rank).update(rank=F('rank') - 1)
 
     def calculate_rank(self):
-        """Calculate the rank based on score and attempt_date."""
-        all_scores = Leaderboard.objects.filter(item=self.item).order_by('-score', 'attempt_date')
-        rank = 1
-        for idx, entry in enumerate(all_scores):
-            if entry.user == self.user:
-                rank = idx + 1
-                break
-        return rank
+        """Position of this entry in its item, counted from the rows that sort ahead of it."""
+        ranking = Ranking(Leaderboard.objects.filter(item_id=self.item_id), LEADERBOARD_ORDERING)
+        return ranking.rank_for({'score': self.score, 'attempt_date': self.attempt_date, 'id': self.pk})
+
+    @classmethod
+    def rebuild_ranks(cls, item_id):
+        """Rewrite an item's stored ranks from scratch. Returns the number of rows corrected."""
+        ranked = Ranking(cls.objects.filter(item_id=item_id), LEADERBOARD_ORDERING).annotated('position')
+        stale = [
+            cls(pk=pk, rank=position)
+            for pk, rank, position in ranked.values_list('pk', 'rank', 'position')
+            if rank != position
+        ]
+        cls.objects.bulk_update(stale, ['rank'], batch_size=1000)
+        return len(stale)
+
+    @classmethod
+    def unranked_item_ids(cls):
+        """Items with at least one entry that has no stored rank."""
+        unranked = cls.objects.filter(rank__isnull=True).order_by('item_id')
+        return list(unranked.values_list('item_id', flat=True).distinct())
+
+
+class QuestionImportJob(models.Model):
+    """An uploaded question workbook, imported in the background by quiz/import_jobs.py."""
+    KIND_CHOICES = [
+        ('item', 'Item Questions'),
+        ('tournament', 'Tournament Questions'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Tournament ID for tournament imports; item imports name their item per row
+    target_id = models.PositiveIntegerField(null=True, blank=True)
+    file = models.FileField(upload_to='question_imports/')
+    chunk_size = models.PositiveIntegerField(default=1000)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} import #{self.pk} ({self.status})"
+
+
+class QuestionImportChunk(models.Model):
+    """
+    Outcome of one chunk of an import job. A chunk's row is written in the same
+    transaction as its questions, so retrying a job skips every 'done' chunk.
+    """
+    STATUS_CHOICES = [
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    job = models.ForeignKey(QuestionImportJob, related_name='chunks', on_delete=models.CASCADE)
+    index = models.PositiveIntegerField()
+    first_row = models.PositiveIntegerField()
+    last_row = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    rows = models.PositiveIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # [[sheet row number, message], ...] for rows that failed validation
+    row_errors = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    seconds = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('job', 'index')
+        ordering = ['index']
+
+    def __str__(self):
+        return f"Import #{self.job_id} chunk {self.index} ({self.status})"
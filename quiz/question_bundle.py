@@ -0,0 +1,121 @@
+"""
+Whole-item question bundles for offline play.
+
+A bundle is every question and option of an item in one response, in the
+item's question index order (quiz/question_index.py), laid out column-wise so
+keys aren't repeated per question:
+
+    questions: {"id": [...], "question": [...], "answer_count": [...]}
+    answers:   {"id": [...], "answer": [...], "is_true": [...]}
+
+The answers of question i are the next answer_count[i] entries of `answers`.
+
+The ETag is derived from the item's index stamp and its questions' version
+stamps, so it can be checked without building the body. Encoded bodies (plain,
+gzip and, when the brotli package is installed, br) are cached under it. Each
+encoding is a different byte sequence, so the tag sent with an encoded body
+carries the encoding as a suffix (encoded_etag()).
+"""
+import gzip
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .answer_keys import question_versions
+from .question_index import QUESTION_INDEX_CACHE_TIMEOUT, question_payloads
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def bundle_etag(index):
+    """Strong ETag for the item's current questions."""
+    versions = question_versions(index.question_ids)
+    digest = hashlib.sha1(index.stamp.encode())
+    for qid in index.question_ids:
+        digest.update(f":{qid}={versions[qid]}".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def encoded_etag(etag, encoding):
+    """The strong ETag of the bundle body in `encoding`."""
+    if encoding == 'identity':
+        return etag
+    return f'"{etag.strip(chr(34))}-{encoding}"'
+
+
+def _bundle_key(etag, encoding):
+    return f"quiz:bundle:{etag.strip(chr(34))}:{encoding}"
+
+
+def build_bundle(item_id, index):
+    payloads = question_payloads(index.question_ids)
+    questions = {"id": [], "question": [], "answer_count": []}
+    answers = {"id": [], "answer": [], "is_true": []}
+    for qid in index.question_ids:
+        payload = payloads.get(qid)
+        if payload is None:
+            continue
+        questions["id"].append(qid)
+        questions["question"].append(payload["question"])
+        questions["answer_count"].append(len(payload["answer_set"]))
+        for answer in payload["answer_set"]:
+            answers["id"].append(int(answer["answer_id"]))
+            answers["answer"].append(answer["answer"])
+            answers["is_true"].append(1 if answer["is_true"] else 0)
+    return {
+        "item_id": item_id,
+        "category_id": index.category_id,
+        "questions": questions,
+        "answers": answers,
+    }
+
+
+def choose_encoding(accept_encoding):
+    """Best supported Content-Encoding for an Accept-Encoding header, or 'identity'."""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return 'identity'
+
+
+def encoded_bundle(item_id, index, etag, encoding):
+    """The response body for this ETag in the given encoding, built once per ETag."""
+    key = _bundle_key(etag, encoding)
+    body = cache.get(key)
+    if body is not None:
+        return body
+
+    plain = cache.get(_bundle_key(etag, 'identity'))
+    if plain is None:
+        plain = json.dumps({
+            "type": "success",
+            "message": "Question bundle fetched successfully.",
+            "data": build_bundle(item_id, index),
+        }, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        cache.set(_bundle_key(etag, 'identity'), plain, QUESTION_INDEX_CACHE_TIMEOUT)
+
+    if encoding == 'gzip':
+        body = gzip.compress(plain, mtime=0)
+    elif encoding == 'br':
+        body = brotli.compress(plain)
+    else:
+        return plain
+    cache.set(key, body, QUESTION_INDEX_CACHE_TIMEOUT)
+    return body
@@ -0,0 +1,90 @@
+"""
+Maintained question counters: Category.total_questions and Quiz.total_questions.
+
+A counter is the number of item/question links under the category or quiz (a
+question linked to two items counts twice). Item.questions changes, question
+and item deletes and item/category moves shift the counters with F()
+updates (quiz/signals.py); bulk imports call shift_question_counts()
+themselves. recount_questions() rebuilds every counter from one grouped
+aggregate. It runs after every migrate (quiz/signals.py), which backfills
+counters added to existing rows, and on demand with
+`python manage.py recount_questions`.
+
+Decrements are clamped at 0, so a counter that has drifted low can't make the
+UPDATE fail on the unsigned column.
+"""
+from collections import Counter
+
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Category, Item, Quiz
+
+
+def _apply(model, deltas):
+    # One UPDATE per distinct delta rather than per row
+    by_delta = {}
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(pk)
+    for delta, pks in by_delta.items():
+        if delta > 0:
+            total = F('total_questions') + delta
+        else:
+            # GREATEST first: subtracting past 0 is an error on an unsigned column
+            total = Greatest(F('total_questions'), -delta) + delta
+        model.objects.filter(pk__in=pks).update(total_questions=total)
+
+
+def shift_category_counts(category_deltas):
+    """Apply {category id: delta} to the categories and their quizzes."""
+    category_deltas = {cid: delta for cid, delta in category_deltas.items() if cid is not None and delta}
+    if not category_deltas:
+        return
+    quiz_deltas = Counter()
+    for cid, quiz_id in Category.objects.filter(pk__in=list(category_deltas)).values_list('pk', 'quiz_id'):
+        quiz_deltas[quiz_id] += category_deltas[cid]
+    _apply(Category, category_deltas)
+    shift_quiz_counts(quiz_deltas)
+
+
+def shift_quiz_counts(quiz_deltas):
+    """Apply {quiz id: delta} to the quizzes."""
+    _apply(Quiz, {qid: delta for qid, delta in quiz_deltas.items() if qid is not None and delta})
+
+
+def shift_question_counts(item_deltas):
+    """Apply {item id: change in linked questions} to the items' categories and quizzes."""
+    item_deltas = {iid: delta for iid, delta in item_deltas.items() if delta}
+    if not item_deltas:
+        return
+    category_deltas = Counter()
+    for iid, category_id in Item.objects.filter(pk__in=list(item_deltas)).values_list('pk', 'category_id'):
+        category_deltas[category_id] += item_deltas[iid]
+    shift_category_counts(category_deltas)
+
+
+def recount_questions():
+    """Recompute every counter. Returns (categories, quizzes) corrected."""
+    rows = (
+        Item.questions.through.objects
+        .values('item__category_id', 'item__category__quiz_id')
+        .annotate(links=Count('id'))
+        .order_by()
+    )
+    category_totals = {}
+    quiz_totals = Counter()
+    for row in rows:
+        category_totals[row['item__category_id']] = row['links']
+        quiz_totals[row['item__category__quiz_id']] += row['links']
+
+    corrected = []
+    for model, totals in ((Category, category_totals), (Quiz, quiz_totals)):
+        stale = [
+            model(pk=pk, total_questions=totals.get(pk, 0))
+            for pk, current in model.objects.values_list('pk', 'total_questions')
+            if current != totals.get(pk, 0)
+        ]
+        model.objects.bulk_update(stale, ['total_questions'], batch_size=1000)
+        corrected.append(len(stale))
+    return tuple(corrected)
@@ -0,0 +1,188 @@
+"""
+Streaming Excel question import shared by the item and tournament uploads.
+
+read_chunks() streams a workbook with openpyxl in read-only mode and yields
+DataFrames of up to `chunk_size` rows indexed by their sheet row number.
+An importer validates a chunk column-wise and writes it with one bulk insert
+per table; quiz/import_jobs.py drives importers chunk by chunk.
+
+Importer interface:
+    required_columns        normalized header names the sheet must have
+    validate(df)            -> (rows, [RowError, ...])
+    write(rows)             -> number of questions created
+"""
+from collections import Counter, namedtuple
+
+import pandas as pd
+from django.db import transaction
+from openpyxl import load_workbook
+
+from .models import Category, Item, Option, Question
+from .dashboard import invalidate_dashboard
+from .question_counts import shift_question_counts
+from .question_index import invalidate_item_index
+from .utils.bulk import bulk_create_with_ids
+
+RowError = namedtuple('RowError', ['row', 'message'])
+
+
+def normalize_header(value):
+    return str(value if value is not None else '').strip().lower().replace(' ', '').replace('_', '')
+
+
+def read_chunks(file, chunk_size):
+    """Yield DataFrames of up to chunk_size non-blank rows, indexed by their sheet row number."""
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"Could not read Excel file. Ensure it's a valid .xlsx format. Error: {e}")
+
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [normalize_header(value) for value in header]
+        width = len(columns)
+
+        records, row_numbers = [], []
+        for row_num, row in enumerate(rows, start=2):
+            if all(value is None for value in row):
+                continue
+            records.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            row_numbers.append(row_num)
+            if len(records) >= chunk_size:
+                yield pd.DataFrame.from_records(records, columns=columns, index=row_numbers)
+                records, row_numbers = [], []
+        if records:
+            yield pd.DataFrame.from_records(records, columns=columns, index=row_numbers)
+    finally:
+        workbook.close()
+
+
+def text_column(df, *names):
+    """First present column among `names` as stripped strings, blanks as NA."""
+    result = pd.Series(pd.NA, index=df.index, dtype='string')
+    for name in names:
+        if name in df.columns:
+            column = df[name]
+            if isinstance(column, pd.DataFrame):  # duplicated header
+                column = column.iloc[:, 0]
+            values = column.astype('string').str.strip()
+            result = result.fillna(values.mask(values == ''))
+    return result
+
+
+def id_column(df, name):
+    """Column as nullable integers; anything that isn't a whole number becomes NA."""
+    numbers = pd.to_numeric(text_column(df, name), errors='coerce')
+    return numbers.where(numbers == numbers.round()).astype('Int64')
+
+
+def first_errors(index, failures):
+    """
+    Turn [(mask, message_fn), ...] into RowErrors, reporting only the first
+    failing check per row. Returns (errors, failed_mask).
+    """
+    errors = []
+    failed = pd.Series(False, index=index)
+    for mask, message in failures:
+        mask = mask.fillna(True) & ~failed
+        errors.extend(RowError(row, message(row)) for row in mask[mask].index)
+        failed |= mask
+    errors.sort()
+    return errors, failed
+
+
+class ItemQuestionImporter:
+    """
+    Questions for quiz items. Columns: question, subject (item ID), category
+    (category ID), options_num, option1..optionN, answer. Options are read up
+    to the first empty option column; answer is a comma-separated list of
+    option texts or 'optionN' references.
+    """
+    required_columns = (
+        'question', 'subject', 'category', 'optionsnum',
+        'option1', 'option2', 'option3', 'option4', 'answer',
+    )
+
+    def __init__(self, job):
+        self.job = job
+
+    def _option_columns(self, df):
+        count = 0
+        while f'option{count + 1}' in df.columns:
+            count += 1
+        return [text_column(df, f'option{i}') for i in range(1, count + 1)]
+
+    def validate(self, df):
+        question = text_column(df, 'question')
+        item_id = id_column(df, 'subject')
+        category_id = id_column(df, 'category')
+        answer = text_column(df, 'answer').fillna('')
+        options = self._option_columns(df)
+
+        # One query each for the categories and items named in this chunk
+        categories = dict(Category.objects.filter(
+            id__in=category_id.dropna().unique().tolist()
+        ).values_list('id', 'title'))
+        items = dict(Item.objects.filter(
+            id__in=item_id.dropna().unique().tolist()
+        ).values_list('id', 'category_id'))
+
+        category_found = category_id.map(lambda cid: cid in categories, na_action='ignore').fillna(False).astype(bool)
+        item_in_category = pd.Series(
+            [items.get(iid) == cid for iid, cid in zip(item_id.fillna(-1), category_id.fillna(-1))],
+            index=df.index,
+        )
+
+        errors, failed = first_errors(df.index, [
+            (~category_found, lambda row: f"Category with ID {df.at[row, 'category']} not found."),
+            (~item_in_category, lambda row: (
+                f"Item with ID {df.at[row, 'subject']} in Category {categories[category_id[row]]} not found."
+            )),
+            (question.isna(), lambda row: "'Question' column is missing or empty."),
+        ])
+
+        rows = []
+        for row in failed[~failed].index:
+            texts = []
+            for column in options:
+                if pd.isna(column[row]):
+                    break
+                texts.append(column[row])
+
+            correct = set()
+            for ans in (a.strip().lower() for a in answer[row].split(',') if a.strip()):
+                if ans.startswith('option') and ans[6:].isdigit():
+                    idx = int(ans[6:]) - 1
+                    if 0 <= idx < len(texts):
+                        correct.add(texts[idx].capitalize())
+                else:
+                    correct.add(ans.capitalize())
+
+            # Same text twice collapses into one option, like update_or_create did
+            by_text = {}
+            for text in texts:
+                by_text[text.capitalize()] = text.capitalize() in correct
+            rows.append((int(item_id[row]), question[row], list(by_text.items())))
+        return rows, errors
+
+    def write(self, rows):
+        with transaction.atomic():
+            questions = bulk_create_with_ids(Question, [Question(question_text=text) for _, text, _ in rows])
+            Option.objects.bulk_create([
+                Option(question_id=question.pk, option_text=option_text, is_correct=is_correct)
+                for question, (_, _, options) in zip(questions, rows)
+                for option_text, is_correct in options
+            ])
+            through = Item.questions.through
+            through.objects.bulk_create([
+                through(item_id=item_id, question_id=question.pk)
+                for question, (item_id, _, _) in zip(questions, rows)
+            ])
+            # Bulk inserts send no m2m_changed
+            invalidate_item_index({item_id for item_id, _, _ in rows})
+            shift_question_counts(Counter(item_id for item_id, _, _ in rows))
+            invalidate_dashboard()
+        return len(questions)
@@ -0,0 +1,151 @@
+"""
+Ordered question index for item quizzes.
+
+An item's index is its category id plus its question ids, ordered by the M2M
+through row so the order is stable and new questions are appended. It is
+cached under a stamp that changes on every edit of the item or its question
+list (quiz/signals.py), and kept in process memory once loaded, so serving a
+question step costs one cache GET for the stamp.
+
+Question payloads (text plus answer set) are cached per question under the
+version stamps from quiz/answer_keys.py, which Option/Question writes replace.
+"""
+import threading
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .answer_keys import question_versions
+from .models import Item, Question
+from .utils.lru import LRUCache
+
+ItemIndex = namedtuple('ItemIndex', ['stamp', 'category_id', 'question_ids'])
+
+QUESTION_INDEX_CACHE_TIMEOUT = 60 * 60 * 24
+
+_local_indexes = {}
+_local_lock = threading.Lock()
+_local_payloads = LRUCache(maxsize=getattr(settings, 'QUESTION_PAYLOAD_LRU_SIZE', 5000))
+
+
+def _stamp_key(item_id):
+    return f"quiz:item:{item_id}:questions:stamp"
+
+
+def _index_key(item_id):
+    return f"quiz:item:{item_id}:questions"
+
+
+def _payload_key(question_id):
+    return f"quiz:question:{question_id}:payload"
+
+
+def get_item_index(item_id):
+    """The item's ItemIndex, or None if there is no such item."""
+    stamp = cache.get(_stamp_key(item_id))
+
+    local = _local_indexes.get(item_id)
+    if stamp is not None and local is not None and local.stamp == stamp:
+        return local
+
+    index = None
+    if stamp is not None:
+        cached = cache.get(_index_key(item_id))
+        if cached and cached[0] == stamp:
+            index = ItemIndex(*cached)
+
+    if index is None:
+        category_id = Item.objects.filter(pk=item_id).values_list('category_id', flat=True).first()
+        if category_id is None:
+            return None
+        if stamp is None:
+            cache.add(_stamp_key(item_id), uuid.uuid4().hex, None)
+            stamp = cache.get(_stamp_key(item_id))
+        question_ids = tuple(
+            Item.questions.through.objects
+            .filter(item_id=item_id)
+            .order_by('id')
+            .values_list('question_id', flat=True)
+        )
+        index = ItemIndex(stamp, category_id, question_ids)
+        cache.set(_index_key(item_id), tuple(index), QUESTION_INDEX_CACHE_TIMEOUT)
+
+    with _local_lock:
+        _local_indexes[item_id] = index
+    return index
+
+
+def invalidate_item_index(item_ids):
+    """Call after changing items or their question lists."""
+    item_ids = [iid for iid in item_ids if iid is not None]
+    if not item_ids:
+        return
+
+    def bump():
+        cache.set_many({_stamp_key(iid): uuid.uuid4().hex for iid in item_ids}, None)
+    transaction.on_commit(bump)
+
+
+def _build_payloads(question_ids):
+    questions = Question.objects.filter(id__in=question_ids).prefetch_related('options')
+    return {
+        question.id: {
+            "question_id": str(question.id),
+            "question": question.question_text,
+            "answer_set": [
+                {
+                    "answer_id": str(option.id),
+                    "answer": option.option_text,
+                    "is_true": option.is_correct,
+                }
+                for option in sorted(question.options.all(), key=lambda option: option.id)
+            ],
+        }
+        for question in questions
+    }
+
+
+def question_payloads(question_ids):
+    """
+    Map question id -> response payload. Ids of questions that no longer exist
+    are absent. Costs one cache round-trip for the version stamps when warm.
+    """
+    question_ids = list(question_ids)
+    if not question_ids:
+        return {}
+
+    versions = question_versions(question_ids)
+    payloads = {}
+
+    remaining = []
+    for qid in question_ids:
+        hit = _local_payloads.get(qid)
+        if hit is not None and hit[0] == versions[qid]:
+            payloads[qid] = hit[1]
+        else:
+            remaining.append(qid)
+
+    if remaining:
+        cached = cache.get_many([_payload_key(qid) for qid in remaining])
+        still_missing = []
+        for qid in remaining:
+            entry = cached.get(_payload_key(qid))
+            if entry is not None and entry[0] == versions[qid]:
+                payloads[qid] = entry[1]
+                _local_payloads.set(qid, entry)
+            else:
+                still_missing.append(qid)
+
+        if still_missing:
+            fetched = _build_payloads(still_missing)
+            cache.set_many({
+                _payload_key(qid): (versions[qid], payload) for qid, payload in fetched.items()
+            }, QUESTION_INDEX_CACHE_TIMEOUT)
+            for qid, payload in fetched.items():
+                payloads[qid] = payload
+                _local_payloads.set(qid, (versions[qid], payload))
+
+    return payloads
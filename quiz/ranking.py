@@ -0,0 +1,136 @@
+"""
+Leaderboard ranking pushed down to the database.
+
+A Ranking wraps a queryset (plain rows or a values().annotate() aggregate),
+an ordering and a rank method:
+
+    row_number  every row gets its own position (ties broken by the full ordering)
+    rank        rows equal on the tie columns share a rank, with gaps after (1, 1, 3)
+    dense_rank  rows equal on the tie columns share a rank, without gaps (1, 1, 2)
+
+`tie_columns` is how many leading ordering columns define a tie for rank and
+dense_rank; the rest only order rows inside a tie.
+
+page() annotates the rank with a window function (RANK() / DENSE_RANK() /
+ROW_NUMBER() OVER ...) and returns just the requested slice. rank_of() returns
+one participant's rank by counting the rows that sort ahead of it, so neither
+loads the whole leaderboard into Python.
+
+NULLs sort first in ascending order, as in MySQL.
+"""
+import operator
+from functools import reduce
+
+from django.db.models import F, Q, Window
+from django.db.models.functions import DenseRank, Rank, RowNumber
+
+RANK_FUNCTIONS = {
+    'row_number': RowNumber,
+    'rank': Rank,
+    'dense_rank': DenseRank,
+}
+
+
+def parse_ordering(ordering):
+    return [(name[1:], True) if name.startswith('-') else (name, False) for name in ordering]
+
+
+def _expression(field, descending):
+    return F(field).desc() if descending else F(field).asc()
+
+
+def _equal(field, value):
+    return Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+
+
+def _ahead(field, descending, value):
+    """Rows whose `field` sorts strictly before `value`, or None if none can."""
+    if descending:
+        return Q(**{f'{field}__isnull': False}) if value is None else Q(**{f'{field}__gt': value})
+    if value is None:
+        return None
+    return Q(**{f'{field}__isnull': True}) | Q(**{f'{field}__lt': value})
+
+
+def ahead_of(columns, values):
+    """
+    Lexicographic "sorts before" over (field, descending) columns, or None
+    when nothing can sort before `values`.
+    """
+    conditions = []
+    equal_so_far = Q()
+    for field, descending in columns:
+        ahead = _ahead(field, descending, values[field])
+        if ahead is not None:
+            conditions.append(equal_so_far & ahead)
+        equal_so_far &= _equal(field, values[field])
+    return reduce(operator.or_, conditions) if conditions else None
+
+
+class Ranking:
+    def __init__(self, queryset, ordering, method='row_number', tie_columns=1, partition_by=None):
+        if method not in RANK_FUNCTIONS:
+            raise ValueError(f"Unknown rank method '{method}'.")
+        self.queryset = queryset
+        self.columns = parse_ordering(ordering)
+        self.method = method
+        self.tie_columns = len(self.columns) if method == 'row_number' else tie_columns
+        self.partition_by = partition_by
+
+    @property
+    def ordering(self):
+        return [_expression(field, descending) for field, descending in self.columns]
+
+    def annotated(self, name='rank'):
+        """The queryset with a `name` rank annotation, in leaderboard order."""
+        window_order = self.ordering if self.method == 'row_number' else self.ordering[:self.tie_columns]
+        window = Window(
+            RANK_FUNCTIONS[self.method](),
+            partition_by=[F(field) for field in self.partition_by] if self.partition_by else None,
+            order_by=window_order,
+        )
+        ordering = ([F(field).asc() for field in self.partition_by] if self.partition_by else []) + self.ordering
+        return self.queryset.annotate(**{name: window}).order_by(*ordering)
+
+    def page(self, offset=0, limit=None):
+        ranked = self.annotated()
+        return ranked[offset:offset + limit] if limit is not None else ranked[offset:]
+
+    def top(self, n):
+        return self.page(0, n)
+
+    def rank_for(self, values):
+        """
+        Rank a row with the given ordering values (a dict keyed by field name)
+        would have. Rows equal on every ordering column count as behind it.
+        """
+        ties = self.columns[:self.tie_columns]
+        condition = ahead_of(ties, values)
+        if condition is None:
+            return 1
+        ahead = self.queryset.filter(condition).order_by()
+        if self.method == 'dense_rank':
+            return ahead.values(*[field for field, _ in ties]).distinct().count() + 1
+        return ahead.count() + 1
+
+    def rank_of(self, **lookup):
+        """Rank of the row matching `lookup`, or None if there is no such row."""
+        # The best-placed matching row, if the lookup matches several
+        rows = self.queryset.filter(**lookup).order_by(*self.ordering).values(*[field for field, _ in self.columns])[:1]
+        if not rows:
+            return None
+        return self.rank_for(rows[0])
+
+
+ITEM_LEADERBOARD_ORDERING = ['-total_score', 'attempts', 'first_attempt_date', 'id']
+
+
+def item_leaderboard(stats, partition_by=None):
+    """
+    Ranking over an ItemParticipantStats queryset (total_score, attempts,
+    first_attempt_date per participant). Rows carry user_id / guest_user_id.
+    """
+    rows = stats.values(
+        'id', 'item_id', 'user_id', 'guest_user_id', 'total_score', 'attempts', 'first_attempt_date',
+    )
+    return Ranking(rows, ITEM_LEADERBOARD_ORDERING, partition_by=partition_by)
@@ -50,7 +50,8 @@ class CategorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Category
-        fields = ['id', 'title','access_mode', 'category_type', 'items', 'quiz']
+        fields = ['id', 'title','access_mode', 'category_type', 'items', 'quiz', 'total_questions']
+        read_only_fields = ['total_questions']
 
     def create(self, validated_data):
         
@@ -0,0 +1,157 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from tournaments.models import Tournament
+from wordMaster.models import WordPuzzle
+from .answer_keys import bump_question_versions
+from .dashboard import invalidate_dashboard
+from .question_counts import recount_questions, shift_category_counts, shift_question_counts, shift_quiz_counts
+from .question_index import invalidate_item_index
+from .models import LEADERBOARD_ORDERING, Category, Item, Leaderboard, Option, Question, Quiz
+from .ranking import ahead_of, parse_ordering
+
+
+@receiver(pre_save, sender=Option)
+def remember_previous_question(sender, instance, **kwargs):
+    # An option moved to another question invalidates both questions
+    if instance.pk:
+        instance._previous_question_id = (
+            Option.objects.filter(pk=instance.pk).values_list('question_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Option)
+@receiver(post_delete, sender=Option)
+def option_changed(sender, instance, **kwargs):
+    bump_question_versions({instance.question_id, getattr(instance, '_previous_question_id', None)})
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    bump_question_versions([instance.pk])
+
+
+@receiver(post_delete, sender=Leaderboard)
+def leaderboard_entry_deleted(sender, instance, **kwargs):
+    # Shift by sort key rather than stored rank, so a bulk delete moves every
+    # remaining row up once per deleted row ahead of it, in any signal order
+    list(Item.objects.select_for_update().filter(pk=instance.item_id).values_list('pk', flat=True))
+    ahead = ahead_of(parse_ordering(LEADERBOARD_ORDERING), {
+        'score': instance.score, 'attempt_date': instance.attempt_date, 'id': instance.pk,
+    })
+    behind = Leaderboard.objects.filter(item_id=instance.item_id, rank__isnull=False)
+    if ahead is not None:
+        behind = behind.exclude(ahead)
+    behind.update(rank=F('rank') - 1)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Leaderboard)
+@receiver(post_delete, sender=Leaderboard)
+@receiver(post_save, sender=Tournament)
+@receiver(post_delete, sender=Tournament)
+@receiver(post_save, sender=WordPuzzle)
+@receiver(post_delete, sender=WordPuzzle)
+def dashboard_catalog_changed(sender, instance, **kwargs):
+    invalidate_dashboard()
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def item_changed(sender, instance, **kwargs):
+    invalidate_item_index([instance.pk])
+
+
+@receiver(m2m_changed, sender=Item.questions.through)
+def item_questions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # remove() reports every pk it was given, clear() none: record the links
+    # that really exist before they go
+    if action in ('pre_remove', 'pre_clear'):
+        linked = instance.items if reverse else instance.questions
+        if action == 'pre_remove':
+            linked = linked.filter(pk__in=pk_set)
+        instance._unlinked_pks = list(linked.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    pks = (pk_set or ()) if action == 'post_add' else getattr(instance, '_unlinked_pks', [])
+    sign = 1 if action == 'post_add' else -1
+    if reverse:
+        # question.items.add/remove/clear(): the pks are item ids
+        item_ids = list(pks)
+        deltas = {item_id: sign for item_id in item_ids}
+    else:
+        item_ids = [instance.pk]
+        deltas = {instance.pk: sign * len(pks)}
+    invalidate_item_index(item_ids)
+    shift_question_counts(deltas)
+    # The cached dashboard catalog shows the question counters
+    invalidate_dashboard()
+
+
+@receiver(pre_delete, sender=Question)
+def question_leaving_items(sender, instance, **kwargs):
+    # The cascade removes through rows without an m2m_changed signal
+    item_ids = list(instance.items.values_list('pk', flat=True))
+    invalidate_item_index(item_ids)
+    shift_question_counts({item_id: -1 for item_id in item_ids})
+    invalidate_dashboard()
+
+
+@receiver(pre_delete, sender=Item)
+def item_leaving_category(sender, instance, **kwargs):
+    # Also covers category and quiz deletes, which cascade to their items
+    shift_question_counts({instance.pk: -instance.questions.count()})
+
+
+@receiver(pre_save, sender=Item)
+@receiver(pre_save, sender=Category)
+def remember_previous_parent(sender, instance, **kwargs):
+    # A moved item or category carries its question count to the new parent
+    if instance.pk:
+        parent = 'category_id' if sender is Item else 'quiz_id'
+        instance._previous_parent_id = sender.objects.filter(pk=instance.pk).values_list(parent, flat=True).first()
+
+
+@receiver(post_save, sender=Item)
+def item_moved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_parent_id', None)
+    if not created and previous is not None and previous != instance.category_id:
+        links = instance.questions.count()
+        shift_category_counts({previous: -links, instance.category_id: links})
+
+
+@receiver(post_save, sender=Category)
+def category_moved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_parent_id', None)
+    if not created and previous is not None and previous != instance.quiz_id:
+        links = Category.objects.filter(pk=instance.pk).values_list('total_questions', flat=True).first() or 0
+        shift_quiz_counts({previous: -links, instance.quiz_id: links})
+
+
+@receiver(post_migrate)
+def backfill_question_counts(sender, **kwargs):
+    # Counters start at 0 on existing rows; recounting after migrate backfills
+    # them and only writes the ones that are off
+    if sender.name != 'quiz':
+        return
+    recount_questions()
+
+
+@receiver(post_migrate)
+def backfill_leaderboard_ranks(sender, **kwargs):
+    # Entries saved before ranks were maintained have rank NULL. Ranking them
+    # here makes the backfill part of every deploy's migrate; once done, this
+    # is a single indexed query.
+    if sender.name != 'quiz':
+        return
+    for item_id in Leaderboard.unranked_item_ids():
+        Leaderboard.rebuild_ranks(item_id)
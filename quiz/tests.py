@@ -1,3 +1,85 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-# Create your tests here.
+from .models import Category, Item, ItemParticipantStats, Option, Question, Quiz, QuizAttempt
+from .views import SubmitAnswersView
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'quiz-tests'}})
+class SubmitAnswersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        quiz = Quiz.objects.create(title="q", negative_marking=0.25)
+        category = Category.objects.create(title="c", category_type="default", quiz=quiz)
+        self.item = Item.objects.create(title="i", item_type="mcq", category=category)
+        self.user = get_user_model().objects.create(email="player@example.com")
+
+        # question -> (correct option ids, wrong option ids)
+        self.options = {}
+        for i in range(30):
+            question = Question.objects.create(question_text=f"q{i}")
+            correct = [Option.objects.create(question=question, option_text="a", is_correct=True).pk]
+            if i % 3 == 0:
+                correct.append(Option.objects.create(question=question, option_text="b", is_correct=True).pk)
+            wrong = [Option.objects.create(question=question, option_text="c").pk]
+            self.options[question.pk] = (correct, wrong)
+            self.item.questions.add(question)
+        self.question_ids = list(self.options)
+
+    def submit(self, answers, **data):
+        request = APIRequestFactory().post(
+            '/api/quiz/submit-answer/', {'item_id': self.item.pk, 'answers': answers, **data}, format='json',
+        )
+        force_authenticate(request, user=self.user)
+        return SubmitAnswersView.as_view()(request).data['data']
+
+    def answer(self, question_id, correct=True):
+        right, wrong = self.options[question_id]
+        return {'question_id': question_id, 'selected_option_ids': right if correct else right[:1] + wrong}
+
+    def test_grades_the_batch_in_memory(self):
+        answers = [self.answer(qid, correct=i % 4 != 0) for i, qid in enumerate(self.question_ids[:8])]
+        # Ids as strings, an unknown question and a malformed one are tolerated
+        answers[1]['question_id'] = str(answers[1]['question_id'])
+        answers[1]['selected_option_ids'] = [str(pk) for pk in answers[1]['selected_option_ids']]
+        answers += [{'question_id': 10 ** 9, 'selected_option_ids': [1]}, {'question_id': 'x'}]
+
+        data = self.submit(answers)
+        self.assertEqual([row['is_correct'] for row in data['results']], [i % 4 != 0 for i in range(8)])
+        self.assertEqual((data['correct_answers'], data['wrong_answers']), (6, 2))
+        self.assertEqual(data['score'], 6 - 2 * 0.25)
+        self.assertEqual(data['total_questions'], 30)
+        self.assertFalse(data['quiz_completed'])
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        counts = []
+        for size in (2, 20):
+            cache.clear()
+            QuizAttempt.objects.all().delete()
+            ItemParticipantStats.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                self.submit([self.answer(qid) for qid in self.question_ids[:size]])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_later_batches_add_to_the_open_attempt(self):
+        self.submit([self.answer(qid) for qid in self.question_ids[:10]])
+        data = self.submit([self.answer(qid, correct=False) for qid in self.question_ids[10:]])
+        self.assertEqual((data['correct_answers'], data['wrong_answers']), (10, 20))
+        self.assertEqual(data['score'], 10 - 20 * 0.25)
+        self.assertTrue(data['quiz_completed'])
+
+        attempt = QuizAttempt.objects.get()
+        self.assertEqual((attempt.correct_answers, attempt.wrong_answers, attempt.score), (10, 20, 5))
+        stats = ItemParticipantStats.objects.get()
+        self.assertEqual((stats.total_score, stats.attempts), (5, 1))
+
+        # A completed attempt is not reopened
+        self.submit([self.answer(self.question_ids[0])])
+        self.assertEqual(QuizAttempt.objects.count(), 2)
+        stats.refresh_from_db()
+        self.assertEqual((stats.total_score, stats.attempts), (6, 2))
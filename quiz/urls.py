@@ -8,7 +8,10 @@ urlpatterns = [
     path("api/category/update/<int:pk>/", CategoryPartialUpdateAPIView.as_view(), name="category-update"),
     path("api/item/update/<int:pk>/", ItemPartialUpdateAPIView.as_view(), name="item-update"),
     path('api/upload-questions/', QuestionUploadView.as_view(), name='upload-questions'), 
+    path('api/import-jobs/<int:pk>/', ImportJobStatusView.as_view(), name='import-job-status'),
+    path('api/import-jobs/<int:pk>/retry/', ImportJobRetryView.as_view(), name='import-job-retry'),
     path('api/quiz/get-questions/', GetQuestionsView.as_view(), name='get-questions'),
+    path('api/quiz/items/<int:item_id>/bundle/', ItemQuestionBundleView.as_view(), name='item-question-bundle'),
     path('api/quiz/submit-answer/', SubmitAnswersView.as_view(), name='submit_answer'),
     # path('quiz/question/', GetQuestionView.as_view(), name='get_question'),  # For the first question
     # path('quiz/question/<int:question_id>/', GetQuestionView.as_view(), name='get_next_question'),
@@ -0,0 +1,66 @@
+from django.core import checks
+from django.db import connections, router
+
+# Settings under which one multi-row INSERT gets consecutive ids
+_consecutive_ids = {}
+
+
+def ids_are_consecutive(connection):
+    """
+    Whether InnoDB hands out consecutive ids for a multi-row INSERT on this
+    connection: innodb_autoinc_lock_mode 0 or 1 and auto_increment_increment 1.
+    Under lock mode 2 ("interleaved", the MySQL 8 default) concurrent inserts
+    may interleave their ids. Read once per database.
+    """
+    if connection.alias not in _consecutive_ids:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")
+            lock_mode, increment = cursor.fetchone()
+        _consecutive_ids[connection.alias] = int(lock_mode) in (0, 1) and int(increment) == 1
+    return _consecutive_ids[connection.alias]
+
+
+def bulk_create_with_ids(model, objs):
+    """
+    bulk_create that always leaves primary keys set on `objs`.
+
+    Backends with INSERT ... RETURNING fill them in already. MySQL does not, so
+    the rows go in as one multi-row INSERT and the ids are read back from
+    LAST_INSERT_ID(), which is the first id of that statement, with the rest
+    following from it. That is only sound when ids_are_consecutive(); otherwise
+    each row is inserted on its own and its id read back. Call inside a
+    transaction.
+    """
+    if not objs:
+        return objs
+    connection = connections[router.db_for_write(model)]
+    if connection.features.can_return_rows_from_bulk_insert:
+        model.objects.bulk_create(objs, batch_size=len(objs))
+        return objs
+
+    batches = [objs] if ids_are_consecutive(connection) else [[obj] for obj in objs]
+    with connection.cursor() as cursor:
+        for batch in batches:
+            model.objects.bulk_create(batch, batch_size=len(batch))
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            first_id = cursor.fetchone()[0]
+            for offset, obj in enumerate(batch):
+                obj.pk = first_id + offset
+    return objs
+
+
+@checks.register(checks.Tags.database)
+def check_consecutive_ids(app_configs, databases=None, **kwargs):
+    """bulk_create_with_ids falls back to one INSERT per row without consecutive ids."""
+    errors = []
+    for alias in databases or ():
+        connection = connections[alias]
+        if connection.vendor == 'mysql' and not ids_are_consecutive(connection):
+            errors.append(checks.Warning(
+                "innodb_autoinc_lock_mode is not 0 or 1, or auto_increment_increment is not 1.",
+                hint="Bulk question imports will insert one row per statement. Set "
+                     "innodb_autoinc_lock_mode=1 to import with multi-row INSERTs.",
+                obj=alias,
+                id='quiz.W001',
+            ))
+    return errors
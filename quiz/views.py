@@ -2,6 +2,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
 from rest_framework.permissions import AllowAny
 import pandas as pd
 from rest_framework.permissions import IsAuthenticated
@@ -10,9 +11,19 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import AccessToken
 from collections import defaultdict
-from users.middleware import CombinedJWTOrGuestAuthentication 
+from users.middleware import CombinedJWTOrGuestAuthentication, RequestJWTAuthentication
+from users.auth_context import get_auth_context
 from .models import *
 from .serializers import *
+from .answer_keys import get_answer_keys
+from .import_jobs import create_job, job_progress, retry_job
+from .ranking import item_leaderboard
+from .dashboard import dashboard_data
+from .question_index import get_item_index, invalidate_item_index, question_payloads
+from .question_bundle import bundle_etag, choose_encoding, encoded_bundle, encoded_etag
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from users.models import *
 import uuid
 
@@ -30,17 +41,17 @@ from rest_framework.exceptions import AuthenticationFailed
 import jwt
 from jwt.exceptions import InvalidTokenError
 from django.conf import settings
+from django.urls import reverse
 import datetime
 
 class QuizCreateAPIView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
         serializer = QuizSerializer(data=request.data)
         if serializer.is_valid():
             quiz = serializer.save()
-            quiz.calculate_total_questions()  # Calculate total questions after saving
             return Response(
                 {
                     "type": "success",
@@ -66,7 +77,7 @@ class QuizCreateAPIView(APIView):
         
         
 class CategoryCreateAPIView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -96,7 +107,7 @@ class CategoryCreateAPIView(APIView):
 
 
 class CategoryPartialUpdateAPIView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, pk):
@@ -130,7 +141,7 @@ class CategoryPartialUpdateAPIView(APIView):
 
 
 class ItemCreateAPIView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -165,7 +176,7 @@ class ItemCreateAPIView(APIView):
 
 
 class ItemPartialUpdateAPIView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, pk):
@@ -229,71 +240,100 @@ class GetQuestionsView(APIView):
                 "data": {}
             }, status=status.HTTP_200_OK)
 
-        # ✅ Get category and item
-        try:
-            category = Category.objects.get(id=category_id)
-        except Category.DoesNotExist:
+        # ✅ Get the item's ordered question index (cached, no SQL when warm)
+        index = get_item_index(int(item_id)) if str(item_id).isdigit() else None
+        if index is None or str(index.category_id) != str(category_id):
+            if not Category.objects.filter(id=category_id).exists():
+                return Response({
+                    "type": "error",
+                    "message": "Category not found.",
+                    "data": {}
+                }, status=status.HTTP_200_OK)
             return Response({
                 "type": "error",
-                "message": "Category not found.",
+                "message": "Item not found in this category.",
                 "data": {}
             }, status=status.HTTP_200_OK)
 
-        try:
-            item = Item.objects.get(id=item_id, category=category)
-        except Item.DoesNotExist:
+        question_ids = index.question_ids
+        if not question_ids:
             return Response({
                 "type": "error",
-                "message": "Item not found in this category.",
+                "message": "No questions linked to this item.",
                 "data": {}
             }, status=status.HTTP_200_OK)
 
-        questions = item.questions.all()
-        if not questions.exists():
+        if current_question_index < 0 or current_question_index >= len(question_ids):
             return Response({
                 "type": "error",
-                "message": "No questions linked to this item.",
+                "message": "Invalid question index.",
                 "data": {}
             }, status=status.HTTP_200_OK)
 
-        if current_question_index < 0 or current_question_index >= questions.count():
+        question_id = question_ids[current_question_index]
+        payload = question_payloads([question_id]).get(question_id)
+        if payload is None:
+            # Deleted since the index was cached
+            invalidate_item_index([int(item_id)])
             return Response({
                 "type": "error",
-                "message": "Invalid question index.",
+                "message": "Question not found.",
                 "data": {}
             }, status=status.HTTP_200_OK)
 
-        question = questions[current_question_index]
-        options = Option.objects.filter(question=question)
-
-        answer_set = [
-            {
-                "answer_id": str(option.id),
-                "answer": option.option_text,
-                "is_true": option.is_correct
-            }
-            for option in options
-        ]
-
+        has_next = current_question_index + 1 < len(question_ids)
         return Response({
             "type": "success",
             "message": "Question fetched successfully.",
             "data": {
-                "question": [{
-                    "question_id": str(question.id),
-                    "question": question.question_text,
-                    "answer_set": answer_set
-                }],
-                "next_question_index": (
-                    current_question_index + 1
-                    if current_question_index + 1 < questions.count()
-                    else None
-                ),
-                "is_last_question": current_question_index + 1 >= questions.count()
+                "question": [payload],
+                "next_question_index": current_question_index + 1 if has_next else None,
+                "is_last_question": not has_next
             }
         }, status=status.HTTP_200_OK)
 
 
+class ItemQuestionBundleView(APIView):
+    """
+    Every question of an item in one compact, cacheable response (see
+    quiz/question_bundle.py). Send If-None-Match to revalidate: an unchanged
+    item answers 304 with no body. The ETag differs per Content-Encoding.
+    """
+    authentication_classes = [CombinedJWTOrGuestAuthentication]
+    permission_classes = [AllowAny]
+
+    def get(self, request, item_id, *args, **kwargs):
+        if not (getattr(request.user, "is_guest", False) or isinstance(request.user, User)):
+            return Response({
+                "type": "error",
+                "message": "Invalid or missing token.",
+                "data": {}
+            }, status=status.HTTP_200_OK)
+
+        index = get_item_index(item_id)
+        if index is None:
+            return Response({
+                "type": "error",
+                "message": "Item not found.",
+                "data": {}
+            }, status=status.HTTP_200_OK)
+
+        etag = bundle_etag(index)
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        response_etag = encoded_etag(etag, encoding)
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if "*" in if_none_match or response_etag in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(encoded_bundle(item_id, index, etag, encoding), content_type="application/json")
+            if encoding != "identity":
+                response["Content-Encoding"] = encoding
+        response["ETag"] = response_etag
+        response["Cache-Control"] = "private, no-cache"
+        patch_vary_headers(response, ("Accept-Encoding", "Authorization"))
+        return response
+
+
 
 
 
@@ -329,7 +369,7 @@ def get_client_ip(request):
 
 
 class DashboardView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [AllowAny]
 
     def get(self, request, *args, **kwargs):
@@ -339,33 +379,22 @@ class DashboardView(APIView):
         access_token = None
         open_account_id = None
 
-        jwt_auth = JWTAuthentication()
-        auth_header = request.headers.get("Authorization", "")
+        # The bearer token was validated once for the whole request
+        auth = get_auth_context(request)
 
         # Step 1: Authenticate user
-        try:
-            auth_result = jwt_auth.authenticate(request)
-            if auth_result:
-                user, _ = auth_result
-                if auth_header.startswith("Bearer "):
-                    access_token = auth_header.split(" ")[1]
-        except AuthenticationFailed:
-            pass
-
-        # Step 2: Check guest token manually if no user
-        if not user and auth_header.startswith("Bearer "):
-            token = auth_header.split(" ")[1]
-            try:
-                decoded = jwt.decode(token, settings.SIMPLE_JWT['SIGNING_KEY'], algorithms=["HS256"])
-                if decoded.get("is_guest"):
-                    open_account_id = decoded.get("open_account_id")
-                    access_token = token  # reuse existing token
-            except jwt.ExpiredSignatureError:
-                message = "Guest token expired."
-                return Response({"type": "error", "message": message, "data": {}}, status=200)
-            except jwt.InvalidTokenError:
-                message = "Invalid token."
+        user = auth.user
+        if user:
+            access_token = auth.raw_token
+
+        # Step 2: Fall back to a guest token if no user
+        if not user and auth.raw_token:
+            if auth.token is None:
+                message = "Guest token expired." if auth.expired else "Invalid token."
                 return Response({"type": "error", "message": message, "data": {}}, status=200)
+            if auth.claims.get("is_guest"):
+                open_account_id = auth.claims.get("open_account_id")
+                access_token = auth.raw_token  # reuse existing token
 
         # Step 3: Create guest open_account and token if none
         if not user and not access_token:
@@ -386,114 +415,15 @@ class DashboardView(APIView):
             guest_token["open_account_id"] = open_account_id
             access_token = str(guest_token)
 
-        # Build quizzes data (your existing logic)
-        quizzes = Quiz.objects.all()
-        quiz_data = []
-        for quiz in quizzes:
-            categories = Category.objects.filter(quiz=quiz)
-            filtered_categories = []
-            for category in categories:
-                if category.access_mode == "private" and (not user or not getattr(user, "is_authenticated", False)):
-                    continue
-
-                items = Item.objects.filter(category=category)
-                filtered_items = []
-                for item in items:
-                    if item.access_mode == "private" and (not user or not getattr(user, "is_authenticated", False)):
-                        continue
-
-                    quiz_attempt_data = None
-                    if user and getattr(user, "is_authenticated", False):
-                        quiz_attempt = QuizAttempt.objects.filter(user=user, item=item).first()
-                        if quiz_attempt:
-                            quiz_attempt_data = {
-                                "total_questions": quiz_attempt.total_questions,
-                                "correct_answers": quiz_attempt.correct_answers,
-                                "wrong_answers": quiz_attempt.wrong_answers,
-                                "score": quiz_attempt.score,
-                            }
-
-                    leaderboard_data = Leaderboard.objects.filter(item=item).order_by('-score')[:10]
-                    leaderboard = [
-                        {
-                            "user": entry.user.username,
-                            "score": entry.score,
-                            "rank": entry.rank,
-                        }
-                        for entry in leaderboard_data
-                    ]
-
-                    filtered_items.append({
-                        "item_id": str(item.id),
-                        "item_title": item.title,
-                        "item_subtitle": item.subtitle,
-                        "item_button_label": item.button_label or "Play",
-                        "access_mode": item.access_mode or "public",
-                        "item_type": item.item_type or "default",
-                        "quiz_attempt": quiz_attempt_data,
-                        "leaderboard": leaderboard,
-                    })
-
-                if filtered_items:
-                    filtered_categories.append({
-                        "category_id": str(category.id),
-                        "category_title": category.title,
-                        "category_type": category.category_type or "default",
-                        "access_mode": category.access_mode,
-                        "task_items": filtered_items,
-                    })
-
-            quiz_data.append({
-                "quiz_id": str(quiz.id),
-                "quiz_title": quiz.title,
-                "quiz_description": quiz.description,
-                "total_questions": quiz.total_questions,
-                "created_at": quiz.created_at,
-                "updated_at": quiz.updated_at,
-                "categories": filtered_categories,
-            })
-
-        # Add tournaments data here
-        # tournaments = Tournament.objects.filter(end_date__gte=timezone.now()).order_by('-start_date')
-        tournaments = Tournament.objects.all().order_by('-start_date')
-
-        tournaments_data = []
-        for tournament in tournaments:
-            tournaments_data.append({
-                "id": str(tournament.id),
-                "title": tournament.title,
-                "start_date": tournament.start_date,
-                "end_date": tournament.end_date,
-                "status": tournament.status
-                # Add any other fields you want to expose
-            })
-            
-            
-        # --------------------------
-        # Step 6: Active Puzzles
-        # --------------------------
-        active_puzzles = WordPuzzle.objects.filter(status="active")
-        puzzles_data = [
-            {
-                "id": puzzle.id,
-                "title": puzzle.title,
-                "banner": puzzle.banner.url if puzzle.banner else None,
-                "start_date": puzzle.start_date,
-                "end_date": puzzle.end_date,
-                "status": puzzle.status,
-            }
-            for puzzle in active_puzzles
-        ]
-
+        # Steps 4-6: cached catalog for the audience plus this user's attempts
+        dashboard = dashboard_data(user)
 
         return Response(
             {
                 "type": response_type,
                 "message": message,
                 "data": {
-                    "quizzes": quiz_data,
-                    "tournaments": tournaments_data,
-                    "puzzles": puzzles_data,  
+                    **dashboard,
                     "access_token": access_token,
                 },
             },
@@ -505,7 +435,7 @@ class DashboardView(APIView):
 
 
 class QuestionUploadView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
@@ -520,104 +450,83 @@ class QuestionUploadView(APIView):
                 status=status.HTTP_200_OK
             )
 
+        # Parsing and inserting happen in the background (quiz/import_jobs.py);
+        # the client polls the job status URL for progress.
         try:
-            df = pd.read_excel(file)
-
-            # Normalize column names
-            df.columns = [col.lower() for col in df.columns]
-            required_columns = [
-                'question', 'subject', 'category', 'options_num',
-                'option1', 'option2', 'option3', 'option4', 'answer'
-            ]
-
-            if not all(col in df.columns for col in required_columns):
-                return Response(
-                    {
-                        "type": "error",
-                        "message": "Excel file is missing required columns.",
-                        "data": {},
-                    },
-                    status=status.HTTP_200_OK
-                )
+            job = create_job('item', file, user=request.user)
+        except Exception as e:
+            return Response(
+                {
+                    "type": "error",
+                    "message": str(e),
+                    "data": {},
+                },
+                status=status.HTTP_200_OK
+            )
+
+        return Response(
+            {
+                "type": "success",
+                "message": "Upload received. Questions are being imported.",
+                "data": {
+                    "job_id": job.id,
+                    "status_url": reverse('import-job-status', args=[job.id]),
+                },
+            },
+            status=status.HTTP_200_OK
+        )
 
-            with transaction.atomic():
-                for _, row in df.iterrows():
-                    row_lower = {k.lower(): v for k, v in row.items()}
-
-                    category_id = str(row_lower.get('category')).strip() if not pd.isna(row_lower.get('category')) else None
-                    subject_id = str(row_lower.get('subject')).strip() if not pd.isna(row_lower.get('subject')) else None
-                    question_text = str(row_lower.get('question')).strip() if not pd.isna(row_lower.get('question')) else None
-                    options_num = int(row_lower.get('options_num')) if not pd.isna(row_lower.get('options_num')) else 0
-                    answer_field = str(row_lower.get('answer')).strip() if not pd.isna(row_lower.get('answer')) else ""
-
-                    try:
-                        category = Category.objects.get(id=category_id)
-                    except Category.DoesNotExist:
-                        return Response(
-                            {
-                                "type": "error",
-                                "message": f"Category with ID {category_id} not found.",
-                                "data": {},
-                            },
-                            status=status.HTTP_200_OK
-                        )
-
-                    item = Item.objects.filter(id=subject_id, category=category).first()
-                    if not item:
-                        return Response(
-                            {
-                                "type": "error",
-                                "message": f"Item with ID {subject_id} in Category {category.title} not found.",
-                                "data": {},
-                            },
-                            status=status.HTTP_200_OK
-                        )
-
-                    question= Question.objects.create(question_text=question_text)
-                    item.questions.add(question)
-
-                    # Extract options
-                    options = []
-                    i = 1
-                    while True:
-                        option_col = f'option{i}'.lower()
-                        option_text = row_lower.get(option_col)
-                        if pd.isna(option_text):
-                            break
-                        options.append(str(option_text).strip())
-                        i += 1
-
-                    # Normalize answers from mixed format
-                    raw_answers = [str(a).strip().lower() for a in answer_field.split(',') if str(a).strip()]
-                    parsed_answers = []
-                    for ans in raw_answers:
-                        if ans.startswith('option') and ans[6:].isdigit():
-                            idx = int(ans[6:]) - 1
-                            if 0 <= idx < len(options):
-                                parsed_answers.append(options[idx].capitalize())
-                        else:
-                            parsed_answers.append(ans.capitalize())
-
-                    # Save options
-                    for option_text in options:
-                        is_correct = option_text.capitalize() in parsed_answers
-                        Option.objects.update_or_create(
-                            question=question,
-                            option_text=option_text.capitalize(),
-                            defaults={'is_correct': is_correct}
-                        )
 
+class ImportJobStatusView(APIView):
+    authentication_classes = [RequestJWTAuthentication]
+    permission_classes = [IsAuthenticated]
 
+    def get_job(self, request, pk):
+        job = QuestionImportJob.objects.filter(pk=pk).first()
+        if job is None or not (request.user.is_staff or job.created_by_id == request.user.id):
+            return None
+        return job
+
+    def get(self, request, pk, *args, **kwargs):
+        job = self.get_job(request, pk)
+        if job is None:
             return Response(
                 {
-                    "type": "success",
-                    "message": "Questions uploaded successfully!",
+                    "type": "error",
+                    "message": "Import job not found.",
                     "data": {},
                 },
                 status=status.HTTP_200_OK
             )
 
-        except Exception as e:
+        return Response(
+            {
+                "type": "success",
+                "message": f"Import job is {job.status}.",
+                "data": job_progress(job),
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class ImportJobRetryView(ImportJobStatusView):
+    """Re-run the chunks of a failed job that did not commit."""
+
+    def post(self, request, pk, *args, **kwargs):
+        job = self.get_job(request, pk)
+        if job is None:
+            return Response(
+                {
+                    "type": "error",
+                    "message": "Import job not found.",
+                    "data": {},
+                },
+                status=status.HTTP_200_OK
+            )
+
+        try:
+            retry_job(job)
+        except ValueError as e:
             return Response(
                 {
                     "type": "error",
@@ -627,6 +536,18 @@ class QuestionUploadView(APIView):
                 status=status.HTTP_200_OK
             )
 
+        return Response(
+            {
+                "type": "success",
+                "message": "Import job queued for retry.",
+                "data": {
+                    "job_id": job.id,
+                    "status_url": reverse('import-job-status', args=[job.id]),
+                },
+            },
+            status=status.HTTP_200_OK
+        )
+
 
 
 
@@ -644,7 +565,7 @@ class SubmitAnswersView(APIView):
         start_fresh = request.data.get("start_fresh", False)
 
         try:
-            item = Item.objects.get(id=item_id)
+            item = Item.objects.select_related("category__quiz").get(id=item_id)
             quiz = item.category.quiz
         except Item.DoesNotExist:
             return Response({"type": "error", "message": "Invalid item.", "data": {}}, status=200)
@@ -663,42 +584,41 @@ class SubmitAnswersView(APIView):
         else:
             return Response({"type": "error", "message": "Invalid user."}, status=200)
 
-        # Create or get QuizAttempt
-        filters = {"item": item}
-        if user:
-            filters["user"] = user
-        else:
-            filters["guest_user"] = guest_user
-
-        if start_fresh:
-            quiz_attempt = QuizAttempt.objects.create(user=user, guest_user=guest_user, item=item, total_questions=item.questions.count())
-        else:
-            quiz_attempt = QuizAttempt.objects.filter(**filters).order_by("-attempt_date").first()
-            if not quiz_attempt or (quiz_attempt.correct_answers + quiz_attempt.wrong_answers == quiz_attempt.total_questions):
-                quiz_attempt = QuizAttempt.objects.create(user=user, guest_user=guest_user, item=item, total_questions=item.questions.count())
+        # Process Answers against the cached answer keys (one lookup for the whole set)
+        question_ids = []
+        for answer in answers:
+            try:
+                question_ids.append(int(answer.get("question_id")))
+            except (TypeError, ValueError):
+                continue
+        answer_keys = get_answer_keys(question_ids)
 
-        # Process Answers
         result_data = []
+        correct_count = 0
+        wrong_count = 0
         for answer in answers:
             question_id = answer.get("question_id")
             selected_option_ids = answer.get("selected_option_ids", [])
 
             try:
-                question = Question.objects.get(id=question_id)
-            except Question.DoesNotExist:
+                answer_key = answer_keys.get(int(question_id))
+            except (TypeError, ValueError):
+                answer_key = None
+            if answer_key is None:
                 continue
 
-            correct_options = set(Option.objects.filter(question=question, is_correct=True).values_list("id", flat=True))
-            selected_set = set(selected_option_ids)
+            correct_options = set(answer_key.correct_option_ids)
+            # The answer keys hold integer ids; clients may send "12"
+            try:
+                selected_set = {int(option_id) for option_id in selected_option_ids}
+            except (TypeError, ValueError):
+                selected_set = set(selected_option_ids)
 
             is_correct = selected_set == correct_options
-
             if is_correct:
-                quiz_attempt.correct_answers += 1
-                quiz_attempt.score += 1
+                correct_count += 1
             else:
-                quiz_attempt.wrong_answers += 1
-                quiz_attempt.score -= negative_marking
+                wrong_count += 1
 
             result_data.append({
                 "question_id": question_id,
@@ -706,8 +626,39 @@ class SubmitAnswersView(APIView):
                 "selected_options": list(selected_set),
                 "correct_options": list(correct_options),
             })
+        score_delta = correct_count - wrong_count * negative_marking
+
+        # Create or get QuizAttempt, writing the counters in one statement
+        filters = {"item": item}
+        if user:
+            filters["user"] = user
+        else:
+            filters["guest_user"] = guest_user
 
-        quiz_attempt.save()
+        quiz_attempt = None
+        if not start_fresh:
+            quiz_attempt = QuizAttempt.objects.filter(**filters).order_by("-attempt_date").first()
+            if quiz_attempt and quiz_attempt.correct_answers + quiz_attempt.wrong_answers == quiz_attempt.total_questions:
+                quiz_attempt = None
+
+        with transaction.atomic():
+            if quiz_attempt is None:
+                quiz_attempt = QuizAttempt.objects.create(
+                    user=user, guest_user=guest_user, item=item,
+                    total_questions=len(get_item_index(item.id).question_ids),
+                    correct_answers=correct_count, wrong_answers=wrong_count, score=score_delta,
+                )
+                ItemParticipantStats.record(quiz_attempt, score_delta, started=True)
+            elif result_data:
+                QuizAttempt.objects.filter(pk=quiz_attempt.pk).update(
+                    correct_answers=F("correct_answers") + correct_count,
+                    wrong_answers=F("wrong_answers") + wrong_count,
+                    score=F("score") + score_delta,
+                )
+                ItemParticipantStats.record(quiz_attempt, score_delta)
+                quiz_attempt.correct_answers += correct_count
+                quiz_attempt.wrong_answers += wrong_count
+                quiz_attempt.score += score_delta
 
         return Response({
             "type": "success",
@@ -725,14 +676,31 @@ class SubmitAnswersView(APIView):
 
 
 
+LEADERBOARD_PAGE_SIZE = 50
+LEADERBOARD_MAX_PAGE_SIZE = 200
+ALL_ITEMS_TOP_DEFAULT = 10
+ALL_ITEMS_TOP_MAX = 50
+
+
+def leaderboard_entry(row):
+    """Response entry for a row of quiz.ranking.item_leaderboard()."""
+    return {
+        "userId": row["user_id"] or row["guest_user_id"],
+        # Neither User nor UserOpenAccount has a username, so entries have
+        # always been anonymous
+        "userName": "Anonymous",
+        "rank": row["rank"],
+        "total_score": row["total_score"],
+        "attempts": row["attempts"],
+        "first_attempt_date": row["first_attempt_date"]
+    }
+
+
 class ItemLeaderboardView(APIView):
     authentication_classes = [CombinedJWTOrGuestAuthentication]
     permission_classes = [AllowAny]
 
     def get(self, request, item_id, *args, **kwargs):
-        # Determine if the requesting user is authenticated
-        is_authenticated = request.user.is_authenticated
-
         # Fetch the item
         try:
             item = Item.objects.get(id=item_id)
@@ -743,54 +711,28 @@ class ItemLeaderboardView(APIView):
                 "data": {}
             }, status=200)
 
-        # Fetch all attempts for this item
-        attempts_qs = QuizAttempt.objects.filter(item=item)
-
-        # Aggregate scores per user (or guest_user)
-        user_scores = defaultdict(lambda: {"total_score": 0, "attempts": 0, "first_attempt_date": None})
-
-        for attempt in attempts_qs:
-            user_obj = attempt.user or attempt.guest_user
-            if not user_obj:
-                continue
-
-            user_id = user_obj.id
-
-            user_scores[user_id]["total_score"] += attempt.score
-            user_scores[user_id]["attempts"] += 1
-            if user_scores[user_id]["first_attempt_date"] is None:
-                user_scores[user_id]["first_attempt_date"] = attempt.attempt_date
-            else:
-                # Keep the earliest attempt date
-                user_scores[user_id]["first_attempt_date"] = min(user_scores[user_id]["first_attempt_date"], attempt.attempt_date)
-
-            user_scores[user_id]["user_obj"] = user_obj
-
-        # Sort leaderboard
-        leaderboard_list = sorted(
-            user_scores.values(),
-            key=lambda x: (-x["total_score"], x["attempts"], x["first_attempt_date"])
-        )
+        try:
+            limit = int(request.query_params.get('limit', LEADERBOARD_PAGE_SIZE))
+            limit = min(max(limit, 1), LEADERBOARD_MAX_PAGE_SIZE)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({
+                "type": "error",
+                "message": "'offset' and 'limit' must be integers.",
+                "data": {}
+            }, status=200)
 
-        # Add rank
-        final_leaderboard = []
-        for idx, entry in enumerate(leaderboard_list, start=1):
-            user_obj = entry["user_obj"]
-            final_leaderboard.append({
-                "userId": user_obj.id,
-                "userName": user_obj.username if is_authenticated and hasattr(user_obj, "username") else "Anonymous",
-                "rank": idx,
-                "total_score": entry["total_score"],
-                "attempts": entry["attempts"],
-                "first_attempt_date": entry["first_attempt_date"]
-            })
+        # One indexed read of the maintained per-participant totals
+        rows = list(item_leaderboard(ItemParticipantStats.objects.filter(item=item)).page(offset, limit + 1))
+        final_leaderboard = [leaderboard_entry(row) for row in rows[:limit]]
 
         return Response({
             "type": "success",
             "message": "Leaderboard fetched successfully.",
             "data": {
                 "item_id": item_id,
-                "leaderboard": final_leaderboard
+                "leaderboard": final_leaderboard,
+                "next_offset": offset + limit if len(rows) > limit else None
             }
         }, status=200)
         
@@ -801,68 +743,49 @@ class AllItemLeaderboardView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, *args, **kwargs):
-        is_authenticated = request.user.is_authenticated
-        print("hello")
-        all_items = Item.objects.all()
-        final_data = []
-
-        for item in all_items:
-            attempts_qs = QuizAttempt.objects.filter(item=item)
-
-            user_scores = defaultdict(lambda: {
-                "total_score": 0,
-                "attempts": 0,
-                "first_attempt_date": None,
-                "user_obj": None
-            })
-
-            # Aggregate data
-            for attempt in attempts_qs:
-                user_obj = attempt.user or attempt.guest_user
-                if not user_obj:
-                    continue
-
-                user_id = user_obj.id
-                entry = user_scores[user_id]
-
-                entry["total_score"] += attempt.score
-                entry["attempts"] += 1
-
-                if entry["first_attempt_date"] is None:
-                    entry["first_attempt_date"] = attempt.attempt_date
-                else:
-                    entry["first_attempt_date"] = min(
-                        entry["first_attempt_date"], 
-                        attempt.attempt_date
-                    )
-
-                entry["user_obj"] = user_obj
-
-            # Sort the leaderboard for this item
-            leaderboard_list = sorted(
-                user_scores.values(),
-                key=lambda x: (-x["total_score"], x["attempts"], x["first_attempt_date"])
-            )
+        try:
+            top = min(max(int(request.query_params.get('top', ALL_ITEMS_TOP_DEFAULT)), 1), ALL_ITEMS_TOP_MAX)
+        except ValueError:
+            return Response({
+                "type": "error",
+                "message": "'top' must be an integer.",
+                "data": {}
+            }, status=200)
 
-            # Add rank
-            formatted_lb = []
-            for idx, entry in enumerate(leaderboard_list, start=1):
-                user_obj = entry["user_obj"]
-
-                formatted_lb.append({
-                    "userId": user_obj.id,
-                    "userName": user_obj.username if is_authenticated and hasattr(user_obj, "username") else "Anonymous",
-                    "rank": idx,
-                    "total_score": entry["total_score"],
-                    "attempts": entry["attempts"],
-                    "first_attempt_date": entry["first_attempt_date"]
-                })
-
-            final_data.append({
+        # Each item's top-th best total, one index probe per item. Only rows
+        # scoring at least that can make the top, so the window below ranks
+        # about `top` rows per item instead of the whole stats table.
+        cutoff = Subquery(
+            ItemParticipantStats.objects.filter(item_id=OuterRef('pk'))
+            .order_by('-total_score').values('total_score')[top - 1:top]
+        )
+        items = list(Item.objects.only('id', 'title').annotate(cutoff=cutoff))
+        by_cutoff = defaultdict(list)
+        for item in items:
+            by_cutoff[item.cutoff].append(item.id)
+        contenders = Q(pk__in=[])
+        for score, item_ids in by_cutoff.items():
+            # No cutoff: the item has fewer than `top` participants, all of them qualify
+            condition = Q(item_id__in=item_ids)
+            if score is not None:
+                condition &= Q(total_score__gte=score)
+            contenders |= condition
+
+        # One windowed query ranks the contenders (partitioned by item) and keeps the top of each
+        stats = ItemParticipantStats.objects.filter(contenders)
+        ranked = item_leaderboard(stats, partition_by=['item_id']).annotated()
+        entries = defaultdict(list)
+        for row in ranked.filter(rank__lte=top):
+            entries[row['item_id']].append(leaderboard_entry(row))
+
+        final_data = [
+            {
                 "item_id": item.id,
                 "item_title": item.title,
-                "leaderboard": formatted_lb
-            })
+                "leaderboard": entries.get(item.id, [])
+            }
+            for item in items
+        ]
 
         return Response({
             "type": "success",
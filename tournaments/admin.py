@@ -45,7 +45,7 @@ class TournamentPrizeAdmin(admin.ModelAdmin):
 
 @admin.register(TournamentWinner)
 class TournamentWinnerAdmin(admin.ModelAdmin):
-    list_display = ('get_participant', 'tournament', 'prize', 'winning_score', 'winning_rank', 'award_date', 'claim_status')
+    list_display = ('get_participant', 'tournament', 'prize', 'period_start', 'winning_score', 'winning_rank', 'award_date', 'claim_status')
     list_filter = ('tournament', 'claim_status', 'award_date')
     search_fields = ('tournament__title', 'prize__title', 'user__email', 'guest_user__id')
     fieldsets = (
@@ -53,7 +53,7 @@ class TournamentWinnerAdmin(admin.ModelAdmin):
             'fields': ('tournament', 'prize')
         }),
         ('Winner Details', {
-            'fields': ('user', 'guest_user', 'winning_score', 'winning_rank', 'claim_status')
+            'fields': ('user', 'guest_user', 'period_start', 'winning_score', 'winning_rank', 'claim_status')
         }),
     )
     readonly_fields = ('award_date',)
@@ -0,0 +1,243 @@
+# tournaments/decks.py
+"""
+Pre-dealt question decks for starting tournament attempts.
+
+A deck is the question selection for one attempt together with its serialized
+``QuestionSerializer`` payload. The ``deal_tournament_decks`` command keeps one
+personal deck per known participant of every active tournament (drawn from
+their unseen questions), plus a list of anonymous decks, drawn from the whole
+pool, for participants who have not completed an attempt yet. Decks live in the
+``default`` Redis with a TTL.
+
+StartTournamentAttemptView claims a deck instead of selecting and serializing
+questions inside the request. A claimed deck is re-checked against the current
+pool stamp/epoch, the participant's seen bitmap and the question version
+stamps; anything stale is dropped and the view falls back to live selection.
+"""
+import json
+import logging
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.exceptions import ValidationError
+
+from quiz.answer_keys import question_versions
+from quiz.models import Question
+from quiz.serializers import QuestionSerializer
+from .models import TournamentParticipantStats, TournamentSeenQuestions, participant_key
+from .question_pool import get_pool, pick_positions, seen_bits
+
+logger = logging.getLogger(__name__)
+
+DECK_TTL = getattr(settings, 'TOURNAMENT_DECK_TTL', 60 * 10)
+ANONYMOUS_DECKS = getattr(settings, 'TOURNAMENT_ANONYMOUS_DECKS', 50)
+DEAL_BATCH_SIZE = 500
+# Anonymous decks popped per claim before giving up and selecting live
+ANONYMOUS_CLAIM_TRIES = 3
+
+Deck = namedtuple('Deck', ['question_ids', 'questions'])
+
+
+def _serialize_questions(question_ids):
+    """question id -> serialized payload, one query for questions plus one for options."""
+    by_id = Question.objects.prefetch_related('options').in_bulk(list(question_ids))
+    return {qid: QuestionSerializer(question).data for qid, question in by_id.items()}
+
+
+class DeckDealer:
+    def __init__(self, tournament, connection=None):
+        self.tournament = tournament
+        self.prefix = f"tournament:{tournament.pk}:deck"
+        self._redis = connection
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    def personal_key(self, participant):
+        return f"{self.prefix}:{participant}"
+
+    def anonymous_key(self, pool):
+        # Keyed by pool stamp: editing the pool orphans every anonymous deck at once
+        return f"{self.prefix}:anonymous:{pool.stamp}"
+
+    def _ttl(self, now):
+        remaining = int((self.tournament.end_date - now).total_seconds())
+        return max(1, min(DECK_TTL, remaining))
+
+    # ---------------------------
+    # Dealing
+    # ---------------------------
+    def _pack(self, pool, positions, payloads, versions):
+        positions = [pos for pos in positions if pool.question_ids[pos] in payloads]
+        question_ids = [pool.question_ids[pos] for pos in positions]
+        return json.dumps({
+            "stamp": pool.stamp,
+            "epoch": pool.epoch,
+            "positions": positions,
+            "versions": [versions[qid] for qid in question_ids],
+            "questions": [payloads[qid] for qid in question_ids],
+        }, cls=DjangoJSONEncoder)
+
+    def _pack_all(self, pool, selections):
+        """Serialize a batch of position lists with one question load for the lot."""
+        question_ids = {pool.question_ids[pos] for positions in selections for pos in positions}
+        payloads = _serialize_questions(question_ids)
+        versions = question_versions(list(payloads))
+        return [self._pack(pool, positions, payloads, versions) for positions in selections]
+
+    def deal_participants(self, now=None):
+        """Deal a personal deck to every participant that has none. Returns the count dealt."""
+        now = now or timezone.now()
+        pool = get_pool(self.tournament)
+        if not len(pool):
+            return 0
+
+        k = self.tournament.max_questions_per_attempt
+        ttl = self._ttl(now)
+        participants = (
+            TournamentParticipantStats.objects
+            .filter(tournament=self.tournament)
+            .values_list('participant', flat=True)
+        )
+
+        dealt = 0
+        batch = []
+        for participant in participants.iterator(chunk_size=DEAL_BATCH_SIZE):
+            batch.append(participant)
+            if len(batch) >= DEAL_BATCH_SIZE:
+                dealt += self._deal_batch(pool, batch, k, ttl)
+                batch = []
+        if batch:
+            dealt += self._deal_batch(pool, batch, k, ttl)
+        return dealt
+
+    def _deal_batch(self, pool, participants, k, ttl):
+        pipe = self.redis.pipeline(transaction=False)
+        for participant in participants:
+            pipe.exists(self.personal_key(participant))
+        missing = [p for p, has_deck in zip(participants, pipe.execute()) if not has_deck]
+        if not missing:
+            return 0
+
+        seen = {}
+        stale = set()
+        rows = TournamentSeenQuestions.objects.filter(
+            tournament=self.tournament, participant__in=missing
+        ).values_list('participant', 'bitmap', 'pool_epoch')
+        for participant, bitmap, epoch in rows:
+            if epoch != pool.epoch:
+                # The live path rebuilds the bitmap on the next start
+                stale.add(participant)
+            else:
+                seen[participant] = int.from_bytes(bytes(bitmap), 'little')
+
+        selections = {}
+        for participant in missing:
+            if participant in stale:
+                continue
+            try:
+                selections[participant] = pick_positions(pool, seen.get(participant, 0), k)
+            except ValidationError:
+                continue  # pool exhausted for this participant
+        if not selections:
+            return 0
+
+        decks = self._pack_all(pool, list(selections.values()))
+        pipe = self.redis.pipeline(transaction=False)
+        for participant, deck in zip(selections, decks):
+            # NX: never replace a deck dealt concurrently
+            pipe.set(self.personal_key(participant), deck, ex=ttl, nx=True)
+        return sum(1 for stored in pipe.execute() if stored)
+
+    def refill_anonymous(self, target=ANONYMOUS_DECKS, now=None):
+        """Top the anonymous list up to `target` decks. Returns the count added."""
+        now = now or timezone.now()
+        pool = get_pool(self.tournament)
+        if not len(pool):
+            return 0
+
+        key = self.anonymous_key(pool)
+        needed = target - self.redis.llen(key)
+        if needed <= 0:
+            return 0
+
+        k = self.tournament.max_questions_per_attempt
+        decks = self._pack_all(pool, [pick_positions(pool, 0, k) for _ in range(needed)])
+        pipe = self.redis.pipeline()
+        pipe.rpush(key, *decks)
+        pipe.expire(key, self._ttl(now))
+        pipe.execute()
+        return len(decks)
+
+    def deal(self, now=None):
+        """One dealing pass for this tournament -> (personal, anonymous) decks added."""
+        return self.deal_participants(now), self.refill_anonymous(now=now)
+
+    def discard(self, user=None, guest_user=None):
+        """Drop a participant's personal deck (their seen questions just changed)."""
+        participant = participant_key(getattr(user, 'pk', None), getattr(guest_user, 'pk', None))
+        try:
+            self.redis.delete(self.personal_key(participant))
+        except RedisError as e:
+            logger.warning("Could not discard deck for %s: %s", participant, e)
+
+    # ---------------------------
+    # Claiming
+    # ---------------------------
+    def _check(self, raw, pool, bits):
+        """Return (deck, reusable). reusable means the deck only clashed with this participant."""
+        data = json.loads(raw)
+        if data["stamp"] != pool.stamp or data["epoch"] != pool.epoch:
+            return None, False
+
+        positions = data["positions"]
+        if pool.bits_for(pool.question_ids[pos] for pos in positions) & bits:
+            return None, True
+
+        question_ids = [pool.question_ids[pos] for pos in positions]
+        current = question_versions(question_ids)
+        if any(current[qid] != version for qid, version in zip(question_ids, data["versions"])):
+            return None, False
+        return Deck(question_ids, data["questions"]), False
+
+    def claim(self, user=None, guest_user=None):
+        """
+        Take a ready deck for this participant, or None when there is no usable
+        one (the caller then selects questions live).
+        """
+        participant = participant_key(getattr(user, 'pk', None), getattr(guest_user, 'pk', None))
+        pool = get_pool(self.tournament)
+        if not len(pool):
+            return None
+        bits = seen_bits(self.tournament, pool, user, guest_user)
+
+        try:
+            pipe = self.redis.pipeline()
+            pipe.get(self.personal_key(participant))
+            pipe.delete(self.personal_key(participant))
+            raw, _ = pipe.execute()
+            if raw is not None:
+                deck, _ = self._check(raw, pool, bits)
+                if deck is not None:
+                    return deck
+
+            key = self.anonymous_key(pool)
+            for _ in range(ANONYMOUS_CLAIM_TRIES):
+                raw = self.redis.lpop(key)
+                if raw is None:
+                    break
+                deck, reusable = self._check(raw, pool, bits)
+                if deck is not None:
+                    return deck
+                if reusable:
+                    self.redis.rpush(key, raw)
+        except RedisError as e:
+            logger.warning("Tournament %s: deck claim failed: %s", self.tournament.pk, e)
+        return None
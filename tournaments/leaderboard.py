@@ -0,0 +1,403 @@
+# tournaments/leaderboard.py
+"""
+Redis sorted-set leaderboard engine for tournaments.
+
+Every tournament gets one sorted set in the ``default`` django_redis cache,
+ordered exactly like ``tournaments.pagination.LEADERBOARD_ORDERING``
+(-total_score, last_attempt_datetime with NULL first, id):
+
+* the member score is ``total_score`` itself, a double like the MySQL column,
+  so scores compare the same way in both stores;
+* members with equal scores are ordered by Redis lexicographically, so the
+  member starts with a fixed-width tie-break prefix built from
+  last_attempt_datetime (to the microsecond) and the row id, inverted so that
+  ZREVRANGE returns the earliest attempt and the lowest id first. The
+  participant ("u:<user_id>" or "g:<guest_user_id>") follows after a "|".
+
+A hash maps each participant to its current member, so a new attempt time
+replaces the old member. ZREVRANK / ZREVRANGE then give MySQL ranks in
+O(log n).
+
+``TournamentLeaderboard`` rows stay the durable source of truth. A cold set is
+rebuilt from MySQL in a background thread (or by the
+``rebuild_tournament_leaderboards`` management command); until it is ready,
+reads raise LeaderboardNotReady, a RedisError, so callers fall back to MySQL
+as they do when Redis is down.
+"""
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import close_old_connections
+from django.db.models import Q
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .models import TournamentLeaderboard, participant_key
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 1000
+REBUILD_LOCK_TIMEOUT = 60 * 10
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+TIME_DIGITS = 17    # microseconds since the epoch, good until the year 5138
+TIME_MAX = 10 ** TIME_DIGITS - 1
+ID_DIGITS = 19      # any BIGINT id
+ID_MAX = 10 ** ID_DIGITS - 1
+NULL_TIME_PREFIX = '1' + '0' * TIME_DIGITS
+
+# KEYS: set, members hash, ready flag, rebuild lock, dirty set
+# ARGV: participant, member, score
+# While a rebuild runs the participant is also marked dirty, so the rebuild
+# re-reads it after swapping the new set in.
+RECORD_SCRIPT = """
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    redis.call('SADD', KEYS[5], ARGV[1])
+end
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return 0
+end
+local old = redis.call('HGET', KEYS[2], ARGV[1])
+if old and old ~= ARGV[2] then
+    redis.call('ZREM', KEYS[1], old)
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[2])
+return 1
+"""
+
+# KEYS: set, members hash, rebuild lock, dirty set
+# ARGV: participant
+DISCARD_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('SADD', KEYS[4], ARGV[1])
+end
+local old = redis.call('HGET', KEYS[2], ARGV[1])
+if old then
+    redis.call('ZREM', KEYS[1], old)
+    redis.call('HDEL', KEYS[2], ARGV[1])
+end
+return 0
+"""
+
+# KEYS: set, members hash
+# ARGV: participant
+# 0-based position from the top, or nil if the participant has no entry.
+RANK_SCRIPT = """
+local member = redis.call('HGET', KEYS[2], ARGV[1])
+if not member then
+    return false
+end
+return redis.call('ZREVRANK', KEYS[1], member)
+"""
+
+# KEYS: set
+# ARGV: member, score
+# 0-based position of the member, or nil unless it is present with this score.
+ENTRY_RANK_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not score or tonumber(score) ~= tonumber(ARGV[2]) then
+    return false
+end
+return redis.call('ZREVRANK', KEYS[1], ARGV[1])
+"""
+
+# KEYS: rebuild lock
+# ARGV: token
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderboardNotReady(RedisError):
+    """The set is cold or being rebuilt; read from MySQL meanwhile."""
+
+
+def participant_member(user_id=None, guest_user_id=None):
+    """Participant part of a sorted-set member for a user or guest."""
+    return participant_key(user_id, guest_user_id)
+
+
+def parse_member(member):
+    """Participant of a member (or of a bare participant key) -> (user_id, guest_user_id)."""
+    if isinstance(member, bytes):
+        member = member.decode()
+    participant = member.rpartition('|')[2]
+    kind, _, pk = participant.partition(':')
+    if kind == 'u':
+        return int(pk), None
+    return None, int(pk)
+
+
+def encode_member(entry_id, last_attempt_datetime, participant):
+    """Sorted-set member whose reverse lexicographic order is (last_attempt_datetime NULL first, id)."""
+    if last_attempt_datetime is None:
+        when = NULL_TIME_PREFIX
+    else:
+        micros = (last_attempt_datetime - EPOCH) // timedelta(microseconds=1)
+        when = '0' + str(TIME_MAX - min(max(micros, 0), TIME_MAX)).zfill(TIME_DIGITS)
+    return f"{when}{str(ID_MAX - entry_id).zfill(ID_DIGITS)}|{participant}"
+
+
+def decode_member(member):
+    """Inverse of encode_member -> (entry_id, last_attempt_datetime, user_id, guest_user_id)."""
+    if isinstance(member, bytes):
+        member = member.decode()
+    prefix = member.partition('|')[0]
+    when, inverted_id = prefix[:TIME_DIGITS + 1], prefix[TIME_DIGITS + 1:]
+    last_attempt = None
+    if when != NULL_TIME_PREFIX:
+        last_attempt = EPOCH + timedelta(microseconds=TIME_MAX - int(when[1:]))
+    return (ID_MAX - int(inverted_id), last_attempt) + parse_member(member)
+
+
+def entry_member(entry):
+    return encode_member(
+        entry.id, entry.last_attempt_datetime, participant_member(entry.user_id, entry.guest_user_id)
+    )
+
+
+class TournamentLeaderboardEngine:
+    """
+    O(log n) rank, top-N and page-by-rank lookups for one tournament.
+
+    Ranks are 1-based positions in leaderboard order. Entries are returned as
+    dicts with ``rank``, ``id``, ``user_id``, ``guest_user_id``,
+    ``total_score`` and ``last_attempt_datetime``.
+    """
+    _record_script = None
+    _discard_script = None
+    _rank_script = None
+    _entry_rank_script = None
+    _release_script = None
+
+    # Tournament ids this process is rebuilding in the background
+    _rebuilding = set()
+    _rebuilding_lock = threading.Lock()
+
+    def __init__(self, tournament_id, connection=None):
+        self.tournament_id = tournament_id
+        self.key = f"tournament:{tournament_id}:leaderboard"
+        self.members_key = f"{self.key}:members"
+        self.ready_key = f"{self.key}:ready"
+        self.lock_key = f"{self.key}:rebuilding"
+        self.dirty_key = f"{self.key}:dirty"
+        self._redis = connection
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    def _scripts(self):
+        cls = TournamentLeaderboardEngine
+        if cls._record_script is None:
+            cls._record_script = self.redis.register_script(RECORD_SCRIPT)
+            cls._discard_script = self.redis.register_script(DISCARD_SCRIPT)
+            cls._rank_script = self.redis.register_script(RANK_SCRIPT)
+            cls._entry_rank_script = self.redis.register_script(ENTRY_RANK_SCRIPT)
+            cls._release_script = self.redis.register_script(RELEASE_SCRIPT)
+        return cls
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def _record(self, entry):
+        self._scripts()._record_script(
+            keys=[self.key, self.members_key, self.ready_key, self.lock_key, self.dirty_key],
+            args=[participant_member(entry.user_id, entry.guest_user_id), entry_member(entry),
+                  float(entry.total_score or 0)],
+            client=self.redis,
+        )
+
+    def _discard(self, participant):
+        self._scripts()._discard_script(
+            keys=[self.key, self.members_key, self.lock_key, self.dirty_key],
+            args=[participant],
+            client=self.redis,
+        )
+
+    def record(self, entry):
+        """Mirror a saved TournamentLeaderboard row into the sorted set."""
+        try:
+            # A cold set picks the row up when it is rebuilt
+            self._record(entry)
+        except RedisError as e:
+            logger.warning("Leaderboard %s: could not record entry %s: %s", self.tournament_id, entry.pk, e)
+
+    def discard(self, user_id=None, guest_user_id=None):
+        try:
+            self._discard(participant_member(user_id, guest_user_id))
+        except RedisError as e:
+            logger.warning("Leaderboard %s: could not discard entry: %s", self.tournament_id, e)
+
+    def clear(self):
+        self.redis.delete(self.key, self.members_key, self.ready_key)
+
+    def rebuild(self):
+        """
+        Reload the sorted set from TournamentLeaderboard rows.
+
+        Only one rebuild per tournament runs at a time (a SET NX lock); returns
+        None if another one holds it, else the entry count. Rows are streamed
+        into scratch keys unique to this rebuild and swapped in with RENAME, so
+        readers never see a half-built leaderboard. Rows recorded while the
+        rebuild ran are re-read from MySQL after the swap.
+        """
+        token = uuid.uuid4().hex
+        if not self.redis.set(self.lock_key, token, nx=True, ex=REBUILD_LOCK_TIMEOUT):
+            return None
+        try:
+            self.redis.delete(self.dirty_key)
+            count = self._load(token)
+            self._apply_dirty()
+        finally:
+            self._scripts()._release_script(keys=[self.lock_key], args=[token], client=self.redis)
+        return count
+
+    def _load(self, token):
+        tmp_key = f"{self.key}:rebuild:{token}"
+        tmp_members_key = f"{self.members_key}:rebuild:{token}"
+        rows = TournamentLeaderboard.objects.filter(tournament_id=self.tournament_id).values_list(
+            'id', 'user_id', 'guest_user_id', 'total_score', 'last_attempt_datetime'
+        )
+
+        count = 0
+
+        def flush(batch):
+            pipe = self.redis.pipeline()
+            pipe.zadd(tmp_key, {member: score for _, member, score in batch})
+            pipe.hset(tmp_members_key, mapping={participant: member for participant, member, _ in batch})
+            # Scratch keys of an interrupted rebuild expire on their own
+            pipe.expire(tmp_key, REBUILD_LOCK_TIMEOUT)
+            pipe.expire(tmp_members_key, REBUILD_LOCK_TIMEOUT)
+            pipe.execute()
+
+        batch = []
+        for pk, user_id, guest_user_id, total_score, last_attempt in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+            participant = participant_member(user_id, guest_user_id)
+            batch.append((participant, encode_member(pk, last_attempt, participant), float(total_score or 0)))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                flush(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            flush(batch)
+            count += len(batch)
+
+        pipe = self.redis.pipeline()
+        if count:
+            pipe.rename(tmp_key, self.key)
+            pipe.rename(tmp_members_key, self.members_key)
+            pipe.persist(self.key)
+            pipe.persist(self.members_key)
+        else:
+            pipe.delete(self.key, self.members_key)
+        pipe.set(self.ready_key, 1)
+        pipe.execute()
+        return count
+
+    def _apply_dirty(self):
+        while True:
+            participants = self.redis.spop(self.dirty_key, REBUILD_BATCH_SIZE)
+            if not participants:
+                return
+            parsed = [parse_member(p) for p in participants]
+            user_ids = [user_id for user_id, _ in parsed if user_id]
+            guest_ids = [guest_id for _, guest_id in parsed if guest_id]
+            entries = {
+                participant_member(entry.user_id, entry.guest_user_id): entry
+                for entry in TournamentLeaderboard.objects.filter(tournament_id=self.tournament_id).filter(
+                    Q(user_id__in=user_ids) | Q(guest_user_id__in=guest_ids)
+                )
+            }
+            for participant in participants:
+                participant = participant.decode() if isinstance(participant, bytes) else participant
+                entry = entries.get(participant)
+                if entry is None:
+                    self._discard(participant)
+                else:
+                    self._record(entry)
+
+    def schedule_rebuild(self):
+        """Rebuild in a background thread unless this process already is."""
+        cls = TournamentLeaderboardEngine
+        with cls._rebuilding_lock:
+            if self.tournament_id in cls._rebuilding:
+                return
+            cls._rebuilding.add(self.tournament_id)
+
+        def run():
+            try:
+                TournamentLeaderboardEngine(self.tournament_id).rebuild()
+            except Exception:
+                logger.exception("Leaderboard %s: background rebuild failed", self.tournament_id)
+            finally:
+                close_old_connections()
+                with cls._rebuilding_lock:
+                    cls._rebuilding.discard(self.tournament_id)
+
+        threading.Thread(target=run, name=f'leaderboard-rebuild-{self.tournament_id}', daemon=True).start()
+
+    def ensure(self):
+        """Raise LeaderboardNotReady, and start a rebuild, if the set has not been loaded."""
+        if not self.redis.exists(self.ready_key):
+            self.schedule_rebuild()
+            raise LeaderboardNotReady(f"Leaderboard {self.tournament_id} is being rebuilt.")
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def size(self):
+        self.ensure()
+        return self.redis.zcard(self.key)
+
+    def rank(self, user_id=None, guest_user_id=None):
+        """1-based rank of a participant, or None if not on the leaderboard."""
+        self.ensure()
+        position = self._scripts()._rank_script(
+            keys=[self.key, self.members_key],
+            args=[participant_member(user_id, guest_user_id)],
+            client=self.redis,
+        )
+        return None if position is None else position + 1
+
+    def entry_rank(self, entry):
+        """
+        1-based rank of a TournamentLeaderboard row, or None if the set does
+        not hold the row as it is now (missing, or a write not mirrored yet).
+        """
+        self.ensure()
+        position = self._scripts()._entry_rank_script(
+            keys=[self.key],
+            args=[entry_member(entry), float(entry.total_score or 0)],
+            client=self.redis,
+        )
+        return None if position is None else position + 1
+
+    def page(self, offset=0, limit=None):
+        """Entries ranked offset+1 .. offset+limit (all remaining if limit is None)."""
+        self.ensure()
+        stop = -1 if limit is None else offset + limit - 1
+        members = self.redis.zrevrange(self.key, offset, stop, withscores=True)
+        entries = []
+        for position, (member, total_score) in enumerate(members, start=offset + 1):
+            pk, last_attempt, user_id, guest_user_id = decode_member(member)
+            entries.append({
+                "rank": position,
+                "id": pk,
+                "user_id": user_id,
+                "guest_user_id": guest_user_id,
+                "total_score": total_score,
+                "last_attempt_datetime": last_attempt,
+            })
+        return entries
+
+    def top(self, n):
+        return self.page(0, n)
@@ -0,0 +1,11 @@
+from tournaments.models import TournamentAttempt, TournamentParticipantStats
+from users.participant_stats import ParticipantStatsCommand
+
+
+class Command(ParticipantStatsCommand):
+    help = (
+        "Backfill TournamentParticipantStats from raw TournamentAttempt rows, "
+        "or compare the two with --verify."
+    )
+    model = TournamentParticipantStats
+    attempt_model = TournamentAttempt
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from tournaments.models import Tournament
+from tournaments.winners import compute_winners
+
+
+class Command(BaseCommand):
+    help = (
+        "Rank ended daily/weekly/overall prize periods and record TournamentWinner rows. "
+        "Safe to re-run; periods that already have winners are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tournament', type=int, action='append', dest='tournament_ids',
+            help="Tournament ID to compute (repeatable). Defaults to every tournament with prizes.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Tournament.objects.filter(prizes__isnull=False).distinct()
+        if options['tournament_ids']:
+            queryset = queryset.filter(pk__in=options['tournament_ids'])
+
+        for tournament in queryset:
+            created = compute_winners(tournament)
+            self.stdout.write(f"Tournament {tournament.id}: {created} winners recorded.")
+
+        self.stdout.write(self.style.SUCCESS("Winners computed."))
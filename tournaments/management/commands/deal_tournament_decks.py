@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tournaments.decks import DeckDealer
+from tournaments.models import Tournament
+
+
+class Command(BaseCommand):
+    help = "Pre-deal question decks for active tournaments so attempts start without live selection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run one dealing pass and exit.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between passes (default 5).")
+
+    def deal_all(self):
+        for tournament in Tournament.objects.active():
+            personal, anonymous = DeckDealer(tournament).deal()
+            if personal or anonymous:
+                self.stdout.write(f"Tournament {tournament.id}: dealt {personal} personal, {anonymous} anonymous decks.")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.deal_all()
+            return
+
+        self.stdout.write("Deck dealer running.")
+        while True:
+            self.deal_all()
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tournaments.leaderboard import TournamentLeaderboardEngine
+from tournaments.models import Tournament
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the Redis sorted-set leaderboards from TournamentLeaderboard rows. "
+        "Use after a Redis flush/cold start or to repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tournament', type=int, action='append', dest='tournament_ids',
+            help="Tournament ID to rebuild (repeatable). Defaults to every tournament.",
+        )
+
+    def handle(self, *args, **options):
+        tournament_ids = options['tournament_ids']
+        queryset = Tournament.objects.all()
+        if tournament_ids:
+            queryset = queryset.filter(pk__in=tournament_ids)
+            missing = set(tournament_ids) - set(queryset.values_list('pk', flat=True))
+            if missing:
+                raise CommandError(f"Unknown tournament ID(s): {', '.join(map(str, sorted(missing)))}")
+
+        for tournament_id in queryset.values_list('pk', flat=True):
+            count = TournamentLeaderboardEngine(tournament_id).rebuild()
+            if count is None:
+                self.stdout.write(f"Tournament {tournament_id}: skipped, a rebuild is already running.")
+            else:
+                self.stdout.write(f"Tournament {tournament_id}: {count} leaderboard entries loaded.")
+
+        self.stdout.write(self.style.SUCCESS("Leaderboards rebuilt."))
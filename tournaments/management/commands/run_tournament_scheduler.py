@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tournaments.scheduler import MAX_SLEEP_SECONDS, scheduler
+
+
+class Command(BaseCommand):
+    help = "Flip tournament statuses (upcoming -> active -> finished) at their start/end boundaries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Apply due transitions once and exit.")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            activated, finished = scheduler.tick()
+            self.stdout.write(f"{activated} activated, {finished} finished.")
+            return
+
+        self.stdout.write("Tournament status scheduler running.")
+        while True:
+            scheduler.tick()
+            delay = scheduler.seconds_until_next()
+            time.sleep(delay)
+            if delay >= MAX_SLEEP_SECONDS:
+                # Woke up on the cap rather than a boundary: re-read the next
+                # boundary in case tournaments changed in another process.
+                scheduler.invalidate()
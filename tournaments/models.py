@@ -5,7 +5,7 @@ from django.utils import timezone # For timezone.now()
 from wordMaster.models import *
 # Assuming UserOpenAccount is in your 'user' app's models.py
 # You need to make sure this import path is correct for your project structure
-from users.models import UserOpenAccount 
+from users.models import ParticipantStats, UserOpenAccount, participant_key
 
 # Assuming Question is in your 'quiz' app's models.py
 # You need to make sure this import path is correct for your project structure
@@ -15,21 +15,28 @@ User = get_user_model()
 
 
 
-class TournamentManager(models.Manager):
-    def get_queryset(self):
-        # Override the default queryset to include a status update check
-        queryset = super().get_queryset()
-        
-        # Get the current time
-        now = timezone.now()
+class TournamentQuerySet(models.QuerySet):
+    """
+    Status transitions are written by the scheduler (see tournaments/scheduler.py),
+    so the stored status can lag a boundary by up to one scheduler tick. These
+    filters go by the schedule itself and never depend on that lag.
+    """
+
+    def active(self, now=None):
+        now = now or timezone.now()
+        return self.filter(
+            status__in=Tournament.SCHEDULED_STATUSES,
+            start_date__lte=now,
+            end_date__gt=now,
+        )
 
-        # Update 'upcoming' tournaments to 'active'
-        queryset.filter(status='upcoming', start_date__lte=now).update(status='active')
-        
-        # Update 'active' tournaments to 'finished'
-        queryset.filter(status='active', end_date__lte=now).update(status='finished')
-        
-        return queryset
+    def upcoming(self, now=None):
+        now = now or timezone.now()
+        return self.filter(status__in=Tournament.SCHEDULED_STATUSES, start_date__gt=now)
+
+
+class TournamentManager(models.Manager.from_queryset(TournamentQuerySet)):
+    pass
     
     
 class Tournament(models.Model):
@@ -79,6 +86,10 @@ class Tournament(models.Model):
         help_text="The pool of questions from which users will be tested."
     )
     
+    # Bumped whenever questions leave the pool, i.e. whenever pool positions
+    # shift; seen-question bitmaps from an older epoch are rebuilt.
+    question_pool_epoch = models.PositiveIntegerField(default=0, editable=False)
+    
     # Puzzle items
     wordpuzzles = models.ManyToManyField(
         WordPuzzle,
@@ -127,6 +138,9 @@ class Tournament(models.Model):
         default='upcoming',
         help_text="Current administrative status of the tournament."
     )
+    # Statuses driven by start_date/end_date. 'finished' and 'archived' are
+    # final: once stored, whether by the schedule or by hand, they stay.
+    SCHEDULED_STATUSES = ('upcoming', 'active')
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -138,29 +152,43 @@ class Tournament(models.Model):
         verbose_name = "Tournament"
         verbose_name_plural = "Tournaments"
         ordering = ['-start_date', 'title'] # Order by latest starting tournaments
+        indexes = [
+            # Used by the status scheduler and Tournament.objects.active()
+            models.Index(fields=['status', 'start_date'], name='tournament_status_start_idx'),
+            models.Index(fields=['status', 'end_date'], name='tournament_status_end_idx'),
+        ]
     
     
     
     def save(self, *args, **kwargs):
         """
         Overrides the save method to automatically update the status
-        based on the tournament's start and end dates.
+        based on the tournament's start and end dates. A tournament that is
+        finished or archived keeps that status.
         """
-        now = timezone.now()
-        
-        # Check if the tournament should be active
-        if self.start_date <= now and self.end_date > now:
-            self.status = 'active'
-        # Check if the tournament should be finished
-        elif self.end_date <= now:
-            self.status = 'finished'
-        # Otherwise, the tournament is upcoming
-        else:
-            self.status = 'upcoming'
+        if self.status in self.SCHEDULED_STATUSES:
+            self.status = self.status_at(timezone.now())
 
         # Call the original save() method
         super().save(*args, **kwargs)
 
+    def status_at(self, now):
+        if self.status not in self.SCHEDULED_STATUSES:
+            return self.status
+        if self.end_date <= now:
+            return 'finished'
+        if self.start_date <= now:
+            return 'active'
+        return 'upcoming'
+
+    @property
+    def effective_status(self):
+        """
+        Status according to the schedule, computed in memory. Use this instead of
+        `status` on read paths: the stored value is only flipped by the scheduler.
+        """
+        return self.status_at(timezone.now())
+
     def __str__(self):
         return self.title
     
@@ -293,6 +321,9 @@ class TournamentWinner(models.Model):
     winning_rank = models.PositiveIntegerField(
         help_text="The rank of the winner at the time of winning the prize."
     )
+    period_start = models.DateField(
+        help_text="First day of the daily/weekly period the prize was won in (the tournament's start date for overall prizes)."
+    )
     award_date = models.DateTimeField(
         auto_now_add=True,
         help_text="The date and time the prize was awarded/determined."
@@ -314,8 +345,8 @@ class TournamentWinner(models.Model):
     class Meta:
         verbose_name = "Tournament Winner"
         verbose_name_plural = "Tournament Winners"
-        # Prevent awarding the same prize to the same user multiple times for the same tournament
-        unique_together = ('tournament', 'prize', 'user', 'guest_user')
+        # One winner per prize rank and period, so recomputing a period never awards it twice
+        unique_together = ('tournament', 'prize', 'period_start', 'winning_rank')
         ordering = ['-award_date']
         constraints = [
             models.CheckConstraint(
@@ -390,6 +421,10 @@ class TournamentAttempt(models.Model):
         verbose_name = "Tournament Attempt"
         verbose_name_plural = "Tournament Attempts"
         ordering = ['-attempt_date'] # Most recent attempts first
+        indexes = [
+            # Ranks a daily/weekly prize period (tournaments/winners.py)
+            models.Index(fields=['tournament', 'is_completed', 'attempt_date'], name='tournament_attempt_period_idx'),
+        ]
         # Constraint to ensure either user or guest_user is set, but not both
         constraints = [
             models.CheckConstraint(
@@ -482,6 +517,13 @@ class TournamentLeaderboard(models.Model):
                 name='either_user_or_guest_user_for_tournament_leaderboard'
             )
         ]
+        indexes = [
+            # Keyset pagination over (-total_score, last_attempt_datetime, id)
+            models.Index(
+                fields=['tournament', '-total_score', 'last_attempt_datetime', 'id'],
+                name='tournament_lb_keyset_idx',
+            ),
+        ]
 
     def __str__(self):
         participant = "Unknown"
@@ -489,4 +531,75 @@ class TournamentLeaderboard(models.Model):
             participant = self.user.email
         elif self.guest_user:
             participant = self.guest_user.id
-        return f"{participant} - {self.tournament.title} - Top Score: {self.total_score}"
\ No newline at end of file
+        return f"{participant} - {self.tournament.title} - Top Score: {self.total_score}"
+
+class TournamentParticipantStats(ParticipantStats):
+    """
+    Running per-participant totals over every attempt in a tournament.
+
+    Maintained incrementally by the start/submit attempt views so the active
+    leaderboards endpoint is a single indexed read per tournament. Rebuild or
+    verify against TournamentAttempt with `manage.py backfill_tournament_stats`.
+    """
+    scope = 'tournament'
+
+    tournament = models.ForeignKey(
+        Tournament,
+        on_delete=models.CASCADE,
+        related_name='participant_stats',
+        help_text="The tournament these totals belong to."
+    )
+
+    class Meta:
+        verbose_name = "Tournament Participant Stats"
+        verbose_name_plural = "Tournament Participant Stats"
+        unique_together = ('tournament', 'participant')
+        indexes = [
+            models.Index(
+                fields=['tournament', '-total_score', 'attempts', 'first_attempt_date'],
+                name='tournament_stats_rank_idx',
+            ),
+        ]
+
+    @classmethod
+    def record_attempt_started(cls, attempt):
+        """Count a newly created attempt. Call inside the attempt's transaction."""
+        cls.record(attempt, 0, started=True)
+
+    @classmethod
+    def record_attempt_score(cls, attempt):
+        """Add a submitted attempt's score. Call inside the submit transaction."""
+        cls.record(attempt, attempt.score)
+
+
+class TournamentSeenQuestions(models.Model):
+    """
+    Bitmap of the pool questions a participant has already been served in
+    completed attempts. Bit i refers to position i of the tournament's question
+    pool (see tournaments/question_pool.py), valid for `pool_epoch`.
+    """
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='seen_questions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    guest_user = models.ForeignKey(UserOpenAccount, on_delete=models.CASCADE, null=True, blank=True)
+    # "u:<user_id>" or "g:<guest_user_id>"
+    participant = models.CharField(max_length=32)
+
+    bitmap = models.BinaryField(default=b'')
+    pool_epoch = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tournament Seen Questions"
+        verbose_name_plural = "Tournament Seen Questions"
+        unique_together = ('tournament', 'participant')
+
+    def __str__(self):
+        return f"{self.participant} - {self.tournament_id}"
+
+    @property
+    def bits(self):
+        return int.from_bytes(bytes(self.bitmap), 'little')
+
+    @bits.setter
+    def bits(self, value):
+        self.bitmap = value.to_bytes((value.bit_length() + 7) // 8, 'little')
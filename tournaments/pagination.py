@@ -0,0 +1,124 @@
+# tournaments/pagination.py
+"""
+Keyset (cursor) pagination for tournament leaderboards.
+
+Pages are ordered by (-total_score, last_attempt_datetime, id) and a cursor
+is the sort key of the last row served plus its rank. The next page is a
+``WHERE (sort key) > cursor ... LIMIT n`` range read on
+``tournament_lb_keyset_idx``, so page 10,000 costs the same as page one and
+rows inserted meanwhile never shift entries between pages.
+
+MySQL sorts NULL first in ascending order, so the tie-break below treats a
+NULL last_attempt_datetime as the smallest value.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from redis.exceptions import RedisError
+
+from .leaderboard import TournamentLeaderboardEngine
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+LEADERBOARD_ORDERING = ('-total_score', 'last_attempt_datetime', 'id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(entry, rank):
+    last_attempt = entry.last_attempt_datetime.isoformat() if entry.last_attempt_datetime else None
+    raw = json.dumps([entry.total_score, last_attempt, entry.id, rank], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (total_score, last_attempt_datetime, id, rank) or raise InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        total_score, last_attempt, pk, rank = json.loads(raw)
+        if last_attempt is not None:
+            last_attempt = parse_datetime(last_attempt)
+            if last_attempt is None:
+                raise ValueError
+        return float(total_score), last_attempt, int(pk), int(rank)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor.")
+
+
+def rows_after(queryset, total_score, last_attempt, pk):
+    """Rows that sort strictly after the given key."""
+    if last_attempt is None:
+        same_score_after = (
+            Q(last_attempt_datetime__isnull=True, id__gt=pk) | Q(last_attempt_datetime__isnull=False)
+        )
+    else:
+        same_score_after = (
+            Q(last_attempt_datetime__gt=last_attempt) | Q(last_attempt_datetime=last_attempt, id__gt=pk)
+        )
+    return queryset.filter(Q(total_score__lt=total_score) | (Q(total_score=total_score) & same_score_after))
+
+
+def rows_before(queryset, total_score, last_attempt, pk):
+    """Rows that sort strictly before the given key."""
+    if last_attempt is None:
+        same_score_before = Q(last_attempt_datetime__isnull=True, id__lt=pk)
+    else:
+        same_score_before = (
+            Q(last_attempt_datetime__isnull=True)
+            | Q(last_attempt_datetime__lt=last_attempt)
+            | Q(last_attempt_datetime=last_attempt, id__lt=pk)
+        )
+    return queryset.filter(Q(total_score__gt=total_score) | (Q(total_score=total_score) & same_score_before))
+
+
+def rank_window(queryset, entry, k):
+    """
+    The entry's exact rank and up to k neighbours on each side.
+
+    The rank is a ZREVRANK on the tournament's Redis set, which orders rows
+    the same way (tournaments/leaderboard.py), and each side is a LIMIT k
+    range read on the keyset index. When Redis is down, cold or behind
+    MySQL, the rank falls back to a COUNT of the rows ahead, which is
+    O(rank). Returns (rank, entries) with `rank` set on every entry.
+    """
+    key = (entry.total_score, entry.last_attempt_datetime, entry.id)
+    try:
+        rank = TournamentLeaderboardEngine(entry.tournament_id).entry_rank(entry)
+    except RedisError:
+        rank = None
+    if rank is None:
+        rank = rows_before(queryset.order_by(), *key).count() + 1
+
+    above = list(rows_before(queryset, *key).order_by('total_score', '-last_attempt_datetime', '-id')[:k])
+    above.reverse()
+    below = list(rows_after(queryset, *key).order_by(*LEADERBOARD_ORDERING)[:k])
+
+    entries = above + [entry] + below
+    for position, row in enumerate(entries, start=rank - len(above)):
+        row.rank = position
+    return rank, entries
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of `queryset` (already filtered to a tournament) after `cursor`.
+    Returns (entries, next_cursor); entries carry a `rank` attribute and
+    next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(*LEADERBOARD_ORDERING)
+    rank = 0
+    if cursor:
+        total_score, last_attempt, pk, rank = decode_cursor(cursor)
+        queryset = rows_after(queryset, total_score, last_attempt, pk)
+
+    entries = list(queryset[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    for position, entry in enumerate(entries, start=rank + 1):
+        entry.rank = position
+    next_cursor = encode_cursor(entries[-1], entries[-1].rank) if has_more else None
+    return entries, next_cursor
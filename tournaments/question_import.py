@@ -0,0 +1,100 @@
+# tournaments/question_import.py
+"""
+Excel importer for tournament questions.
+
+Workbooks are streamed in chunks by quiz/question_import.py, so memory stays
+flat however large the upload is. Each chunk is validated column-wise with
+pandas and written in its own transaction with three bulk inserts: questions,
+options and the tournament's question M2M rows.
+
+Expected columns: Question, Option1..Option4, Answer. Answer can be
+  - an option letter 'a'..'d' (case insensitive)
+  - 'option1'..'option4' (case insensitive)
+  - the exact option text (case insensitive); every matching option is correct
+  - the exact question text, which marks the first option correct
+Rows that fail validation are skipped and reported with their row number.
+"""
+import pandas as pd
+from django.db import transaction
+
+from quiz.models import Question, Option
+from quiz.question_import import first_errors, text_column
+from quiz.utils.bulk import bulk_create_with_ids
+from .models import Tournament
+from .question_pool import invalidate_pool
+
+OPTION_COUNT = 4
+OPTION_LETTERS = {'a': 0, 'b': 1, 'c': 2, 'd': 3}
+OPTION_NAMES = {'option1': 0, 'option2': 1, 'option3': 2, 'option4': 3}
+
+
+def validate_chunk(df):
+    """
+    Return (rows, errors) where rows is a list of
+    (question_text, [(option_text, is_correct), ...]) for the valid rows.
+    """
+    question = text_column(df, 'question', 'questiontext')
+    answer = text_column(df, 'answer').str.lower()
+    options = [text_column(df, f'option{i}') for i in range(1, OPTION_COUNT + 1)]
+
+    answer_index = answer.map(OPTION_LETTERS).fillna(answer.map(OPTION_NAMES))
+    by_index = answer_index.notna()
+    question_matches = (question.str.lower() == answer).fillna(False)
+
+    correct = []
+    for i, option in enumerate(options):
+        by_text = (option.str.lower() == answer).fillna(False)
+        if i == 0:
+            by_text |= question_matches
+        is_correct = (by_index & (answer_index == i)) | (~by_index & by_text)
+        correct.append(is_correct.fillna(False) & option.notna())
+
+    has_option = pd.concat([option.notna() for option in options], axis=1).any(axis=1)
+    has_correct = pd.concat(correct, axis=1).any(axis=1)
+
+    errors, failed = first_errors(df.index, [
+        (question.isna(), lambda row: "'Question' column is missing or empty."),
+        (answer.isna(), lambda row: "'Answer' column is missing or empty."),
+        (~has_option, lambda row: f"No options found for question '{question[row]}'."),
+        (~has_correct, lambda row: f"No correct option matched for question '{question[row]}' with answer '{answer[row]}'."),
+    ])
+
+    rows = []
+    for row in failed[~failed].index:
+        rows.append((
+            question[row],
+            [(options[i][row], bool(correct[i][row])) for i in range(OPTION_COUNT) if not pd.isna(options[i][row])],
+        ))
+    return rows, errors
+
+
+def write_chunk(tournament, rows):
+    """Insert one validated chunk: one INSERT each for questions, options and pool rows."""
+    with transaction.atomic():
+        questions = bulk_create_with_ids(Question, [Question(question_text=text) for text, _ in rows])
+        Option.objects.bulk_create([
+            Option(question_id=question.pk, option_text=option_text, is_correct=is_correct)
+            for question, (_, options) in zip(questions, rows)
+            for option_text, is_correct in options
+        ])
+        through = Tournament.questions.through
+        through.objects.bulk_create([
+            through(tournament_id=tournament.pk, question_id=question.pk) for question in questions
+        ])
+        # Bulk inserts send no m2m_changed; new questions only append to the pool
+        invalidate_pool([tournament.pk])
+    return questions
+
+
+class TournamentQuestionImporter:
+    """Importer (see quiz/question_import.py) for a tournament's question pool."""
+    required_columns = ()
+
+    def __init__(self, job):
+        self.tournament = Tournament.objects.get(pk=job.target_id)
+
+    def validate(self, df):
+        return validate_chunk(df)
+
+    def write(self, rows):
+        return len(write_chunk(self.tournament, rows))
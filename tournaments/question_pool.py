@@ -0,0 +1,244 @@
+# tournaments/question_pool.py
+"""
+Question pool index and per-participant seen-question bitmaps.
+
+A tournament's pool is the ordered list of its question ids (ordered by the M2M
+through row, so newly added questions are appended and existing positions don't
+move). It is cached under a stamp that changes on every pool edit, and kept in
+process memory once loaded, so a request only pays one cache GET to check it.
+
+Each participant has a TournamentSeenQuestions row whose bit i means "pool
+position i was served in a completed attempt". Picking the next attempt's
+questions is then a bitwise operation on the pool index plus one query for the
+chosen questions, regardless of how many attempts the participant has made.
+
+Removing questions shifts positions, so it bumps Tournament.question_pool_epoch;
+bitmaps from an older epoch are rebuilt from the participant's attempts once.
+"""
+import random
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.utils import IntegrityError
+from rest_framework.exceptions import ValidationError
+
+from quiz.models import Question
+from .models import Tournament, TournamentAttempt, TournamentSeenQuestions, participant_key
+
+POOL_CACHE_TIMEOUT = 60 * 60 * 24
+# Rejection-sampling budget per requested question before falling back to
+# enumerating the unseen positions.
+SAMPLE_TRIES_PER_QUESTION = 32
+
+_local_pools = {}
+_local_lock = threading.Lock()
+
+
+def _stamp_key(tournament_id):
+    return f"tournament:{tournament_id}:pool:stamp"
+
+
+def _pool_key(tournament_id):
+    return f"tournament:{tournament_id}:pool"
+
+
+class QuestionPool:
+    """Immutable snapshot of a tournament's ordered question ids."""
+
+    def __init__(self, stamp, epoch, question_ids):
+        self.stamp = stamp
+        self.epoch = epoch
+        self.question_ids = question_ids
+        self._positions = None
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = {qid: pos for pos, qid in enumerate(self.question_ids)}
+        return self._positions
+
+    @property
+    def mask(self):
+        return (1 << len(self.question_ids)) - 1
+
+    def bits_for(self, question_ids):
+        """Bitmap with the positions of the given questions set (unknown ids ignored)."""
+        bits = 0
+        positions = self.positions
+        for qid in question_ids:
+            pos = positions.get(qid)
+            if pos is not None:
+                bits |= 1 << pos
+        return bits
+
+
+def get_pool(tournament):
+    tournament_id = tournament.pk
+    stamp = cache.get(_stamp_key(tournament_id))
+
+    local = _local_pools.get(tournament_id)
+    if stamp is not None and local is not None and local.stamp == stamp:
+        return local
+
+    pool = None
+    if stamp is not None:
+        cached = cache.get(_pool_key(tournament_id))
+        if cached and cached[0] == stamp:
+            pool = QuestionPool(*cached)
+
+    if pool is None:
+        if stamp is None:
+            cache.add(_stamp_key(tournament_id), uuid.uuid4().hex, None)
+            stamp = cache.get(_stamp_key(tournament_id))
+        epoch = Tournament.objects.filter(pk=tournament_id).values_list('question_pool_epoch', flat=True).first() or 0
+        question_ids = list(
+            Tournament.questions.through.objects
+            .filter(tournament_id=tournament_id)
+            .order_by('id')
+            .values_list('question_id', flat=True)
+        )
+        pool = QuestionPool(stamp, epoch, question_ids)
+        cache.set(_pool_key(tournament_id), (stamp, epoch, question_ids), POOL_CACHE_TIMEOUT)
+
+    with _local_lock:
+        _local_pools[tournament_id] = pool
+    return pool
+
+
+def invalidate_pool(tournament_ids, shifted=False):
+    """
+    Call after changing tournament question pools. `shifted` means questions
+    were removed (positions moved), which invalidates seen-question bitmaps.
+    """
+    tournament_ids = list(tournament_ids)
+    if not tournament_ids:
+        return
+    if shifted:
+        Tournament.objects.filter(pk__in=tournament_ids).update(question_pool_epoch=F('question_pool_epoch') + 1)
+
+    def bump():
+        cache.set_many({_stamp_key(tid): uuid.uuid4().hex for tid in tournament_ids}, None)
+    transaction.on_commit(bump)
+
+
+# ---------------------------
+# Seen-question bitmaps
+# ---------------------------
+def _completed_question_ids(tournament, user=None, guest_user=None):
+    through = TournamentAttempt.questions_attempted.through
+    attempts = through.objects.filter(
+        tournamentattempt__tournament=tournament,
+        tournamentattempt__is_completed=True,
+    )
+    if user:
+        attempts = attempts.filter(tournamentattempt__user=user)
+    else:
+        attempts = attempts.filter(tournamentattempt__guest_user=guest_user)
+    return attempts.values_list('question_id', flat=True).distinct()
+
+
+def _load_seen(tournament, pool, user=None, guest_user=None, for_update=False):
+    """Return (row, rebuilt). Rows missing or from an older epoch are rebuilt from attempts."""
+    key = participant_key(getattr(user, 'pk', None), getattr(guest_user, 'pk', None))
+    rows = TournamentSeenQuestions.objects.filter(tournament=tournament, participant=key)
+    if for_update:
+        rows = rows.select_for_update()
+    row = rows.first()
+    if row is not None and row.pool_epoch == pool.epoch:
+        return row, False
+
+    if row is None:
+        row = TournamentSeenQuestions(tournament=tournament, user=user, guest_user=guest_user, participant=key)
+    row.bits = pool.bits_for(_completed_question_ids(tournament, user, guest_user))
+    row.pool_epoch = pool.epoch
+    return row, True
+
+
+def _save_seen(row):
+    try:
+        with transaction.atomic():
+            row.save()
+        return True
+    except IntegrityError:
+        # Created concurrently; the other writer's row wins
+        return False
+
+
+def seen_bits(tournament, pool, user=None, guest_user=None):
+    """The participant's seen bitmap for the current pool epoch (one query when up to date)."""
+    row, rebuilt = _load_seen(tournament, pool, user, guest_user)
+    if rebuilt:
+        # Saved even when empty, so the rebuild query runs once per epoch
+        _save_seen(row)
+    return row.bits
+
+
+def _iter_set_bits(value):
+    while value:
+        lowest = value & -value
+        yield lowest.bit_length() - 1
+        value ^= lowest
+
+
+def _sample_positions(available, size, k):
+    picked = set()
+    for _ in range(k * SAMPLE_TRIES_PER_QUESTION):
+        pos = random.randrange(size)
+        if (available >> pos) & 1:
+            picked.add(pos)
+            if len(picked) == k:
+                # A set of small ints iterates in ascending order
+                positions = list(picked)
+                random.shuffle(positions)
+                return positions
+    # Sparse bitmap: enumerate what's left instead of rejecting forever
+    return random.sample(list(_iter_set_bits(available)), k)
+
+
+def pick_positions(pool, seen_bits, k):
+    """
+    Up to k pool positions not set in `seen_bits`, in random order. Raises
+    ValidationError when every position has been seen.
+    """
+    available = pool.mask & ~seen_bits
+    available_count = available.bit_count()
+    if not available_count:
+        raise ValidationError("You have attempted all unique questions.")
+    if available_count <= k:
+        positions = list(_iter_set_bits(available))
+        random.shuffle(positions)
+        return positions
+    return _sample_positions(available, len(pool), k)
+
+
+def select_unseen_questions(tournament, user=None, guest_user=None):
+    """
+    Pick up to `max_questions_per_attempt` pool questions the participant has
+    not seen in a completed attempt. Returns Question instances with options
+    prefetched, or raises ValidationError when the pool is exhausted.
+    """
+    pool = get_pool(tournament)
+    positions = pick_positions(pool, seen_bits(tournament, pool, user, guest_user), tournament.max_questions_per_attempt)
+    chosen_ids = [pool.question_ids[pos] for pos in positions]
+    by_id = Question.objects.prefetch_related('options').in_bulk(chosen_ids)
+    return [by_id[qid] for qid in chosen_ids if qid in by_id]
+
+
+def mark_questions_seen(attempt, question_ids):
+    """OR a completed attempt's questions into the bitmap. Call inside the submit transaction."""
+    tournament = attempt.tournament
+    pool = get_pool(tournament)
+    bits = pool.bits_for(question_ids)
+
+    row, _ = _load_seen(tournament, pool, attempt.user, attempt.guest_user, for_update=True)
+    row.bits = row.bits | bits
+    if not _save_seen(row):
+        row, _ = _load_seen(tournament, pool, attempt.user, attempt.guest_user, for_update=True)
+        row.bits = row.bits | bits
+        row.save()
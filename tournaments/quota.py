@@ -0,0 +1,256 @@
+# tournaments/quota.py
+"""
+Attempt quotas (max_total_attempts / max_attempts_per_day) enforced with Redis.
+
+As before, only completed attempts count against the limits. Each
+(tournament, participant) has a counter of completed attempts in total and one
+per day, seeded from MySQL when missing (cold cache, new day). The day buckets
+expire on their own.
+
+Starting an attempt also takes a reservation, so that concurrent starts can't
+all pass the check for the last slot. A reservation lives in a sorted set,
+scored by when it expires: at the attempt's deadline (duration_minutes), or
+after RESERVATION_TTL for attempts with no time limit. The limits are checked
+against completed + live reservations. Checking, dropping expired reservations
+and taking a new one is a single Lua script, so it is one round-trip.
+
+A reservation ends one of three ways:
+
+    complete()  the attempt was submitted; it now counts as completed
+    release()   the attempt could not be created after all
+    expiry      the attempt was abandoned and no longer holds a slot
+"""
+import logging
+import uuid
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .models import TournamentAttempt, participant_key
+
+logger = logging.getLogger(__name__)
+
+DAY_BUCKET_TTL = 60 * 60 * 48
+MIN_TOTAL_TTL = 60 * 60 * 24
+# How long an attempt without a time limit holds its slot
+RESERVATION_TTL = getattr(settings, 'TOURNAMENT_ATTEMPT_RESERVATION_TTL', 60 * 60)
+RESERVATION_GRACE = 60
+
+# KEYS[1] total counter, KEYS[2] day counter, KEYS[3] reservations, KEYS[4] day reservations
+# ARGV[1] max total (-1 = unlimited), ARGV[2] max per day, ARGV[3] now,
+# ARGV[4] reservation expiry, ARGV[5] reservation id, ARGV[6] reservation set TTL
+# Returns -1 when a counter needs seeding, 1/2 when the total/daily limit is hit, 0 on success.
+RESERVE_SCRIPT = """
+local total = redis.call('GET', KEYS[1])
+local daily = redis.call('GET', KEYS[2])
+if not total or not daily then
+    return -1
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', ARGV[3])
+local max_total = tonumber(ARGV[1])
+if max_total >= 0 and tonumber(total) + redis.call('ZCARD', KEYS[3]) >= max_total then
+    return 1
+end
+if tonumber(daily) + redis.call('ZCARD', KEYS[4]) >= tonumber(ARGV[2]) then
+    return 2
+end
+for i = 3, 4 do
+    redis.call('ZADD', KEYS[i], ARGV[4], ARGV[5])
+    if redis.call('TTL', KEYS[i]) < tonumber(ARGV[6]) then
+        redis.call('EXPIRE', KEYS[i], ARGV[6])
+    end
+end
+return 0
+"""
+
+# KEYS[1] reservations, KEYS[2] day reservations
+# ARGV[1] reservation id, ARGV[2] the attempt's member
+# Re-keys a reservation by its attempt, keeping its expiry.
+CONFIRM_SCRIPT = """
+for i = 1, 2 do
+    local expires = redis.call('ZSCORE', KEYS[i], ARGV[1])
+    if expires then
+        redis.call('ZREM', KEYS[i], ARGV[1])
+        redis.call('ZADD', KEYS[i], expires, ARGV[2])
+    end
+end
+return 0
+"""
+
+# KEYS as RESERVE_SCRIPT; ARGV[1] the attempt's member
+# Turns the attempt's reservation, if it still has one, into a completed attempt.
+COMPLETE_SCRIPT = """
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+for i = 1, 2 do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('INCR', KEYS[i])
+    end
+end
+return 0
+"""
+
+TOTAL_LIMIT_MESSAGE = "Maximum total attempts reached."
+DAILY_LIMIT_MESSAGE = "Maximum daily attempts reached."
+
+
+class AttemptQuotaExceeded(Exception):
+    pass
+
+
+class AttemptQuota:
+    _reserve = None
+    _confirm = None
+    _complete = None
+
+    def __init__(self, tournament, user=None, guest_user=None, now=None, connection=None):
+        self.tournament = tournament
+        self.user = user
+        self.guest_user = guest_user
+        self.now = now or timezone.now()
+        self._redis = connection
+        self._reservation = None
+
+        participant = participant_key(getattr(user, 'pk', None), getattr(guest_user, 'pk', None))
+        prefix = f"tournament:{tournament.pk}:quota:{participant}"
+        self.total_key = f"{prefix}:total"
+        self.day_key = f"{prefix}:day:{self.now.date():%Y%m%d}"
+        self.reserved_key = f"{prefix}:reserved"
+        self.day_reserved_key = f"{self.day_key}:reserved"
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    def _scripts(self):
+        if AttemptQuota._reserve is None:
+            AttemptQuota._reserve = self.redis.register_script(RESERVE_SCRIPT)
+            AttemptQuota._confirm = self.redis.register_script(CONFIRM_SCRIPT)
+            AttemptQuota._complete = self.redis.register_script(COMPLETE_SCRIPT)
+        return AttemptQuota
+
+    @property
+    def _keys(self):
+        return [self.total_key, self.day_key, self.reserved_key, self.day_reserved_key]
+
+    @staticmethod
+    def _member(attempt):
+        return f"attempt:{attempt.pk}"
+
+    # ---------------------------
+    # MySQL side
+    # ---------------------------
+    def _attempts(self):
+        attempts = TournamentAttempt.objects.filter(tournament=self.tournament, is_completed=True)
+        if self.user:
+            return attempts.filter(user=self.user)
+        return attempts.filter(guest_user=self.guest_user)
+
+    def _day_range(self):
+        day_start = timezone.make_aware(datetime.combine(self.now.date(), time.min))
+        return day_start, day_start + timedelta(days=1)
+
+    def count_from_db(self):
+        """(completed attempts, completed attempts started today)."""
+        attempts = self._attempts()
+        day_start, day_end = self._day_range()
+        return attempts.count(), attempts.filter(attempt_date__gte=day_start, attempt_date__lt=day_end).count()
+
+    def _total_ttl(self):
+        return max(int((self.tournament.end_date - self.now).total_seconds()) + 60 * 60 * 24, MIN_TOTAL_TTL)
+
+    def _seed(self):
+        total, daily = self.count_from_db()
+        pipe = self.redis.pipeline()
+        # NX: never overwrite a counter another request already seeded and bumped
+        pipe.set(self.total_key, total, ex=self._total_ttl(), nx=True)
+        pipe.set(self.day_key, daily, ex=DAY_BUCKET_TTL, nx=True)
+        pipe.execute()
+
+    def _reservation_expiry(self):
+        if self.tournament.duration_minutes:
+            return self.now + timedelta(minutes=self.tournament.duration_minutes, seconds=RESERVATION_GRACE)
+        return self.now + timedelta(seconds=RESERVATION_TTL)
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def reserve(self):
+        """Take one attempt slot or raise AttemptQuotaExceeded."""
+        max_total = self.tournament.max_total_attempts
+        expires = self._reservation_expiry()
+        reservation = uuid.uuid4().hex
+        args = [
+            -1 if max_total is None else max_total, self.tournament.max_attempts_per_day,
+            self.now.timestamp(), expires.timestamp(), reservation,
+            max(int((expires - self.now).total_seconds()), DAY_BUCKET_TTL),
+        ]
+        try:
+            script = self._scripts()._reserve
+            result = script(keys=self._keys, args=args, client=self.redis)
+            if result == -1:
+                self._seed()
+                result = script(keys=self._keys, args=args, client=self.redis)
+            if result == -1:
+                # The counters vanished again (eviction); don't let the start through unchecked
+                logger.warning("Attempt quota counters missing after seeding; checking MySQL counts")
+                result = self._check_db(max_total)
+            elif result == 0:
+                self._reservation = reservation
+        except RedisError as e:
+            logger.warning("Attempt quota falling back to MySQL counts: %s", e)
+            result = self._check_db(max_total)
+
+        if result == 1:
+            raise AttemptQuotaExceeded(TOTAL_LIMIT_MESSAGE)
+        if result == 2:
+            raise AttemptQuotaExceeded(DAILY_LIMIT_MESSAGE)
+
+    def _check_db(self, max_total):
+        # Non-atomic fallback used only when Redis can't answer
+        total, daily = self.count_from_db()
+        if max_total is not None and total >= max_total:
+            return 1
+        if daily >= self.tournament.max_attempts_per_day:
+            return 2
+        return 0
+
+    def confirm(self, attempt):
+        """Tie the slot taken by reserve() to the attempt created for it."""
+        if self._reservation is None:
+            return
+        reservation, self._reservation = self._reservation, None
+        try:
+            self._scripts()._confirm(
+                keys=[self.reserved_key, self.day_reserved_key],
+                args=[reservation, self._member(attempt)],
+                client=self.redis,
+            )
+        except RedisError as e:
+            logger.warning("Could not confirm attempt quota reservation: %s", e)
+
+    def complete(self, attempt):
+        """Count a submitted attempt as completed, ending its reservation."""
+        try:
+            self._scripts()._complete(keys=self._keys, args=[self._member(attempt)], client=self.redis)
+        except RedisError as e:
+            logger.warning("Could not count completed attempt %s: %s", attempt.pk, e)
+
+    def release(self):
+        """Give back a slot taken by reserve() when the attempt was not created."""
+        if self._reservation is None:
+            return
+        reservation, self._reservation = self._reservation, None
+        try:
+            pipe = self.redis.pipeline()
+            pipe.zrem(self.reserved_key, reservation)
+            pipe.zrem(self.day_reserved_key, reservation)
+            pipe.execute()
+        except RedisError as e:
+            logger.warning("Could not release attempt quota slot: %s", e)
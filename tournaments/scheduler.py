@@ -0,0 +1,80 @@
+# tournaments/scheduler.py
+"""
+Writes tournament status transitions (upcoming -> active -> finished) at the
+start_date/end_date boundaries.
+
+This used to happen inside TournamentManager.get_queryset, i.e. two UPDATEs on
+every Tournament.objects access. The scheduler remembers the next boundary, so
+a tick before it costs no query at all; read paths use
+Tournament.effective_status / Tournament.objects.active() in the meantime.
+
+Run it with `python manage.py run_tournament_scheduler`.
+"""
+import logging
+
+from django.conf import settings
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import Tournament
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long the loop sleeps, so tournaments created or edited in
+# another process are picked up without any cross-process signalling.
+MAX_SLEEP_SECONDS = getattr(settings, 'TOURNAMENT_SCHEDULER_MAX_SLEEP', 60)
+
+
+class TournamentStatusScheduler:
+    def __init__(self):
+        self.next_transition = None
+
+    def invalidate(self):
+        """Forget the cached boundary (a tournament's dates changed)."""
+        self.next_transition = None
+
+    def compute_next_transition(self):
+        """Earliest boundary that has not been written yet (may already be due)."""
+        boundaries = Tournament.objects.aggregate(
+            next_start=Min('start_date', filter=Q(status='upcoming')),
+            next_end=Min('end_date', filter=Q(status__in=('upcoming', 'active'))),
+        )
+        candidates = [b for b in boundaries.values() if b is not None]
+        return min(candidates) if candidates else None
+
+    def apply_transitions(self, now):
+        activated = Tournament.objects.filter(
+            status='upcoming', start_date__lte=now, end_date__gt=now
+        ).update(status='active')
+        finished = Tournament.objects.filter(
+            status__in=('upcoming', 'active'), end_date__lte=now
+        ).update(status='finished')
+        if activated or finished:
+            logger.info("Tournament statuses updated: %s activated, %s finished.", activated, finished)
+        return activated, finished
+
+    def tick(self, now=None):
+        """
+        Apply any transition that is due. Returns (activated, finished); before
+        the next known boundary this returns immediately without touching the DB.
+        """
+        now = now or timezone.now()
+        if self.next_transition is None:
+            self.next_transition = self.compute_next_transition()
+        if self.next_transition is None or now < self.next_transition:
+            return 0, 0
+
+        result = self.apply_transitions(now)
+        self.next_transition = self.compute_next_transition()
+        return result
+
+    def seconds_until_next(self, now=None):
+        now = now or timezone.now()
+        if self.next_transition is None:
+            return MAX_SLEEP_SECONDS
+        remaining = (self.next_transition - now).total_seconds()
+        return max(0.0, min(remaining, MAX_SLEEP_SECONDS))
+
+
+# Process-wide instance; tournaments/signals.py invalidates it on save
+scheduler = TournamentStatusScheduler()
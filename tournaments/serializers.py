@@ -36,16 +36,18 @@ class TournamentSerializer(serializers.ModelSerializer):
     prizes = TournamentPrizeSerializer(many=True, read_only=True)
     # questions = QuestionSerializer(many=True, read_only=True) # Optional: if you want to embed all questions in tournament list/detail
     wordPuzzles = PuzzleSerializer(many=True, read_only=True, source='wordpuzzles')
+    # `status` is the stored, admin-editable value; this one follows the schedule
+    effective_status = serializers.CharField(read_only=True)
 
     class Meta:
         model = Tournament
         fields = [
             'id', 'title', 'subtitle', 'description', 'banner_image', 'frequency', 'start_date', 'end_date',
             'max_total_attempts', 'max_questions_per_attempt', 'max_attempts_per_day',
-            'negative_marking', 'duration_minutes', 'status', 'prizes', 'wordPuzzles',
+            'negative_marking', 'duration_minutes', 'status', 'effective_status', 'prizes', 'wordPuzzles',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ('created_at', 'updated_at', 'status') # Admins might change status
+        read_only_fields = ('created_at', 'updated_at')
 
 class TournamentAttemptSerializer(serializers.ModelSerializer):
     # This will display the user's email or guest ID in read-only mode
@@ -82,15 +84,20 @@ class TournamentAttemptSerializer(serializers.ModelSerializer):
 class TournamentLeaderboardSerializer(serializers.ModelSerializer):
     user_identifier = serializers.SerializerMethodField()
     tournament_title = serializers.CharField(source='tournament.title', read_only=True)
+    rank = serializers.SerializerMethodField()
 
     class Meta:
         model = TournamentLeaderboard
         fields = [
-            'id', 'user', 'guest_user', 'user_identifier', 'tournament', 'tournament_title',
+            'id', 'rank', 'user', 'guest_user', 'user_identifier', 'tournament', 'tournament_title',
             'total_score', 'last_daily_score', 'last_daily_update', 'last_attempt_datetime'
         ]
         read_only_fields = fields # Leaderboard entries are managed by system, not directly created/updated via API by user
 
+    def get_rank(self, obj):
+        # Set by the view from the leaderboard engine; None when not ranked
+        return getattr(obj, 'rank', None)
+
     def get_user_identifier(self, obj):
         if obj.user:
             return obj.user.email
@@ -108,7 +115,7 @@ class TournamentWinnerSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'tournament', 'tournament_title', 'prize', 'prize_details',
             'user', 'guest_user', 'user_identifier', 'winning_score',
-            'winning_rank', 'award_date', 'claim_status'
+            'winning_rank', 'period_start', 'award_date', 'claim_status'
         ]
         read_only_fields = fields # Winners are recorded by system, not directly created/updated via API
 
@@ -129,11 +136,7 @@ class StartTournamentAttemptSerializer(serializers.Serializer):
             raise serializers.ValidationError("Tournament ID must be an integer or numeric string.")
 
         try:
-            tournament = Tournament.objects.get(
-                pk=tournament_id,
-                status='active',
-                end_date__gte=timezone.now()
-            )
+            tournament = Tournament.objects.active().get(pk=tournament_id)
         except Tournament.DoesNotExist:
             raise serializers.ValidationError(
                 f"Tournament with ID '{value}' does not exist or is not active."
@@ -0,0 +1,54 @@
+# tournaments/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .leaderboard import TournamentLeaderboardEngine
+from quiz.models import Question
+from .models import Tournament, TournamentLeaderboard
+from .question_pool import invalidate_pool
+from .scheduler import scheduler
+
+
+@receiver(post_delete, sender=TournamentLeaderboard)
+def drop_leaderboard_member(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: TournamentLeaderboardEngine(instance.tournament_id).discard(instance.user_id, instance.guest_user_id)
+    )
+
+
+@receiver(post_delete, sender=Tournament)
+def drop_tournament_leaderboard(sender, instance, **kwargs):
+    transaction.on_commit(lambda: TournamentLeaderboardEngine(instance.pk).clear())
+
+
+@receiver(post_save, sender=Tournament)
+def reschedule_status_transitions(sender, instance, **kwargs):
+    # Dates may have moved; let the scheduler re-read its next boundary
+    scheduler.invalidate()
+
+
+@receiver(m2m_changed, sender=Tournament.questions.through)
+def question_pool_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # question.tournaments.add/remove/clear(): pk_set holds tournament ids
+        if action == 'pre_clear':
+            instance._cleared_tournament_ids = list(instance.tournaments.values_list('pk', flat=True))
+            return
+        if action == 'post_clear':
+            tournament_ids = getattr(instance, '_cleared_tournament_ids', [])
+        else:
+            tournament_ids = pk_set or []
+    else:
+        tournament_ids = [instance.pk]
+
+    if action == 'post_add':
+        invalidate_pool(tournament_ids)
+    elif action in ('post_remove', 'post_clear'):
+        invalidate_pool(tournament_ids, shifted=True)
+
+
+@receiver(pre_delete, sender=Question)
+def question_leaving_pools(sender, instance, **kwargs):
+    # The cascade removes through rows without an m2m_changed signal
+    invalidate_pool(instance.tournaments.values_list('pk', flat=True), shifted=True)
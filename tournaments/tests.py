@@ -1,3 +1,333 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from .leaderboard import (
+    LeaderboardNotReady,
+    TournamentLeaderboardEngine,
+    decode_member,
+    encode_member,
+    participant_member,
+)
+from .models import Tournament, TournamentAttempt, TournamentLeaderboard, TournamentParticipantStats
+from .pagination import LEADERBOARD_ORDERING, rank_window
+from .quota import AttemptQuota, AttemptQuotaExceeded
+from .views import AllActiveTournamentLeaderboards
+
+try:
+    import fakeredis
+except ImportError:  # optional, only needed for the engine tests
+    fakeredis = None
+
+T0 = datetime(2026, 1, 1, 12, 0, 0, tzinfo=dt_timezone.utc)
+
+
+def entry(pk, total_score, last_attempt, user_id=None, guest_user_id=None):
+    if user_id is None and guest_user_id is None:
+        user_id = pk
+    return SimpleNamespace(
+        id=pk, pk=pk, user_id=user_id, guest_user_id=guest_user_id,
+        total_score=total_score, last_attempt_datetime=last_attempt,
+    )
+
+
+def mysql_order(entries):
+    """ORDER BY -total_score, last_attempt_datetime (NULL first), id."""
+    return sorted(entries, key=lambda e: (
+        -e.total_score,
+        e.last_attempt_datetime is not None,
+        e.last_attempt_datetime or T0,
+        e.id,
+    ))
+
+
+def redis_order(entries):
+    """ZREVRANGE order: score desc, then member desc."""
+    def member(e):
+        return encode_member(e.id, e.last_attempt_datetime, participant_member(e.user_id, e.guest_user_id))
+    return sorted(entries, key=lambda e: (e.total_score, member(e)), reverse=True)
+
+
+TIED_ENTRIES = [
+    entry(1, 10.0, T0),
+    entry(2, 10.0, T0 + timedelta(microseconds=1)),
+    entry(3, 10.0, T0),
+    entry(4, 10.0, None),
+    entry(5, 10.0, None),
+    entry(6, 10.0 + 1e-9, T0 + timedelta(days=1)),
+    entry(7, 0.1 + 0.2, T0),
+    entry(8, 0.3, T0),
+    entry(9, -2.5, T0 - timedelta(seconds=1)),
+    entry(10, 25000.75, T0 + timedelta(hours=5)),
+    entry(11, 10.0, T0 + timedelta(seconds=1)),
+    entry(12, 10.0, T0, guest_user_id=3, user_id=None),
+]
+
+
+class MemberEncodingTests(SimpleTestCase):
+    def test_round_trip(self):
+        when = T0 + timedelta(microseconds=123456)
+        self.assertEqual(decode_member(encode_member(42, when, "u:7")), (42, when, 7, None))
+        self.assertEqual(decode_member(encode_member(42, None, "g:9")), (42, None, None, 9))
+
+    def test_members_are_fixed_width(self):
+        lengths = {len(encode_member(pk, when, "u:1")) for pk in (1, 10 ** 12) for when in (None, T0)}
+        self.assertEqual(len(lengths), 1)
+
+    def test_redis_order_matches_mysql_order(self):
+        self.assertEqual(
+            [e.id for e in redis_order(TIED_ENTRIES)],
+            [e.id for e in mysql_order(TIED_ENTRIES)],
+        )
+
+    def test_null_attempt_time_sorts_first_within_a_score(self):
+        order = [e.id for e in redis_order(TIED_ENTRIES) if e.total_score == 10.0]
+        self.assertEqual(order[:2], [4, 5])
+
+    def test_scores_are_not_rounded(self):
+        order = [e.id for e in redis_order(TIED_ENTRIES)]
+        self.assertLess(order.index(7), order.index(8))
+        self.assertLess(order.index(6), order.index(4))
+
+
+@skipIf(fakeredis is None, "fakeredis is not installed")
+class TournamentLeaderboardEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = TournamentLeaderboardEngine(1, connection=fakeredis.FakeStrictRedis())
+        self.engine.redis.set(self.engine.ready_key, 1)
+
+    def test_page_and_rank_follow_mysql_order(self):
+        for e in TIED_ENTRIES:
+            self.engine.record(e)
+        expected = [e.id for e in mysql_order(TIED_ENTRIES)]
+        self.assertEqual([row["id"] for row in self.engine.page(0, None)], expected)
+        for position, e in enumerate(mysql_order(TIED_ENTRIES), start=1):
+            self.assertEqual(self.engine.rank(e.user_id, e.guest_user_id), position)
+
+    def test_rerecord_replaces_the_member(self):
+        self.engine.record(entry(1, 5.0, T0))
+        self.engine.record(entry(2, 5.0, T0 + timedelta(seconds=1)))
+        self.engine.record(entry(1, 5.0, T0 + timedelta(seconds=2)))
+        self.assertEqual(self.engine.size(), 2)
+        self.assertEqual(self.engine.rank(user_id=1), 2)
+        self.assertEqual(self.engine.page(0, 1)[0]["id"], 2)
+
+    def test_discard(self):
+        self.engine.record(entry(1, 5.0, T0))
+        self.engine.discard(user_id=1)
+        self.assertIsNone(self.engine.rank(user_id=1))
+        self.assertEqual(self.engine.size(), 0)
+
+    def test_writes_during_a_rebuild_are_marked_dirty(self):
+        self.engine.redis.set(self.engine.lock_key, "token")
+        self.engine.record(entry(1, 5.0, T0))
+        self.engine.discard(guest_user_id=4)
+        self.assertEqual(self.engine.redis.smembers(self.engine.dirty_key), {b"u:1", b"g:4"})
+
+    def test_cold_set_is_not_read(self):
+        self.engine.redis.delete(self.engine.ready_key)
+        with mock.patch.object(TournamentLeaderboardEngine, "schedule_rebuild") as schedule_rebuild:
+            with self.assertRaises(LeaderboardNotReady):
+                self.engine.rank(user_id=1)
+        schedule_rebuild.assert_called_once()
+
+
+@skipIf(fakeredis is None, "fakeredis is not installed")
+class RankWindowTests(TestCase):
+    """Around-me ranks among tied scores, from Redis and from the COUNT fallback."""
+
+    def setUp(self):
+        now = timezone.now()
+        self.tournament = Tournament.objects.create(
+            title="t", start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1)
+        )
+        User = get_user_model()
+        # Equal scores and equal attempt times, so only the id breaks most ties
+        for i, (score, last_attempt) in enumerate([
+            (5, T0), (3, None), (5, None), (5, T0), (3, T0), (5, T0 - timedelta(seconds=1)),
+            (5, T0), (3, None), (8, T0), (5, None), (3, T0), (5, T0),
+        ]):
+            TournamentLeaderboard.objects.create(
+                tournament=self.tournament, user=User.objects.create(email=f"{i}@example.com"),
+                total_score=score, last_attempt_datetime=last_attempt,
+            )
+        self.queryset = TournamentLeaderboard.objects.filter(tournament=self.tournament)
+        self.expected = list(self.queryset.order_by(*LEADERBOARD_ORDERING))
+
+        patcher = mock.patch("tournaments.leaderboard.get_redis_connection", return_value=fakeredis.FakeStrictRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.engine = TournamentLeaderboardEngine(self.tournament.pk)
+        self.engine.rebuild()
+
+    def assertWindow(self, index, k=2):
+        rank, entries = rank_window(self.queryset, self.queryset.get(pk=self.expected[index].pk), k)
+        start = max(index - k, 0)
+        window = self.expected[start:index + k + 1]
+        self.assertEqual(rank, index + 1)
+        self.assertEqual([row.pk for row in entries], [row.pk for row in window])
+        self.assertEqual([row.rank for row in entries], list(range(start + 1, start + len(window) + 1)))
+
+    def assertWindows(self):
+        for index in range(len(self.expected)):
+            self.assertWindow(index)
+
+    def test_redis_rank_matches_mysql_order_on_ties(self):
+        for index, entry in enumerate(self.expected, start=1):
+            self.assertEqual(self.engine.entry_rank(entry), index)
+        self.assertWindows()
+
+    def test_cold_set_falls_back_to_counting(self):
+        self.engine.redis.delete(self.engine.ready_key)
+        with mock.patch.object(TournamentLeaderboardEngine, "schedule_rebuild"):
+            self.assertWindows()
+
+    def test_caller_behind_redis_falls_back_to_counting(self):
+        # The caller's new score ties the top one but has not reached Redis yet
+        stale = self.expected[-1]
+        self.queryset.filter(pk=stale.pk).update(total_score=8, last_attempt_datetime=T0)
+        self.assertIsNone(self.engine.entry_rank(self.queryset.get(pk=stale.pk)))
+        self.expected = list(self.queryset.order_by(*LEADERBOARD_ORDERING))
+        self.assertWindow([row.pk for row in self.expected].index(stale.pk))
+
+
+class TournamentStatusTests(TestCase):
+    def create(self, start, end, **kwargs):
+        now = timezone.now()
+        return Tournament.objects.create(
+            title="t", start_date=now + timedelta(hours=start), end_date=now + timedelta(hours=end), **kwargs
+        )
+
+    def test_status_follows_the_schedule(self):
+        tournament = self.create(1, 2)
+        self.assertEqual(tournament.status, "upcoming")
+        later = tournament.start_date + timedelta(minutes=1)
+        self.assertEqual(tournament.status_at(later), "active")
+        self.assertEqual(tournament.status_at(tournament.end_date), "finished")
+
+    def test_manually_finished_tournament_stays_finished(self):
+        tournament = self.create(-1, 1)
+        self.assertEqual(tournament.status, "active")
+        tournament.status = "finished"
+        tournament.save()
+        tournament.refresh_from_db()
+        self.assertEqual(tournament.status, "finished")
+        self.assertEqual(tournament.effective_status, "finished")
+        self.assertFalse(Tournament.objects.active().filter(pk=tournament.pk).exists())
+
+    def test_archived_is_kept(self):
+        tournament = self.create(1, 2, status="archived")
+        self.assertEqual(tournament.status, "archived")
+        self.assertEqual(tournament.status_at(tournament.start_date), "archived")
+
+
+class TournamentParticipantStatsTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.tournament = Tournament.objects.create(
+            title="t", start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1)
+        )
+        self.users = [get_user_model().objects.create(email=f"{i}@example.com") for i in range(2)]
+
+    def test_score_without_a_started_row_creates_it(self):
+        attempt = TournamentAttempt.objects.create(tournament=self.tournament, user=self.users[0], score=3)
+        TournamentParticipantStats.record_attempt_score(attempt)
+        stats = TournamentParticipantStats.objects.get(tournament=self.tournament)
+        self.assertEqual((stats.participant, stats.total_score, stats.attempts), (f"u:{self.users[0].pk}", 3, 1))
+
+    def test_active_leaderboard_ranks_have_no_gaps(self):
+        for user, score in zip(self.users, (5, 1)):
+            attempt = TournamentAttempt.objects.create(tournament=self.tournament, user=user, score=score)
+            TournamentParticipantStats.record_attempt_started(attempt)
+            TournamentParticipantStats.record_attempt_score(attempt)
+        # A row whose participant is gone, ranked between the two users
+        TournamentParticipantStats.objects.create(tournament=self.tournament, participant="g:0", total_score=3)
+
+        request = APIRequestFactory().get("/api/tournaments/leaderboards/active/")
+        response = AllActiveTournamentLeaderboards.as_view()(request)
+        leaderboard = response.data["data"]["active_tournaments"][0]["leaderboard"]
+        self.assertEqual([(row["userId"], row["rank"]) for row in leaderboard], [
+            (self.users[0].pk, 1), (self.users[1].pk, 2),
+        ])
+
+
+@skipIf(fakeredis is None, "fakeredis is not installed")
+class AttemptQuotaTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        AttemptQuota._reserve = None
+        self.now = timezone.now()
+        self.tournament = Tournament.objects.create(
+            title="t", start_date=self.now - timedelta(hours=1), end_date=self.now + timedelta(days=2),
+            max_total_attempts=3, max_attempts_per_day=2, duration_minutes=10,
+        )
+        self.user = get_user_model().objects.create(email="quota@example.com")
+
+    def quota(self, now=None):
+        return AttemptQuota(self.tournament, self.user, now=now or self.now, connection=self.redis)
+
+    def reserve(self, quota):
+        try:
+            quota.reserve()
+        except AttemptQuotaExceeded:
+            return False
+        return True
+
+    def test_concurrent_starts_take_at_most_the_daily_limit(self):
+        self.quota()._seed()
+        quotas = [self.quota() for _ in range(10)]
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            granted = list(pool.map(self.reserve, quotas))
+        self.assertEqual(granted.count(True), 2)
+
+    def test_release_gives_the_slot_back(self):
+        first, second = self.quota(), self.quota()
+        self.assertTrue(self.reserve(first))
+        self.assertTrue(self.reserve(second))
+        self.assertFalse(self.reserve(self.quota()))
+        second.release()
+        self.assertTrue(self.reserve(self.quota()))
+
+    def test_abandoned_attempts_free_their_slot_when_they_expire(self):
+        self.assertTrue(self.reserve(self.quota()))
+        self.assertTrue(self.reserve(self.quota()))
+        later = self.now + timedelta(minutes=12)
+        self.assertTrue(self.reserve(self.quota(now=later)))
+
+    def test_completed_attempts_keep_counting(self):
+        quota = self.quota()
+        self.assertTrue(self.reserve(quota))
+        attempt = TournamentAttempt.objects.create(
+            tournament=self.tournament, user=self.user, attempt_date=self.now, is_completed=True,
+        )
+        quota.confirm(attempt)
+        quota.complete(attempt)
+        self.assertTrue(self.reserve(self.quota()))
+        later = self.now + timedelta(minutes=12)
+        # The completed attempt still counts; only the abandoned reservation expired
+        self.assertTrue(self.reserve(self.quota(now=later)))
+        self.assertFalse(self.reserve(self.quota(now=later)))
+
+    def test_only_completed_attempts_are_seeded(self):
+        TournamentAttempt.objects.create(tournament=self.tournament, user=self.user, attempt_date=self.now)
+        TournamentAttempt.objects.create(
+            tournament=self.tournament, user=self.user, attempt_date=self.now, is_completed=True,
+        )
+        self.assertEqual(self.quota().count_from_db(), (1, 1))
+        self.assertTrue(self.reserve(self.quota()))
+        self.assertFalse(self.reserve(self.quota()))
+
+    def test_unseeded_counters_fall_back_to_mysql(self):
+        for _ in range(2):
+            TournamentAttempt.objects.create(
+                tournament=self.tournament, user=self.user, attempt_date=self.now, is_completed=True,
+            )
+        with mock.patch.object(AttemptQuota, "_seed"):
+            with self.assertRaises(AttemptQuotaExceeded):
+                self.quota().reserve()
@@ -13,6 +13,7 @@ urlpatterns = [
     path('api/tournaments/<int:tournament_id>/prizes/', views.TournamentPrizeListView.as_view(), name='api-tournament-prize-list'),
     path('api/tournaments/<int:tournament_id>/winners/', views.TournamentWinnerListView.as_view(), name='api-tournament-winner-list'),
     path('api/tournaments/<int:tournament_id>/leaderboard/', views.TournamentLeaderboardListView.as_view(), name='api-tournament-leaderboard'),
+    path('api/tournaments/<int:tournament_id>/leaderboard/around-me/', views.TournamentLeaderboardAroundMeView.as_view(), name='api-tournament-leaderboard-around-me'),
 
     path("api/tournaments/leaderboards/active/", AllActiveTournamentLeaderboards.as_view(), name="active_tournament_leaderboards"),
 
@@ -1,11 +1,8 @@
 # tournaments/views.py
-import random
-import pandas as pd
 from datetime import timedelta
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from collections import defaultdict
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAdminUser # Or your custom permission
 from django.db import transaction
@@ -20,133 +17,28 @@ from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError, PermissionDenied
 from django.http import Http404
-from users.middleware import CombinedJWTOrGuestAuthentication 
+from django.urls import reverse
+from redis.exceptions import RedisError
+from users.middleware import CombinedJWTOrGuestAuthentication, RequestJWTAuthentication
 from .serializers import *
 from .models import *
+from .decks import DeckDealer
+from .leaderboard import TournamentLeaderboardEngine
+from .pagination import (
+    DEFAULT_PAGE_SIZE, LEADERBOARD_ORDERING, MAX_PAGE_SIZE, InvalidCursor, encode_cursor, keyset_page,
+    rank_window,
+)
+from .question_pool import mark_questions_seen, select_unseen_questions
+from .quota import AttemptQuota, AttemptQuotaExceeded
 from quiz.models import Question, Option # Adjust import if quiz app is structured differently
+from quiz.answer_keys import get_answer_keys
+from quiz.import_jobs import create_job
 from quiz.serializers import QuestionSerializer # Assuming you have a serializer for Question
 
 # from rest_framework_simplejwt.tokens import AccessToken
 
-# Helper function to process the excel file (re-used from previous example)
-def process_excel_for_questions(file, tournament):
-    """
-    Reads an Excel file with columns: Question, Option1, Option2, Option3, Option4, Answer
-    Creates/updates Questions and Options, and marks the correct option based on Answer.
-    Answer can be:
-      - Exact option text (case insensitive match)
-      - Option letter 'a', 'b', 'c', 'd' (case insensitive)
-      - Literal string 'option1', 'option2', 'option3', 'option4' (case insensitive)
-      - Exact question text (means the question itself is the answer, treat as correct option if matches)
-    """
-    try:
-        df = pd.read_excel(file)
-    except Exception as e:
-        raise ValueError(f"Could not read Excel file. Ensure it's a valid .xlsx format. Error: {e}")
-
-    # Normalize column names for case-insensitive access
-    df.columns = df.columns.str.strip().str.lower()
-
-    # Rename columns if necessary for consistency
-    df.rename(columns=lambda x: x.replace(' ', '').replace('_', ''), inplace=True)
-
-    processed_questions = []
-    added_question_ids_this_batch = set()
-
-    # Map option letters to indices (0-based)
-    option_letter_map = {'a': 0, 'b': 1, 'c': 2, 'd': 3}
-    # Map literal option names to indices (0-based)
-    option_name_map = {'option1': 0, 'option2': 1, 'option3': 2, 'option4': 3}
-
-    with transaction.atomic():
-        for index, row in df.iterrows():
-            row_num = index + 2
-
-            question_text = row.get('question') or row.get('questiontext')
-            if not question_text or pd.isna(question_text):
-                raise ValueError(f"Row {row_num}: 'Question' column is missing or empty.")
-
-            question_text = str(question_text).strip()
-
-            # Extract options in a list, ignoring missing options
-            options = []
-            for i in range(1, 5):  # For option1 to option4
-                opt = row.get(f'option{i}')
-                if pd.isna(opt):
-                    options.append(None)
-                else:
-                    options.append(str(opt).strip())
-
-            # Get the answer value
-            answer_raw = row.get('answer')
-            if answer_raw is None or pd.isna(answer_raw):
-                raise ValueError(f"Row {row_num}: 'Answer' column is missing or empty.")
-
-            answer_raw_str = str(answer_raw).strip().lower()
-
-            # Create or get question
-            question = Question.objects.create(
-                question_text=question_text
-            )
-
-            created = True
-
-            options_to_create = []
-            correct_option_found = False
-
-            for idx, opt_text in enumerate(options):
-                if not opt_text:
-                    continue
-
-                is_correct = False
-
-                # Check if answer matches option letter (a,b,c,d)
-                if answer_raw_str in option_letter_map:
-                    if option_letter_map[answer_raw_str] == idx:
-                        is_correct = True
-                        correct_option_found = True
-                # Check if answer matches literal option name 'option1', 'option2', etc.
-                elif answer_raw_str in option_name_map:
-                    if option_name_map[answer_raw_str] == idx:
-                        is_correct = True
-                        correct_option_found = True
-                # Check if answer matches option text exactly (case insensitive)
-                elif opt_text.lower() == answer_raw_str:
-                    is_correct = True
-                    correct_option_found = True
-                # Check if answer matches question text exactly (means whole question is answer)
-                elif question_text.lower() == answer_raw_str:
-                    # If answer matches question text, mark first option as correct (optional)
-                    if idx == 0:
-                        is_correct = True
-                        correct_option_found = True
-
-                options_to_create.append(
-                    Option(
-                        question=question,
-                        option_text=opt_text,
-                        is_correct=is_correct
-                    )
-                )
-
-            if len(options_to_create) == 0:
-                raise ValueError(f"Row {row_num}: No options found for question '{question_text}'.")
-
-            if not correct_option_found:
-                raise ValueError(f"Row {row_num}: No correct option matched for question '{question_text}' with answer '{answer_raw}'.")
-
-            # Bulk create options
-            Option.objects.bulk_create(options_to_create)
-
-            if question.id not in added_question_ids_this_batch:
-                tournament.questions.add(question)
-                processed_questions.append(question)
-                added_question_ids_this_batch.add(question.id)
-
-    return processed_questions
-
 class TournamentQuestionUploadAPIView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
     
@@ -158,12 +50,16 @@ class TournamentQuestionUploadAPIView(APIView):
                 excel_file = serializer.validated_data['excel_file']
 
                 try:
-                    processed_questions = process_excel_for_questions(excel_file, tournament)
+                    # Imported in the background; poll status_url for progress
+                    job = create_job('tournament', excel_file, user=request.user, target_id=tournament.id)
 
                     return Response({
                         "type": "success",
-                        "message": f"Successfully uploaded {len(processed_questions)} questions and added them to tournament '{tournament.title}'.",
-                        "data": {}
+                        "message": f"Upload received. Questions are being added to tournament '{tournament.title}'.",
+                        "data": {
+                            "job_id": job.id,
+                            "status_url": reverse('import-job-status', args=[job.id])
+                        }
                     }, status=200)  # Always 200
 
                 except ValueError as e:
@@ -277,18 +173,129 @@ class TournamentWinnerListView(generics.ListAPIView):
     
     
 class TournamentLeaderboardListView(generics.ListAPIView):
+    """
+    Cursor-paginated leaderboard. Pass `limit` (default 50, max 200) and the
+    `next_cursor` of the previous page as `cursor`; `offset` jumps straight to
+    a rank instead. Each page is one joined query.
+    """
     serializer_class = TournamentLeaderboardSerializer
     authentication_classes = [CombinedJWTOrGuestAuthentication]
     permission_classes = [AllowAny]
 
     def get_queryset(self):
         tournament_id = self.kwargs.get('tournament_id')
-        return TournamentLeaderboard.objects.filter(tournament_id=tournament_id)
+        return (
+            TournamentLeaderboard.objects
+            .filter(tournament_id=tournament_id)
+            .select_related('user', 'guest_user', 'tournament')
+            .order_by(*LEADERBOARD_ORDERING)
+        )
 
-    def list(self, request, *args, **kwargs):
+    def get_ranked_entries(self, offset, limit):
+        """
+        Page the leaderboard by rank from the Redis sorted set, which is in
+        LEADERBOARD_ORDERING order, and load just those rows from MySQL.
+
+        Falls back to an OFFSET read in MySQL if Redis is down or cold, or if
+        the set is behind MySQL. A missing or changed row would shift every
+        rank after it. Stale members are repaired on the way.
+        """
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return success_response("Leaderboard data fetched successfully.", serializer.data)
+        engine = TournamentLeaderboardEngine(self.kwargs.get('tournament_id'))
+        try:
+            ranked = engine.page(offset, limit)
+        except RedisError:
+            return self.offset_entries(queryset, offset, limit)
+
+        rows = queryset.in_bulk([r["id"] for r in ranked])
+        entries = []
+        stale = False
+        for r in ranked:
+            entry = rows.get(r["id"])
+            if entry is None:
+                engine.discard(r["user_id"], r["guest_user_id"])
+                stale = True
+            elif (entry.total_score, entry.last_attempt_datetime) != (r["total_score"], r["last_attempt_datetime"]):
+                engine.record(entry)
+                stale = True
+            else:
+                entry.rank = r["rank"]
+                entries.append(entry)
+        if stale:
+            return self.offset_entries(queryset, offset, limit)
+        return entries
+
+    def offset_entries(self, queryset, offset, limit):
+        entries = list(queryset[offset:offset + limit])
+        for position, entry in enumerate(entries, start=offset + 1):
+            entry.rank = position
+        return entries
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_PAGE_SIZE))
+            limit = min(max(limit, 1), MAX_PAGE_SIZE)
+            offset = request.query_params.get('offset')
+            offset = max(int(offset), 0) if offset is not None else None
+        except ValueError:
+            return error_response("'offset' and 'limit' must be integers.", status_code=status.HTTP_200_OK)
+
+        cursor = request.query_params.get('cursor')
+        if offset is not None and not cursor:
+            # Jump to a rank; the returned cursor continues from there
+            entries = self.get_ranked_entries(offset, limit + 1)
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+            next_cursor = encode_cursor(entries[-1], entries[-1].rank) if has_more else None
+        else:
+            try:
+                entries, next_cursor = keyset_page(self.get_queryset(), cursor, limit)
+            except InvalidCursor as e:
+                return error_response(str(e), status_code=status.HTTP_200_OK)
+
+        serializer = self.get_serializer(entries, many=True)
+        return success_response("Leaderboard data fetched successfully.", {
+            "results": serializer.data,
+            "next_cursor": next_cursor,
+        })
+
+
+AROUND_ME_DEFAULT = 5
+AROUND_ME_MAX = 50
+
+
+class TournamentLeaderboardAroundMeView(APIView):
+    """The caller's exact rank plus up to `k` neighbours on each side (default 5, max 50)."""
+    authentication_classes = [CombinedJWTOrGuestAuthentication]
+    permission_classes = [AllowAny]
+
+    def get(self, request, tournament_id, *args, **kwargs):
+        user, guest_user = get_user_or_guest(request)
+        if not (user or guest_user):
+            return error_response("Authentication or Guest User ID is required.", status_code=status.HTTP_200_OK)
+
+        try:
+            k = min(max(int(request.query_params.get('k', AROUND_ME_DEFAULT)), 0), AROUND_ME_MAX)
+        except ValueError:
+            return error_response("'k' must be an integer.", status_code=status.HTTP_200_OK)
+
+        queryset = (
+            TournamentLeaderboard.objects
+            .filter(tournament_id=tournament_id)
+            .select_related('user', 'guest_user', 'tournament')
+        )
+        entry = queryset.filter(user=user, guest_user=guest_user).first()
+        if entry is None:
+            return error_response("You are not on this leaderboard yet.", status_code=status.HTTP_200_OK)
+
+        rank, entries = rank_window(queryset, entry, k)
+        serializer = TournamentLeaderboardSerializer(entries, many=True)
+        return success_response("Leaderboard position fetched successfully.", {
+            "rank": rank,
+            "results": serializer.data,
+        })
+
+
 # User Views
 
 class UserTournamentAttemptListView(generics.ListAPIView):
@@ -308,7 +315,7 @@ class UserTournamentAttemptListView(generics.ListAPIView):
 class AdminTournamentListCreateView(generics.ListCreateAPIView):
     queryset = Tournament.objects.all()
     serializer_class = TournamentSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
@@ -343,7 +350,7 @@ class AdminTournamentListCreateView(generics.ListCreateAPIView):
 class AdminTournamentDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Tournament.objects.all()
     serializer_class = TournamentSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def retrieve(self, request, *args, **kwargs):
@@ -367,7 +374,7 @@ class AdminTournamentDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 class AdminTournamentPrizeListCreateView(generics.ListCreateAPIView):
     serializer_class = TournamentPrizeSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -390,7 +397,7 @@ class AdminTournamentPrizeListCreateView(generics.ListCreateAPIView):
 class AdminTournamentPrizeDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = TournamentPrize.objects.all()
     serializer_class = TournamentPrizeSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
     lookup_url_kwarg = 'prize_id'
 
@@ -463,7 +470,7 @@ class AdminTournamentPrizeDetailView(generics.RetrieveUpdateDestroyAPIView):
 class AdminTournamentWinnerListView(generics.ListAPIView):
     queryset = TournamentWinner.objects.all()
     serializer_class = TournamentWinnerSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RequestJWTAuthentication]
     permission_classes = [IsAuthenticated]
     filterset_fields = ['tournament', 'claim_status', 'prize__prize_type']
     search_fields = ['user__email', 'guest_user__id', 'tournament__title', 'prize__title']
@@ -497,6 +504,9 @@ def get_user_or_guest(request):
     elif isinstance(request.user, UserOpenAccount):
         user = None
         guest_user = request.user
+    else:
+        user = None
+        guest_user = None
     # if not user:
     #     guest_user_id = request.headers.get('X-Guest-User-ID')
     #     if guest_user_id:
@@ -508,31 +518,10 @@ def get_user_or_guest(request):
 
 def get_unique_tournament_questions_for_user(tournament, user=None, guest_user=None):
     if not (user or guest_user):
-        print(user, guest_user)
         raise ValueError("Either user or guest_user must be provided.")
 
-    query_filter = Q(tournament=tournament, is_completed=True)
-    if user:
-        query_filter &= Q(user=user)
-    elif guest_user:
-        query_filter &= Q(guest_user=guest_user)
-
-    previous_attempts = TournamentAttempt.objects.filter(query_filter)
-    previously_attempted_ids = set()
-    for attempt in previous_attempts:
-        previously_attempted_ids.update(attempt.questions_attempted.values_list('id', flat=True))
-
-    all_questions = list(tournament.questions.all())
-    available_questions = [q for q in all_questions if q.id not in previously_attempted_ids]
-
-    if len(available_questions) < tournament.max_questions_per_attempt:
-        if not available_questions:
-            raise ValidationError("You have attempted all unique questions.")
-        selected_questions = available_questions
-    else:
-        selected_questions = random.sample(available_questions, tournament.max_questions_per_attempt)
-
-    return selected_questions
+    # Bitwise pick over the pool index; see tournaments/question_pool.py
+    return select_unseen_questions(tournament, user, guest_user)
 
 # Class-based API View to start attempt
 class StartTournamentAttemptView(APIView):
@@ -564,47 +553,37 @@ class StartTournamentAttemptView(APIView):
             }, status=status.HTTP_200_OK)
 
         now = timezone.now()
-        if not (tournament.start_date <= now <= tournament.end_date and tournament.status == 'active'):
+        if tournament.status_at(now) != 'active':
             return Response({
                 "type": "error",
                 "message": "Tournament is not currently active.",
                 "data": {}
             }, status=status.HTTP_200_OK)
 
-        # Check total attempts
-        base_filter = Q(tournament=tournament, is_completed=True)
-        if user:
-            base_filter &= Q(user=user)
-        elif guest_user:
-            base_filter &= Q(guest_user=guest_user)
-
-        total_attempts = TournamentAttempt.objects.filter(base_filter).count()
-        if tournament.max_total_attempts is not None and total_attempts >= tournament.max_total_attempts:
+        # Check and take an attempt slot in one atomic Redis round-trip
+        quota = AttemptQuota(tournament, user, guest_user, now=now)
+        try:
+            quota.reserve()
+        except AttemptQuotaExceeded as e:
             return Response({
                 "type": "error",
-                "message": "Maximum total attempts reached.",
+                "message": str(e),
                 "data": {}
             }, status=status.HTTP_200_OK)
 
-        # Check daily attempts
-        today_start = timezone.make_aware(timezone.datetime.combine(now.date(), timezone.datetime.min.time()))
-        today_end = timezone.make_aware(timezone.datetime.combine(now.date(), timezone.datetime.max.time()))
-        daily_attempts = TournamentAttempt.objects.filter(
-            base_filter & Q(attempt_date__range=(today_start, today_end))
-        ).count()
-        if daily_attempts >= tournament.max_attempts_per_day:
-            return Response({
-                "type": "error",
-                "message": "Maximum daily attempts reached.",
-                "data": {}
-            }, status=status.HTTP_200_OK)
-        
-        
+        # A pre-dealt deck (tournaments/decks.py) already has the questions and
+        # their payload; only select live when there is no usable one.
+        deck = DeckDealer(tournament).claim(user, guest_user)
         try:
-            
-            questions = get_unique_tournament_questions_for_user(tournament, user, guest_user)
+            if deck is not None:
+                question_ids, questions_data = deck
+            else:
+                questions = get_unique_tournament_questions_for_user(tournament, user, guest_user)
+                question_ids = [q.id for q in questions]
+                questions_data = QuestionSerializer(questions, many=True).data
             # print(questions)
         except ValidationError as e:
+            quota.release()
             # print("hello questions")
             return Response({
                 "type": "error",
@@ -612,20 +591,30 @@ class StartTournamentAttemptView(APIView):
                 "data": {}
             }, status=status.HTTP_200_OK)
         except ValueError as e:
+            quota.release()
             return Response({
                 "type": "error",
                 "message": str(e),
                 "data": {}
             }, status=status.HTTP_200_OK)
 
-        with transaction.atomic():
-            attempt = TournamentAttempt.objects.create(
-                user=user,
-                guest_user=guest_user,
-                tournament=tournament,
-                attempt_date=now
-            )
-            attempt.questions_attempted.set(questions)
+        try:
+            with transaction.atomic():
+                attempt = TournamentAttempt.objects.create(
+                    user=user,
+                    guest_user=guest_user,
+                    tournament=tournament,
+                    attempt_date=now
+                )
+                through = TournamentAttempt.questions_attempted.through
+                through.objects.bulk_create([
+                    through(tournamentattempt_id=attempt.id, question_id=qid) for qid in question_ids
+                ])
+                TournamentParticipantStats.record_attempt_started(attempt)
+        except Exception:
+            quota.release()
+            raise
+        quota.confirm(attempt)
 
         return Response({
             "type": "success",
@@ -635,7 +624,7 @@ class StartTournamentAttemptView(APIView):
                 "tournament_id": tournament.id,
                 "duration_minutes": tournament.duration_minutes,
                 "max_questions_per_attempt": tournament.max_questions_per_attempt,
-                "questions": QuestionSerializer(questions, many=True).data
+                "questions": questions_data
             }
         }, status=status.HTTP_200_OK)
         
@@ -685,7 +674,7 @@ class SubmitTournamentAttemptView(APIView):
         #             "data": {}
         #         }, status=status.HTTP_200_OK)
 
-        if not (tournament.start_date <= now <= tournament.end_date and tournament.status == 'active'):
+        if tournament.status_at(now) != 'active':
             return Response({
                 "type": "error",
                 "message": "Tournament is no longer active.",
@@ -696,10 +685,9 @@ class SubmitTournamentAttemptView(APIView):
         wrong = 0
         answered_ids = set()
 
-        questions = Question.objects.filter(
-            id__in=attempt.questions_attempted.values_list('id', flat=True)
-        ).prefetch_related('options')
-        question_map = {q.id: q for q in questions}
+        attempt_question_ids = set(attempt.questions_attempted.values_list('id', flat=True))
+        # Grading is set lookups against the cached answer keys; no per-answer queries
+        answer_keys = get_answer_keys(attempt_question_ids)
 
         for answer in answers_data:
             q_id = answer.get('question_id')
@@ -707,24 +695,27 @@ class SubmitTournamentAttemptView(APIView):
 
             if not q_id or not opt_id:
                 raise ValidationError("Each answer must include 'question_id' and 'selected_option_id'.")
+            # The answer keys hold integer ids; clients may send "12"
+            try:
+                q_id, opt_id = int(q_id), int(opt_id)
+            except (TypeError, ValueError):
+                raise ValidationError("'question_id' and 'selected_option_id' must be integers.")
 
-            question = question_map.get(q_id)
-            if not question:
+            answer_key = answer_keys.get(q_id)
+            if q_id not in attempt_question_ids or answer_key is None:
                 raise ValidationError(f"Question {q_id} not part of this attempt.")
 
             answered_ids.add(q_id)
 
-            try:
-                selected_option = question.options.get(id=opt_id)
-            except Option.DoesNotExist:
+            if opt_id not in answer_key.option_ids:
                 raise ValidationError(f"Option {opt_id} not valid for question {q_id}.")
 
-            if selected_option.is_correct:
+            if opt_id in answer_key.correct_option_ids:
                 correct += 1
             else:
                 wrong += 1
 
-        skipped = attempt.questions_attempted.count() - len(answered_ids)
+        skipped = len(attempt_question_ids) - len(answered_ids)
 
         with transaction.atomic():
             attempt.correct_answers = correct
@@ -734,6 +725,8 @@ class SubmitTournamentAttemptView(APIView):
             attempt.time_taken_seconds = int((now - attempt.attempt_date).total_seconds())
             attempt.is_completed = True
             attempt.calculate_score()
+            TournamentParticipantStats.record_attempt_score(attempt)
+            mark_questions_seen(attempt, attempt_question_ids)
 
             leaderboard, created = TournamentLeaderboard.objects.get_or_create(
                 user=user,
@@ -761,6 +754,15 @@ class SubmitTournamentAttemptView(APIView):
 
                 leaderboard.save()
 
+            # Keep the Redis sorted set in step with the durable row
+            transaction.on_commit(lambda: TournamentLeaderboardEngine(tournament.id).record(leaderboard))
+            # The attempt's reservation becomes a completed attempt in the quota
+            transaction.on_commit(
+                lambda: AttemptQuota(tournament, user, guest_user, now=attempt.attempt_date).complete(attempt)
+            )
+            # The personal deck was dealt against the old seen bitmap
+            transaction.on_commit(lambda: DeckDealer(tournament).discard(user, guest_user))
+
         return Response({
             "type": "success",
             "message": "Tournament attempt submitted successfully.",
@@ -782,65 +784,29 @@ class AllActiveTournamentLeaderboards(APIView):
 
     def get(self, request, *args, **kwargs):
 
-        active_tournaments = Tournament.objects.filter(status="active")
+        active_tournaments = Tournament.objects.active()
 
         result = []
 
         for t in active_tournaments:
-            attempts = TournamentAttempt.objects.filter(tournament=t)
-
-            user_scores = defaultdict(
-                lambda: {
-                    "total_score": 0,
-                    "attempts": 0,
-                    "first_attempt_date": None,
-                    "user_obj": None
-                }
+            # Totals are maintained by start/submit; one indexed read per tournament
+            stats = (
+                TournamentParticipantStats.objects
+                .filter(Q(user__isnull=False) | Q(guest_user__isnull=False), tournament=t)
+                .select_related("user", "guest_user")
+                .order_by("-total_score", "attempts", "first_attempt_date")
             )
 
-            # Aggregate attempt data
-            for attempt in attempts:
-                user_obj = attempt.user or attempt.guest_user
-                if not user_obj:
-                    continue
-
-                uid = f"user_{user_obj.id}"
-
-                user_scores[uid]["total_score"] += attempt.score
-                user_scores[uid]["attempts"] += 1
-                user_scores[uid]["user_obj"] = user_obj
-
-                # Track earliest attempt time
-                if user_scores[uid]["first_attempt_date"] is None:
-                    user_scores[uid]["first_attempt_date"] = attempt.attempt_date
-                else:
-                    user_scores[uid]["first_attempt_date"] = min(
-                        user_scores[uid]["first_attempt_date"],
-                        attempt.attempt_date
-                    )
-
-            # Sorting logic
-            sorted_list = sorted(
-                user_scores.values(),
-                key=lambda x: (
-                    -x["total_score"],
-                    x["attempts"],
-                    x["first_attempt_date"]
-                )
-            )
-
-            # Add ranks
             leaderboard = []
-            for idx, entry in enumerate(sorted_list, start=1):
-                user_obj = entry["user_obj"]
-
+            for idx, entry in enumerate(stats, start=1):
+                user_obj = entry.user or entry.guest_user
                 leaderboard.append({
                     "userId": user_obj.id,
                     "userName": getattr(user_obj, "username", "Anonymous"),
                     "rank": idx,
-                    "total_score": entry["total_score"],
-                    "attempts": entry["attempts"],
-                    "first_attempt_date": entry["first_attempt_date"]
+                    "total_score": entry.total_score,
+                    "attempts": entry.attempts,
+                    "first_attempt_date": entry.first_attempt_date
                 })
 
             # Append tournament leaderboard
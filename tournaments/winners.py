@@ -0,0 +1,143 @@
+# tournaments/winners.py
+"""
+Prize winner computation.
+
+Every prize period is ranked by the database in one statement with window
+functions, and only the prize-winning rows (a handful per period) come back
+to Python:
+
+* daily / weekly: each participant's best completed attempt started in the
+  period (ROW_NUMBER partitioned by participant), ranked by score with the
+  earlier finish first on ties. Weekly periods run in 7-day blocks from the
+  tournament's start date.
+* overall: TournamentLeaderboard in its Meta.ordering, once the tournament
+  has ended.
+
+Winners are inserted with bulk_create(ignore_conflicts=True) against the
+(tournament, prize, period_start, winning_rank) unique key, so computing a
+period again is a no-op.
+
+Run it with `python manage.py compute_tournament_winners`.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import TournamentAttempt, TournamentLeaderboard, TournamentWinner
+
+PERIOD_DAYS = {'daily': 1, 'weekly': 7}
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def period_starts(tournament, prize_type, now):
+    """Start dates of this prize type's periods that have ended by `now`."""
+    first_day = timezone.localtime(tournament.start_date).date()
+    if prize_type == 'overall':
+        return [first_day] if tournament.end_date <= now else []
+
+    step = timedelta(days=PERIOD_DAYS[prize_type])
+    starts = []
+    day = first_day
+    # The last period is cut short by the tournament's end
+    while _day_start(day) < tournament.end_date and min(_day_start(day) + step, tournament.end_date) <= now:
+        starts.append(day)
+        day += step
+    return starts
+
+
+def ranked_attempts(tournament, start, end):
+    """Best completed attempt per participant in [start, end), with its 1-based `position`."""
+    tiebreak = [F('score').desc(), F('end_time').asc(), F('id').asc()]
+    best = (
+        TournamentAttempt.objects
+        .filter(tournament=tournament, is_completed=True, attempt_date__gte=start, attempt_date__lt=end)
+        .annotate(participant_row=Window(RowNumber(), partition_by=[F('user_id'), F('guest_user_id')], order_by=tiebreak))
+        .filter(participant_row=1)
+        .values('id')
+    )
+    return (
+        TournamentAttempt.objects
+        .filter(id__in=best)
+        .annotate(position=Window(RowNumber(), order_by=tiebreak))
+        .order_by('position')
+    )
+
+
+def ranked_leaderboard(tournament):
+    """TournamentLeaderboard rows with their 1-based overall `position`."""
+    return (
+        TournamentLeaderboard.objects
+        .filter(tournament=tournament)
+        .annotate(position=Window(
+            RowNumber(),
+            order_by=[F('total_score').desc(), F('last_attempt_datetime').asc(), F('id').asc()],
+        ))
+        .order_by('position')
+    )
+
+
+def _period_winners(tournament, prize_type, period_start, prizes_by_rank):
+    if prize_type == 'overall':
+        ranked, score_field = ranked_leaderboard(tournament), 'total_score'
+    else:
+        start = _day_start(period_start)
+        ranked = ranked_attempts(tournament, start, start + timedelta(days=PERIOD_DAYS[prize_type]))
+        score_field = 'score'
+
+    rows = ranked.filter(position__lte=max(prizes_by_rank)).values_list(
+        'user_id', 'guest_user_id', score_field, 'position'
+    )
+    return [
+        TournamentWinner(
+            tournament=tournament,
+            prize=prizes_by_rank[position],
+            user_id=user_id,
+            guest_user_id=guest_user_id,
+            winning_score=score,
+            winning_rank=position,
+            period_start=period_start,
+        )
+        for user_id, guest_user_id, score, position in rows
+        if position in prizes_by_rank
+    ]
+
+
+def compute_winners(tournament, now=None):
+    """
+    Award every ended prize period of the tournament that comes after the last
+    period already awarded for its prize type. Returns the number of winners created.
+    """
+    now = now or timezone.now()
+    prizes = defaultdict(dict)
+    for prize in tournament.prizes.all():
+        prizes[prize.prize_type][prize.rank] = prize
+    if not prizes:
+        return 0
+
+    awarded = dict(
+        TournamentWinner.objects
+        .filter(tournament=tournament, prize__isnull=False)
+        .values_list('prize__prize_type')
+        .annotate(last=Max('period_start'))
+    )
+
+    winners = []
+    for prize_type, prizes_by_rank in prizes.items():
+        last = awarded.get(prize_type)
+        for period_start in period_starts(tournament, prize_type, now):
+            if last is None or period_start > last:
+                winners.extend(_period_winners(tournament, prize_type, period_start, prizes_by_rank))
+
+    if not winners:
+        return 0
+    # bulk_create returns every object passed in, skipped conflicts included
+    existing = TournamentWinner.objects.filter(tournament=tournament)
+    before = existing.count()
+    TournamentWinner.objects.bulk_create(winners, ignore_conflicts=True)
+    return existing.count() - before
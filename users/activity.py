@@ -0,0 +1,227 @@
+"""
+Write-behind pipeline for user activity.
+
+UserActivityMiddleware only appends an ActivityEvent to a bounded in-process
+queue. A daemon thread drains it every ACTIVITY_FLUSH_INTERVAL seconds, at most
+ACTIVITY_MAX_BATCHES batches per flush so a flush ends even while requests keep
+the queue full, and writes each batch with:
+
+    one SELECT resolving users / guest uuids to open accounts
+    one bulk INSERT for accounts seen for the first time
+    one bulk INSERT of UserActivityLog rows, keyed by interned route
+      (users/activity_storage.py; a route costs a query once per process)
+    one heartbeat call recording every touched account's last seen time
+      (users/heartbeat.py persists those at most once per window per account)
+
+When the queue is full new events are dropped and counted rather than
+blocking the request; stats() exposes the counters. Events still queued when
+the process exits are flushed by an atexit hook, but a hard kill loses up to
+one interval of activity.
+"""
+import atexit
+import logging
+import queue
+import threading
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from quiz.utils.lru import LRUCache
+from .activity_storage import route_id, route_ids
+from .heartbeat import heartbeats
+from .models import UserActivityLog, UserOpenAccount
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_QUEUE_SIZE = getattr(settings, 'USER_ACTIVITY_QUEUE_SIZE', 10000)
+ACTIVITY_FLUSH_INTERVAL = getattr(settings, 'USER_ACTIVITY_FLUSH_INTERVAL', 2.0)
+ACTIVITY_BATCH_SIZE = 1000
+# Enough for a full default queue; anything left waits for the next flush
+ACTIVITY_MAX_BATCHES = getattr(settings, 'USER_ACTIVITY_MAX_BATCHES', 10)
+
+# Exactly one of user_id / guest_uuid is set. `route` is the matched URL
+# pattern, None for paths that matched nothing.
+ActivityEvent = namedtuple('ActivityEvent', ['user_id', 'guest_uuid', 'ip_address', 'user_agent', 'route', 'timestamp'])
+
+
+def _identity(event):
+    return ('u', event.user_id) if event.user_id else ('g', event.guest_uuid)
+
+
+def _new_account(event):
+    return UserOpenAccount(
+        uuid=event.guest_uuid or str(uuid.uuid4()),
+        user_id=event.user_id,
+        ip_address=event.ip_address,
+        user_agent=event.user_agent,
+        device="Unknown",
+        browser="Unknown",
+        os="Unknown",
+        status="active",
+    )
+
+
+_known_guests = LRUCache(maxsize=getattr(settings, 'USER_ACTIVITY_KNOWN_GUESTS', 50000))
+
+
+def ensure_guest_account(event):
+    """
+    Create a token guest's open account now rather than at the next flush:
+    CombinedJWTOrGuestAuthentication looks it up later in the same request.
+    Costs one query per guest per process.
+    """
+    if _known_guests.get(event.guest_uuid):
+        return
+    if not UserOpenAccount.objects.filter(uuid=event.guest_uuid).exists():
+        UserOpenAccount.objects.bulk_create([_new_account(event)], ignore_conflicts=True)
+    _known_guests.set(event.guest_uuid, True)
+
+
+def _account_ids(events):
+    """identity -> open account id, creating the accounts that don't exist yet."""
+    user_ids = {e.user_id for e in events if e.user_id}
+    guest_uuids = {e.guest_uuid for e in events if not e.user_id}
+
+    def lookup():
+        found = {}
+        accounts = UserOpenAccount.objects.none()
+        if user_ids:
+            accounts = accounts | UserOpenAccount.objects.filter(user_id__in=user_ids)
+        if guest_uuids:
+            accounts = accounts | UserOpenAccount.objects.filter(uuid__in=guest_uuids)
+        # A user can own several accounts (guests merged on sign-up); keep the oldest
+        for pk, user_id, guest_uuid in accounts.order_by('-pk').values_list('pk', 'user_id', 'uuid'):
+            if user_id in user_ids:
+                found[('u', user_id)] = pk
+            if guest_uuid in guest_uuids:
+                found[('g', guest_uuid)] = pk
+        return found
+
+    found = lookup()
+    missing = {}
+    for event in events:
+        identity = _identity(event)
+        if identity not in found:
+            missing.setdefault(identity, event)
+    if missing:
+        # Concurrent flushes may create the same guest; the uuid is unique
+        UserOpenAccount.objects.bulk_create([_new_account(e) for e in missing.values()], ignore_conflicts=True)
+        found = lookup()
+    return found
+
+
+def write_events(events):
+    """Persist a batch of events. Returns the number of log rows written."""
+    accounts = _account_ids(events)
+    routes = route_ids(event.route for event in events)
+    logs = []
+    last_seen = {}
+    for event in events:
+        account_id = accounts.get(_identity(event))
+        if account_id is None:
+            continue
+        logs.append(UserActivityLog(
+            user_id=account_id, route_id=route_id(routes, event.route), timestamp=event.timestamp,
+        ))
+        if account_id not in last_seen or event.timestamp > last_seen[account_id]:
+            last_seen[account_id] = event.timestamp
+
+    UserActivityLog.objects.bulk_create(logs, batch_size=ACTIVITY_BATCH_SIZE)
+    heartbeats.beat(last_seen)
+    return len(logs)
+
+
+class ActivityPipeline:
+    def __init__(self, maxsize=ACTIVITY_QUEUE_SIZE, interval=ACTIVITY_FLUSH_INTERVAL):
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._reported_drops = 0
+
+    def record(self, event):
+        """Queue an event without blocking. Returns False if it was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='user-activity-flusher', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def _drain(self):
+        events = []
+        while len(events) < ACTIVITY_BATCH_SIZE:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def flush(self, max_batches=ACTIVITY_MAX_BATCHES):
+        """Write up to `max_batches` batches of queued events. Returns the number of log rows written."""
+        written = 0
+        failed = 0
+        with self._flush_lock:
+            close_old_connections()
+            for _ in range(max_batches):
+                events = self._drain()
+                if not events:
+                    break
+                try:
+                    written += write_events(events)
+                except Exception:
+                    failed += len(events)
+                    logger.exception("Could not write %s activity events", len(events))
+            try:
+                heartbeats.flush_due()
+            except Exception:
+                logger.exception("Could not persist heartbeats")
+            with self._lock:
+                self.written += written
+                self.failed += failed
+                dropped, self._reported_drops = self.dropped - self._reported_drops, self.dropped
+            if dropped:
+                logger.warning("Activity queue full: dropped %s event(s) since the last flush", dropped)
+        return written
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+
+activity_pipeline = ActivityPipeline()
@@ -0,0 +1,275 @@
+"""
+Day-partitioned activity storage.
+
+tbl_user_activity holds one row per request: the open account, an interned
+route pattern (ActivityRoute) and the time. Raw rows are kept for
+ACTIVITY_RAW_DAYS days. After that each day is rolled up into
+tbl_user_activity_hourly, which holds one row per (account, route, hour), and
+its raw rows are removed.
+
+On MySQL the raw table is RANGE-partitioned on TO_DAYS(timestamp), with one
+partition per UTC day. That is why its primary key is (id, timestamp) and why it
+has no foreign key constraints. Removing a day then means DROP PARTITION, not
+a row-by-row DELETE. Other backends delete the day with one range DELETE.
+
+maintain_activity() runs `python manage.py maintain_user_activity`, which should
+run daily:
+
+    1. resolve the paths of rows written before routes were interned
+    2. create partitions for today and the next ACTIVITY_PARTITIONS_AHEAD days
+    3. roll up and remove every day older than the raw window
+    4. delete rollups older than ACTIVITY_ROLLUP_DAYS
+
+While a day still has its partition, the partition holds all of the day's rows.
+Rolling it up then replaces any rollups the day already has, so a run that stops
+between the rollup and the DROP PARTITION can simply be repeated. Otherwise the
+day was already rolled up once and its remaining rows arrived late, landing in
+a later partition, or the table isn't partitioned. Their counts are then added
+to the day's rollups, in the same transaction that deletes the rows.
+"""
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.db.models.functions import TruncHour
+from django.urls import Resolver404, resolve
+
+from .models import ActivityRoute, UserActivityLog, UserActivityRollup
+
+ACTIVITY_RAW_DAYS = getattr(settings, 'USER_ACTIVITY_RAW_DAYS', 7)
+ACTIVITY_ROLLUP_DAYS = getattr(settings, 'USER_ACTIVITY_ROLLUP_DAYS', 365)
+ACTIVITY_PARTITIONS_AHEAD = getattr(settings, 'USER_ACTIVITY_PARTITIONS_AHEAD', 7)
+ROLLUP_BATCH_SIZE = 1000
+
+RAW_TABLE = UserActivityLog._meta.db_table
+CATCH_ALL_PARTITION = "pmax"
+ROUTE_MAX_LENGTH = ActivityRoute._meta.get_field('pattern').max_length
+
+# Route patterns come from the URLconf, so there are few of them and they never change
+_route_ids = {}
+
+
+def route_ids(patterns):
+    """{route pattern: ActivityRoute id}, creating patterns seen for the first time."""
+    patterns = {pattern[:ROUTE_MAX_LENGTH] for pattern in patterns if pattern}
+    missing = patterns.difference(_route_ids)
+    if missing:
+        found = dict(ActivityRoute.objects.filter(pattern__in=missing).values_list('pattern', 'id'))
+        if len(found) < len(missing):
+            ActivityRoute.objects.bulk_create(
+                [ActivityRoute(pattern=pattern) for pattern in missing.difference(found)],
+                ignore_conflicts=True,
+            )
+            found = dict(ActivityRoute.objects.filter(pattern__in=missing).values_list('pattern', 'id'))
+        _route_ids.update(found)
+    return {pattern: _route_ids[pattern] for pattern in patterns if pattern in _route_ids}
+
+
+def route_id(routes, pattern):
+    return routes.get(pattern[:ROUTE_MAX_LENGTH]) if pattern else None
+
+
+def _resolve_route(path):
+    try:
+        return resolve(urlsplit(path).path or '/').route
+    except Resolver404:
+        return None
+
+
+def intern_legacy_urls(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Set the route of rows that still carry a path from before routes were
+    interned, and clear the path. Paths that match nothing keep route NULL.
+    Returns the number of rows updated.
+    """
+    updated = 0
+    last_pk = 0
+    while True:
+        rows = list(
+            UserActivityLog.objects.filter(pk__gt=last_pk, url__isnull=False)
+            .order_by('pk').values_list('pk', 'url')[:batch_size]
+        )
+        if not rows:
+            return updated
+        last_pk = rows[-1][0]
+        patterns = {url: _resolve_route(url) for url in {url for _, url in rows}}
+        routes = route_ids(patterns.values())
+        by_route = {}
+        for pk, url in rows:
+            by_route.setdefault(route_id(routes, patterns[url]), []).append(pk)
+        for route, pks in by_route.items():
+            updated += UserActivityLog.objects.filter(pk__in=pks).update(route_id=route, url=None)
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def _is_mysql():
+    return connection.vendor == 'mysql'
+
+
+# MySQL partitions
+
+def _partition_name(day):
+    return f"p{day:%Y%m%d}"
+
+
+def _partition_definition(day):
+    return f"PARTITION {_partition_name(day)} VALUES LESS THAN (TO_DAYS('{day + timedelta(days=1):%Y-%m-%d}'))"
+
+
+def partition_days():
+    """Days with a partition, oldest first, or None if the table isn't partitioned."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL",
+            [RAW_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    if not names:
+        return None
+    return sorted(
+        datetime.strptime(name[1:], '%Y%m%d').date()
+        for name in names if re.fullmatch(r'p\d{8}', name)
+    )
+
+
+def ensure_partitions(today, ahead=ACTIVITY_PARTITIONS_AHEAD):
+    """
+    Make sure every day up to today + `ahead` has a partition. The first call
+    partitions the existing table, which rebuilds it.
+    """
+    last_day = today + timedelta(days=ahead)
+    existing = partition_days()
+    with connection.cursor() as cursor:
+        if existing is None:
+            oldest = UserActivityLog.objects.aggregate(oldest=Min('timestamp'))['oldest']
+            first_day = min(oldest.astimezone(dt_timezone.utc).date(), today) if oldest else today
+            days = [first_day + timedelta(days=n) for n in range((last_day - first_day).days + 1)]
+            cursor.execute(
+                f"ALTER TABLE {RAW_TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)"
+            )
+            cursor.execute(
+                f"ALTER TABLE {RAW_TABLE} PARTITION BY RANGE (TO_DAYS(timestamp)) ("
+                + ", ".join([_partition_definition(day) for day in days]
+                            + [f"PARTITION {CATCH_ALL_PARTITION} VALUES LESS THAN MAXVALUE"])
+                + ")"
+            )
+            return len(days)
+
+        newest = existing[-1] if existing else today - timedelta(days=1)
+        days = [newest + timedelta(days=n) for n in range(1, (last_day - newest).days + 1)]
+        if days:
+            # The catch-all only holds rows timestamped in the future, so splitting it is cheap
+            cursor.execute(
+                f"ALTER TABLE {RAW_TABLE} REORGANIZE PARTITION {CATCH_ALL_PARTITION} INTO ("
+                + ", ".join([_partition_definition(day) for day in days]
+                            + [f"PARTITION {CATCH_ALL_PARTITION} VALUES LESS THAN MAXVALUE"])
+                + ")"
+            )
+        return len(days)
+
+
+# Rollup and retention
+
+def rollup_day(day, replace=True):
+    """
+    Roll the day's raw rows up into hourly counts. They replace the day's
+    rollups, or with `replace=False` are added to them. Returns rows written.
+    """
+    start, end = _day_bounds(day)
+    rows = (
+        UserActivityLog.objects
+        .filter(timestamp__gte=start, timestamp__lt=end)
+        .annotate(hour=TruncHour('timestamp', tzinfo=dt_timezone.utc))
+        .values('user_id', 'route_id', 'hour')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    written = 0
+    with transaction.atomic():
+        day_rollups = UserActivityRollup.objects.filter(hour__gte=start, hour__lt=end)
+        existing = {}
+        if replace:
+            day_rollups.delete()
+        else:
+            # The route is nullable, so the unique constraint can't be relied on to merge rows
+            existing = {
+                (rollup.user_id, rollup.route_id, rollup.hour): rollup
+                for rollup in day_rollups.select_for_update()
+            }
+        created, changed = [], []
+        for row in rows.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+            rollup = existing.get((row['user_id'], row['route_id'], row['hour']))
+            if rollup is None:
+                created.append(UserActivityRollup(**row))
+            else:
+                rollup.count += row['count']
+                changed.append(rollup)
+        UserActivityRollup.objects.bulk_create(created, batch_size=ROLLUP_BATCH_SIZE)
+        UserActivityRollup.objects.bulk_update(changed, ['count'], batch_size=ROLLUP_BATCH_SIZE)
+        written = len(created) + len(changed)
+    return written
+
+
+def drop_raw_day(day, partitioned=None):
+    """Remove the day's raw rows: DROP PARTITION if it has one, else a range DELETE."""
+    if partitioned is None:
+        partitioned = _is_mysql() and day in (partition_days() or ())
+    if partitioned:
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {RAW_TABLE} DROP PARTITION {_partition_name(day)}")
+        return
+    start, end = _day_bounds(day)
+    UserActivityLog.objects.filter(timestamp__gte=start, timestamp__lt=end).delete()
+
+
+def stale_days(today, raw_days=ACTIVITY_RAW_DAYS, partitions=None):
+    """Days before the raw window that still have raw rows or a partition, oldest first."""
+    cutoff = today - timedelta(days=raw_days)
+    days = {day for day in partitions or () if day < cutoff}
+    oldest = UserActivityLog.objects.filter(
+        timestamp__lt=_day_bounds(cutoff)[0],
+    ).aggregate(oldest=Min('timestamp'))['oldest']
+    if oldest is not None:
+        day = oldest.astimezone(dt_timezone.utc).date()
+        while day < cutoff:
+            days.add(day)
+            day += timedelta(days=1)
+    return sorted(days)
+
+
+def maintain_activity(now=None, raw_days=ACTIVITY_RAW_DAYS, rollup_days=ACTIVITY_ROLLUP_DAYS,
+                      ahead=ACTIVITY_PARTITIONS_AHEAD):
+    """Run the whole daily job. Returns a summary dict."""
+    now = now or datetime.now(dt_timezone.utc)
+    today = now.astimezone(dt_timezone.utc).date()
+    summary = {
+        "legacy_rows_interned": intern_legacy_urls(),
+        "partitions_created": 0, "days_rolled_up": 0, "rollup_rows": 0, "rollups_expired": 0,
+    }
+
+    partitions = None
+    if _is_mysql():
+        summary["partitions_created"] = ensure_partitions(today, ahead)
+        partitions = set(partition_days() or ())
+
+    for day in stale_days(today, raw_days, partitions):
+        if partitions is not None and day in partitions:
+            summary["rollup_rows"] += rollup_day(day)
+            drop_raw_day(day, partitioned=True)
+        else:
+            with transaction.atomic():
+                summary["rollup_rows"] += rollup_day(day, replace=False)
+                drop_raw_day(day, partitioned=False)
+        summary["days_rolled_up"] += 1
+
+    expire_before = _day_bounds(today - timedelta(days=rollup_days))[0]
+    summary["rollups_expired"], _ = UserActivityRollup.objects.filter(hour__lt=expire_before).delete()
+    return summary
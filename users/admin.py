@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 from .models import *
+from .heartbeat import heartbeats
 
 class UserAdmin(BaseUserAdmin):
     # Fields to display in the admin interface
@@ -34,7 +35,7 @@ admin.site.register(User, UserAdmin)
 
 @admin.register(UserOpenAccount)
 class UserOpenAccountAdmin(admin.ModelAdmin):
-    list_display = ("uuid", "user", "ip_address", "device", "browser", "os", "first_seen_at", "last_seen_at", "status")
+    list_display = ("uuid", "user", "ip_address", "device", "browser", "os", "first_seen_at", "last_seen", "status")
     list_filter = ("status", "os", "browser", "device", "first_seen_at")
     search_fields = ("id", "ip_address", "user_agent", "device", "browser", "os")
     readonly_fields = ("id", "first_seen_at", "last_seen_at")
@@ -45,10 +46,26 @@ class UserOpenAccountAdmin(admin.ModelAdmin):
         ("Activity", {"fields": ("first_seen_at", "last_seen_at")}),
         ("Status", {"fields": ("status",)}),
     )
+
+    @admin.display(description="Last seen", ordering="last_seen_at")
+    def last_seen(self, obj):
+        # last_seen_at is persisted once per heartbeat window; merge the live value
+        return heartbeats.last_seen(obj)
     
 @admin.register(UserActivityLog)
 class UserActivityLogAdmin(admin.ModelAdmin):
-    list_display = ("user", "url", "timestamp")  # Columns to show in the list view
-    search_fields = ("user__id", "url")  # Searchable fields
+    list_display = ("user", "route", "timestamp")  # Columns to show in the list view
+    search_fields = ("user__id", "route__pattern")  # Searchable fields
     list_filter = ("timestamp",)  # Filters for date/time
-    ordering = ("-timestamp",)
\ No newline at end of file
+    list_select_related = ("route",)
+    ordering = ("-timestamp",)
+    show_full_result_count = False  # Skip COUNT(*) over every partition
+
+
+@admin.register(UserActivityRollup)
+class UserActivityRollupAdmin(admin.ModelAdmin):
+    list_display = ("user", "route", "hour", "count")
+    search_fields = ("user__id", "route__pattern")
+    list_filter = ("hour",)
+    list_select_related = ("route",)
+    ordering = ("-hour",)
@@ -0,0 +1,146 @@
+"""
+Per-request authentication context.
+
+The bearer token is parsed and validated once per request. get_auth_context()
+keeps the result on the underlying HttpRequest, so UserActivityMiddleware, the
+DRF authentication classes (users/middleware.py) and views that look at the
+token themselves all share it. The registered user behind a user token is
+resolved at most once, and so is the open account behind a guest token, both
+through the principal cache (users/principals.py), so a steady-state request
+makes no authentication queries.
+
+Guest tokens are simplejwt access tokens carrying `is_guest` and
+`open_account_id` claims; user tokens carry the USER_ID_CLAIM.
+"""
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import ExpiredTokenError, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .principals import get_open_account, get_user
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        """JWTAuthentication.get_user, served from the principal cache."""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken("Token contained no recognizable user identification") from e
+
+        user = get_user(user_id)
+        if user is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
+
+
+_jwt_authentication = CachedUserJWTAuthentication()
+
+
+class AuthContext:
+    def __init__(self, request):
+        self.raw_token = None   # the bearer token as sent
+        self.token = None       # validated simplejwt token
+        self.expired = False
+        self._error = None      # AuthenticationFailed JWTAuthentication would raise
+        self._user_result = None
+        self._user_resolved = False
+
+        header = _jwt_authentication.get_header(request)
+        if header is None:
+            return
+        try:
+            raw_token = _jwt_authentication.get_raw_token(header)
+        except AuthenticationFailed as e:
+            self._error = e
+            return
+        if raw_token is None:
+            return
+        self.raw_token = raw_token.decode() if isinstance(raw_token, bytes) else raw_token
+        self._validate(raw_token)
+
+    def _validate(self, raw_token):
+        # Same rules and error as JWTAuthentication.get_validated_token
+        messages = []
+        for token_class in api_settings.AUTH_TOKEN_CLASSES:
+            try:
+                self.token = token_class(raw_token)
+                return
+            except TokenError as e:
+                self.expired = self.expired or isinstance(e, ExpiredTokenError)
+                messages.append({
+                    "token_class": token_class.__name__,
+                    "token_type": token_class.token_type,
+                    "message": e.args[0],
+                })
+        self._error = InvalidToken({
+            "detail": "Given token not valid for any token type",
+            "messages": messages,
+        })
+
+    @property
+    def claims(self):
+        return self.token.payload if self.token is not None else {}
+
+    @property
+    def guest_uuid(self):
+        """open_account_id of a valid guest token, else None."""
+        if self.claims.get("is_guest") is True and self.claims.get("open_account_id"):
+            return str(self.claims["open_account_id"])
+        return None
+
+    def authenticate_user(self):
+        """
+        (user, validated token), or None without a bearer token, raising what
+        JWTAuthentication.authenticate would raise. Resolved once per request.
+        """
+        if not self._user_resolved:
+            try:
+                self._user_result = self._authenticate_user()
+            except AuthenticationFailed as e:
+                self._user_result = e
+            self._user_resolved = True
+        if isinstance(self._user_result, AuthenticationFailed):
+            raise self._user_result
+        return self._user_result
+
+    def _authenticate_user(self):
+        if self._error is not None:
+            raise self._error
+        if self.token is None:
+            return None
+        return _jwt_authentication.get_user(self.token), self.token
+
+    @property
+    def user(self):
+        """The registered user behind the token, or None."""
+        try:
+            result = self.authenticate_user()
+        except AuthenticationFailed:
+            return None
+        return result[0] if result else None
+
+    @cached_property
+    def guest(self):
+        """The active open account behind a guest token, or None."""
+        if self.guest_uuid is None:
+            return None
+        account = get_open_account(self.guest_uuid)
+        return account if account is not None and account.status == 'active' else None
+
+
+def get_auth_context(request):
+    """The request's AuthContext; accepts a Django HttpRequest or a DRF Request."""
+    request = getattr(request, '_request', request)
+    context = getattr(request, '_auth_context', None)
+    if context is None:
+        context = request._auth_context = AuthContext(request)
+    return context
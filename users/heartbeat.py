@@ -0,0 +1,188 @@
+"""
+Coalesced last_seen_at heartbeats for open accounts.
+
+The activity flusher (users/activity.py) reports every account it saw with
+beat(). The latest time per account goes into a Redis hash at once, and the
+account is marked dirty in a sorted set scored by when it became dirty.
+flush_due() moves accounts that have been dirty for HEARTBEAT_WINDOW seconds
+to MySQL with one UPDATE ... CASE, so a busy account's row is written at most
+once per window instead of on every request. A batch is only removed from Redis
+after that UPDATE succeeds, and only for accounts not beaten again since it was
+read. A failed write leaves the batch dirty for the next flush.
+
+UserOpenAccount.last_seen_at can therefore lag by up to a window. Readers that
+need the live value merge it in with last_seen_map() / last_seen(). If Redis is
+unavailable, beats are written straight to MySQL.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Case, DateTimeField, Value, When
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .models import UserOpenAccount
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_WINDOW = getattr(settings, 'USER_HEARTBEAT_WINDOW', 60)
+HEARTBEAT_FLUSH_BATCH = 1000
+
+LAST_SEEN_KEY = "users:heartbeat:last_seen"
+DIRTY_KEY = "users:heartbeat:dirty"
+
+# KEYS[1] last-seen hash, KEYS[2] dirty set
+# ARGV: account_id, timestamp pairs. Keeps the latest timestamp per account
+# and marks it dirty unless it already is.
+BEAT_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local current = redis.call('HGET', KEYS[1], ARGV[i])
+    if not current or tonumber(ARGV[i + 1]) > tonumber(current) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    redis.call('ZADD', KEYS[2], 'NX', ARGV[i + 1], ARGV[i])
+end
+return 0
+"""
+
+# KEYS[1] last-seen hash, KEYS[2] dirty set
+# ARGV[1] dirty-since cutoff, ARGV[2] batch size
+# Reads up to a batch of accounts dirty since before the cutoff without
+# removing them: account_id, timestamp pairs.
+DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local result = {}
+for _, account_id in ipairs(due) do
+    local seen = redis.call('HGET', KEYS[1], account_id)
+    if seen then
+        table.insert(result, account_id)
+        table.insert(result, seen)
+    else
+        redis.call('ZREM', KEYS[2], account_id)
+    end
+end
+return result
+"""
+
+# KEYS[1] last-seen hash, KEYS[2] dirty set
+# ARGV: account_id, timestamp pairs that were persisted. Clears each account
+# unless it was beaten again since: that newer time stays dirty.
+# Returns the number of accounts cleared.
+ACK_SCRIPT = """
+local cleared = 0
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+        redis.call('ZREM', KEYS[2], ARGV[i])
+        cleared = cleared + 1
+    end
+end
+return cleared
+"""
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(float(timestamp), tz=dt_timezone.utc)
+
+
+def persist_last_seen(last_seen):
+    """Write {account id: datetime} to MySQL with one UPDATE ... CASE."""
+    if not last_seen:
+        return 0
+    return UserOpenAccount.objects.filter(pk__in=list(last_seen)).update(last_seen_at=Case(
+        *[When(pk=pk, then=Value(seen)) for pk, seen in last_seen.items()],
+        output_field=DateTimeField(),
+    ))
+
+
+class HeartbeatTracker:
+    _beat_script = None
+    _due_script = None
+    _ack_script = None
+
+    def __init__(self, window=HEARTBEAT_WINDOW, connection=None):
+        self.window = window
+        self._redis = connection
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    def _scripts(self):
+        if HeartbeatTracker._beat_script is None:
+            HeartbeatTracker._beat_script = self.redis.register_script(BEAT_SCRIPT)
+            HeartbeatTracker._due_script = self.redis.register_script(DUE_SCRIPT)
+            HeartbeatTracker._ack_script = self.redis.register_script(ACK_SCRIPT)
+        return HeartbeatTracker._beat_script, HeartbeatTracker._due_script, HeartbeatTracker._ack_script
+
+    def beat(self, last_seen):
+        """Record {account id: datetime} for accounts just seen."""
+        if not last_seen:
+            return
+        args = []
+        for pk, seen in last_seen.items():
+            args.extend((pk, seen.timestamp()))
+        try:
+            beat_script, _, _ = self._scripts()
+            beat_script(keys=[LAST_SEEN_KEY, DIRTY_KEY], args=args, client=self.redis)
+        except RedisError as e:
+            logger.warning("Heartbeat: Redis unavailable, writing %s account(s) directly: %s", len(last_seen), e)
+            persist_last_seen(last_seen)
+
+    def flush_due(self, now=None, force=False):
+        """
+        Persist accounts dirty for at least a window (every dirty account with
+        `force`). Returns the number of accounts written. If the UPDATE fails
+        the batch stays dirty in Redis and the error propagates.
+        """
+        now = now or datetime.now(dt_timezone.utc)
+        cutoff = '+inf' if force else (now.timestamp() - self.window)
+        written = 0
+        try:
+            _, due_script, ack_script = self._scripts()
+            while True:
+                due = due_script(
+                    keys=[LAST_SEEN_KEY, DIRTY_KEY], args=[cutoff, HEARTBEAT_FLUSH_BATCH], client=self.redis,
+                )
+                if not due:
+                    break
+                written += persist_last_seen({
+                    int(due[i]): _to_datetime(due[i + 1]) for i in range(0, len(due), 2)
+                })
+                cleared = ack_script(keys=[LAST_SEEN_KEY, DIRTY_KEY], args=due, client=self.redis)
+                # Accounts beaten again meanwhile stay at the front; they go next flush
+                if len(due) < 2 * HEARTBEAT_FLUSH_BATCH or cleared < len(due) // 2:
+                    break
+        except RedisError as e:
+            logger.warning("Heartbeat: flush failed: %s", e)
+        return written
+
+    def pending(self, account_ids):
+        """{account id: datetime} for accounts seen since their last persisted write."""
+        account_ids = list(account_ids)
+        if not account_ids:
+            return {}
+        try:
+            values = self.redis.hmget(LAST_SEEN_KEY, account_ids)
+        except RedisError as e:
+            logger.warning("Heartbeat: could not read pending values: %s", e)
+            return {}
+        return {pk: _to_datetime(value) for pk, value in zip(account_ids, values) if value is not None}
+
+    def last_seen_map(self, accounts):
+        """{account id: freshest last_seen_at} for UserOpenAccount instances."""
+        accounts = list(accounts)
+        merged = {account.pk: account.last_seen_at for account in accounts}
+        for pk, seen in self.pending(merged).items():
+            if merged[pk] is None or seen > merged[pk]:
+                merged[pk] = seen
+        return merged
+
+    def last_seen(self, account):
+        return self.last_seen_map([account])[account.pk]
+
+
+heartbeats = HeartbeatTracker()
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from users.activity_storage import (
+    ACTIVITY_PARTITIONS_AHEAD,
+    ACTIVITY_RAW_DAYS,
+    ACTIVITY_ROLLUP_DAYS,
+    maintain_activity,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Daily activity storage job: create upcoming day partitions (MySQL), roll raw "
+        "activity older than the raw window into hourly counts and drop those days, "
+        "expire old rollups, and resolve rows that still carry a path from before "
+        "routes were interned. The first run on MySQL partitions the existing table, "
+        "which rebuilds it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--raw-days', type=int, default=ACTIVITY_RAW_DAYS,
+            help="Days of raw activity to keep (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--rollup-days', type=int, default=ACTIVITY_ROLLUP_DAYS,
+            help="Days of hourly rollups to keep (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--ahead', type=int, default=ACTIVITY_PARTITIONS_AHEAD,
+            help="Days of partitions to create ahead of today (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        summary = maintain_activity(
+            raw_days=options['raw_days'],
+            rollup_days=options['rollup_days'],
+            ahead=options['ahead'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Interned {summary['legacy_rows_interned']} legacy row(s), "
+            f"created {summary['partitions_created']} partition(s), rolled up "
+            f"{summary['days_rolled_up']} day(s) into {summary['rollup_rows']} hourly row(s), "
+            f"expired {summary['rollups_expired']} rollup row(s)."
+        ))
@@ -1,7 +1,9 @@
 import uuid
 from uuid import UUID
 from django.utils.timezone import now
-from .models import UserOpenAccount, UserActivityLog
+from .models import UserOpenAccount
+from .activity import ActivityEvent, activity_pipeline, ensure_guest_account
+from .auth_context import get_auth_context
 from user_agents import parse
 from rest_framework.authentication import BaseAuthentication
 from rest_framework_simplejwt.authentication import JWTAuthentication
@@ -11,77 +13,53 @@ from jwt.exceptions import InvalidTokenError
 from django.conf import settings
 import jwt
 
+# Admin and file requests are not user activity
+UNTRACKED_PATHS = ('/admin', '/static', '/media')
+
+
 class UserActivityMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        user_account = None
-
-        if request.user.is_authenticated:
-            # Link to registered user’s open account (if one exists or create one)
-            user_account, _ = UserOpenAccount.objects.get_or_create(
-                user=request.user,
-                defaults={
-                    "uuid": str(uuid.uuid4()),
-                    "ip_address": self.get_client_ip(request),
-                    "user_agent": request.META.get("HTTP_USER_AGENT", ""),
-                    "device": "Unknown",
-                    "browser": "Unknown",
-                    "os": "Unknown",
-                    "first_seen_at": now(),
-                    "last_seen_at": now(),
-                    "status": "active",
-                }
-            )
-        else:
-            # Try to get guest info from Authorization header
-            guest_id = self.extract_guest_id_from_jwt(request)
-            if guest_id:
-                user_account, _ = UserOpenAccount.objects.get_or_create(
-                    uuid=guest_id,
-                    defaults={
-                        "ip_address": self.get_client_ip(request),
-                        "user_agent": request.META.get("HTTP_USER_AGENT", ""),
-                        "device": "Unknown",
-                        "browser": "Unknown",
-                        "os": "Unknown",
-                        "first_seen_at": now(),
-                        "last_seen_at": now(),
-                        "status": "active",
-                    }
-                )
-            else:
-                # Generate a unique guest ID based on the IP address (only for new guests)
-                guest_id = self.generate_guest_id(request)
-                user_account, _ = UserOpenAccount.objects.get_or_create(
-                    uuid=guest_id,
-                    defaults={
-                        "ip_address": self.get_client_ip(request),
-                        "user_agent": request.META.get("HTTP_USER_AGENT", ""),
-                        "device": "Unknown",
-                        "browser": "Unknown",
-                        "os": "Unknown",
-                        "first_seen_at": now(),
-                        "last_seen_at": now(),
-                        "status": "active",
-                    }
-                )
-
-        if user_account:
-            user_account.last_seen_at = now()
-            user_account.save(update_fields=["last_seen_at"])
-
-            # Log activity
-            UserActivityLog.objects.create(
-                user=user_account,
-                url=request.path,
-                timestamp=now()
-            )
-
+        if request.path.startswith(UNTRACKED_PATHS):
+            return self.get_response(request)
+        event = self.activity_event(request)
         response = self.get_response(request)
+        self.record_activity(request, event)
         return response
 
+    def activity_event(self, request):
+        """Identify the visitor before the view runs, as guest authentication relies on it."""
+        user_id = None
+        token_guest_id = None
+        guest_id = None
+        token_user = None if request.user.is_authenticated else get_auth_context(request).user
+        if request.user.is_authenticated or token_user is not None:
+            # Logged against the registered user's open account (created if missing)
+            user_id = (token_user or request.user).pk
+        else:
+            # Guest id from the Authorization header, or derived from the IP address
+            token_guest_id = self.extract_guest_id_from_jwt(request)
+            guest_id = token_guest_id or self.generate_guest_id(request)
+
+        event = ActivityEvent(
+            user_id=user_id,
+            guest_uuid=guest_id,
+            ip_address=self.get_client_ip(request),
+            user_agent=request.META.get("HTTP_USER_AGENT", ""),
+            route=None,
+            timestamp=now(),
+        )
+        if token_guest_id:
+            ensure_guest_account(event)
+        return event
+
+    def record_activity(self, request, event):
+        """Queue the visit under its URL pattern; users/activity.py writes it in the background."""
+        match = getattr(request, "resolver_match", None)
+        activity_pipeline.record(event._replace(route=match.route if match else None))
+
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
         if x_forwarded_for:
@@ -89,22 +67,7 @@ class UserActivityMiddleware:
         return request.META.get("REMOTE_ADDR")
 
     def extract_guest_id_from_jwt(self, request):
-        auth_header = request.headers.get("Authorization", "")
-        if not auth_header.startswith("Bearer "):
-            return None
-
-        token = auth_header.split("Bearer ")[1].strip()
-        try:
-            decoded = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            if decoded.get("is_guest") is True and decoded.get("open_account_id"):
-                return decoded["open_account_id"]
-        except jwt.ExpiredSignatureError:
-            # Optional: log or return a specific error
-            return None
-        except jwt.DecodeError:
-            return None
-        except jwt.InvalidTokenError:
-            return None
+        return get_auth_context(request).guest_uuid
 
     def generate_guest_id(self, request):
         """Generate a unique guest ID based on the IP address."""
@@ -137,32 +100,25 @@ class GuestAuthentication(BaseAuthentication):
 
 
 
+class RequestJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication reusing the token validated once for the request (users/auth_context.py)."""
+    def authenticate(self, request):
+        return get_auth_context(request).authenticate_user()
+
+
 class CombinedJWTOrGuestAuthentication(BaseAuthentication):
     def authenticate(self, request):
-        jwt_auth = JWTAuthentication()
+        context = get_auth_context(request)
 
-        try:
-            user_auth = jwt_auth.authenticate(request)
-            if user_auth is not None:
-                user, _ = user_auth
-                request.user = user
-                return (user, None)
-        except AuthenticationFailed:
-            pass
+        user = context.user
+        if user is not None:
+            request.user = user
+            return (user, None)
 
         # Guest Authentication
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.split(" ")[1]
-            try:
-                decoded = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-                if decoded.get("is_guest") is True and decoded.get("open_account_id"):
-                    guest_id = decoded["open_account_id"]
-                    guest_user = UserOpenAccount.objects.filter(uuid=guest_id, status='active').first()
-                    if guest_user:
-                        request.user = guest_user
-                        return (guest_user, None)
-            except (jwt.ExpiredSignatureError, jwt.DecodeError, jwt.InvalidTokenError):
-                pass
+        guest_user = context.guest
+        if guest_user:
+            request.user = guest_user
+            return (guest_user, None)
 
         return None
\ No newline at end of file
@@ -1,9 +1,21 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+from django.db.utils import IntegrityError
 from django.contrib.auth.models import PermissionsMixin
 from django.utils.timezone import now
 
 
+def participant_key(user_id=None, guest_user_id=None):
+    """Stable, non-null key for a participant: "u:<user_id>" or "g:<guest_user_id>"."""
+    if user_id:
+        return f"u:{user_id}"
+    if guest_user_id:
+        return f"g:{guest_user_id}"
+    raise ValueError("Either user_id or guest_user_id must be provided.")
+
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -74,15 +86,134 @@ class UserOpenAccount(models.Model):
         return False
 
 
+class ParticipantStats(models.Model):
+    """
+    Running per-participant totals over every attempt in a scope (sum of
+    scores, number of attempts, first attempt date).
+
+    Concrete subclasses add the scope foreign key, name it in `scope`, and
+    declare their own unique (scope, participant) key and ranking index.
+    `users.participant_stats.ParticipantStatsCommand` rebuilds or verifies
+    them against the raw attempts.
+    """
+    scope = None
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    guest_user = models.ForeignKey(UserOpenAccount, on_delete=models.CASCADE, null=True, blank=True)
+    # "u:<user_id>" or "g:<guest_user_id>"; non-null so the unique key holds in MySQL
+    participant = models.CharField(max_length=32)
+
+    total_score = models.FloatField(default=0, help_text="Sum of scores across all attempts.")
+    attempts = models.PositiveIntegerField(default=0, help_text="Number of attempts started.")
+    first_attempt_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.participant} - {getattr(self, f'{self.scope}_id')} - Total: {self.total_score}"
+
+    @classmethod
+    def record(cls, attempt, score, started=False):
+        """
+        Add `score` to the attempt's participant, counting the attempt too when
+        `started`. Creates the participant's row if it is missing, counting the
+        attempt either way. Call inside the attempt's transaction.
+        """
+        key = participant_key(attempt.user_id, attempt.guest_user_id)
+        scope = {f'{cls.scope}_id': getattr(attempt, f'{cls.scope}_id')}
+        rows = cls.objects.filter(participant=key, **scope)
+        changes = {'total_score': F('total_score') + score}
+        if started:
+            changes['attempts'] = F('attempts') + 1
+        if rows.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    **scope,
+                    user_id=attempt.user_id,
+                    guest_user_id=attempt.guest_user_id,
+                    participant=key,
+                    total_score=score,
+                    attempts=1,
+                    first_attempt_date=attempt.attempt_date,
+                )
+        except IntegrityError:
+            # A concurrent attempt created the row first
+            rows.update(**changes)
+
+    @classmethod
+    def merge_guest(cls, guest_user, user):
+        """Fold a guest's totals into the user that took over its attempts."""
+        key = participant_key(user.pk)
+        scope_field = f'{cls.scope}_id'
+        for stats in cls.objects.filter(participant=participant_key(guest_user_id=guest_user.pk)):
+            merged = cls.objects.filter(**{scope_field: getattr(stats, scope_field)}, participant=key).update(
+                total_score=F('total_score') + stats.total_score,
+                attempts=F('attempts') + stats.attempts,
+                first_attempt_date=Least('first_attempt_date', stats.first_attempt_date),
+            )
+            if merged:
+                stats.delete()
+            else:
+                cls.objects.filter(pk=stats.pk).update(user=user, guest_user=None, participant=key)
+
+
+class ActivityRoute(models.Model):
+    """An interned URL pattern, e.g. "api/quiz/items/<int:item_id>/bundle/"."""
+    pattern = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        db_table = "tbl_activity_route"
+
+    def __str__(self):
+        return self.pattern
 
 
 class UserActivityLog(models.Model):
-    user = models.ForeignKey(UserOpenAccount, on_delete=models.CASCADE, related_name="activities")
-    url = models.CharField(max_length=2048)  # Store the visited URL
+    # Partitioned by day on MySQL (users/activity_storage.py). InnoDB can't
+    # partition a table that has foreign key constraints.
+    user = models.ForeignKey(
+        UserOpenAccount, on_delete=models.CASCADE, related_name="activities",
+        db_constraint=False, db_index=False,
+    )
+    # Null when the path matched no route
+    route = models.ForeignKey(
+        ActivityRoute, on_delete=models.PROTECT, null=True, blank=True, related_name="+",
+        db_constraint=False,
+    )
+    # The visited path, only set on rows written before routes were interned.
+    # maintain_activity() resolves it to a route and clears it.
+    url = models.CharField(max_length=2048, null=True, blank=True)
     timestamp = models.DateTimeField(default=now)  # Store time of visit
 
     class Meta:
         db_table = "tbl_user_activity"
+        indexes = [
+            models.Index(fields=["timestamp"], name="user_activity_ts_idx"),
+            models.Index(fields=["user", "timestamp"], name="user_activity_user_ts_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} visited {self.route or 'an unknown route'} at {self.timestamp}"
+
+
+class UserActivityRollup(models.Model):
+    """Requests per account, route and hour, for days past the raw activity window."""
+    user = models.ForeignKey(UserOpenAccount, on_delete=models.CASCADE, related_name="activity_rollups")
+    route = models.ForeignKey(ActivityRoute, on_delete=models.PROTECT, null=True, blank=True, related_name="+")
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = "tbl_user_activity_hourly"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "route", "hour"], name="user_activity_hourly_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["hour"], name="user_activity_hourly_hour_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.user.id} visited {self.url} at {self.timestamp}"
\ No newline at end of file
+        return f"{self.user_id} visited {self.route or 'an unknown route'} {self.count} time(s) at {self.hour}"
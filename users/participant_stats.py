@@ -0,0 +1,110 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+
+from .models import participant_key
+
+BATCH_SIZE = 1000
+
+
+class ParticipantStatsCommand(BaseCommand):
+    """
+    Backfill a ParticipantStats model from its raw attempts, or compare the
+    two with --verify. Subclasses set `model` and `attempt_model`; both share
+    the stats model's scope foreign key.
+    """
+    model = None
+    attempt_model = None
+
+    def add_arguments(self, parser):
+        scope = self.model.scope
+        parser.add_argument(
+            f'--{scope}', type=int, action='append', dest='scope_ids', metavar='ID',
+            help=f"{scope.title()} ID to process (repeatable). Defaults to every {scope}.",
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Report mismatches between the stats table and the raw attempts without writing.",
+        )
+
+    def in_scope(self, queryset, scope_ids):
+        if scope_ids:
+            queryset = queryset.filter(**{f'{self.model.scope}_id__in': scope_ids})
+        return queryset
+
+    def aggregated_attempts(self, scope_ids):
+        """
+        Totals per (scope, participant). Guest attempts taken over by a
+        registered user count towards the user.
+        """
+        attempts = self.in_scope(self.attempt_model.objects.all(), scope_ids)
+        totals = dict(total_score=Sum('score'), attempts=Count('id'), first_attempt_date=Min('attempt_date'))
+        for participants, group in (
+            (attempts.filter(user__isnull=False), 'user_id'),
+            (attempts.filter(user__isnull=True, guest_user__isnull=False), 'guest_user_id'),
+        ):
+            rows = participants.values(f'{self.model.scope}_id', group).annotate(**totals).order_by()
+            yield from rows.iterator(chunk_size=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify(options['scope_ids'])
+        else:
+            self.backfill(options['scope_ids'])
+
+    def backfill(self, scope_ids):
+        created = 0
+        with transaction.atomic():
+            self.in_scope(self.model.objects.all(), scope_ids).delete()
+            batch = []
+            for row in self.aggregated_attempts(scope_ids):
+                batch.append(self.model(
+                    participant=participant_key(row.get('user_id'), row.get('guest_user_id')),
+                    **row,
+                ))
+                if len(batch) >= BATCH_SIZE:
+                    self.model.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                self.model.objects.bulk_create(batch)
+                created += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {created} participant stats rows."))
+
+    def verify(self, scope_ids):
+        scope = self.model.scope
+        stored = {
+            (row[f'{scope}_id'], row['participant']): row
+            for row in self.in_scope(self.model.objects.all(), scope_ids).values(
+                f'{scope}_id', 'participant', 'total_score', 'attempts', 'first_attempt_date',
+            )
+        }
+
+        mismatches = 0
+        for row in self.aggregated_attempts(scope_ids):
+            key = (row[f'{scope}_id'], participant_key(row.get('user_id'), row.get('guest_user_id')))
+            entry = stored.pop(key, None)
+            if entry is None:
+                mismatches += 1
+                self.stdout.write(f"Missing: {scope} {key[0]} participant {key[1]}")
+            elif (
+                abs(entry['total_score'] - (row['total_score'] or 0)) > 1e-6
+                or entry['attempts'] != row['attempts']
+                or entry['first_attempt_date'] != row['first_attempt_date']
+            ):
+                mismatches += 1
+                self.stdout.write(
+                    f"Drift: {scope} {key[0]} participant {key[1]} "
+                    f"stored=({entry['total_score']}, {entry['attempts']}, {entry['first_attempt_date']}) "
+                    f"actual=({row['total_score']}, {row['attempts']}, {row['first_attempt_date']})"
+                )
+
+        for scope_id, participant in stored:
+            mismatches += 1
+            self.stdout.write(f"Orphan: {scope} {scope_id} participant {participant}")
+
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f"{mismatches} mismatch(es) found."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Participant stats match the raw attempts."))
@@ -0,0 +1,21 @@
+"""
+Drops cached principals (users/principals.py) when their rows change.
+Connected by UsersConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User, UserOpenAccount
+from .principals import invalidate_open_accounts, invalidate_user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_principal(sender, instance, **kwargs):
+    invalidate_user(instance)
+
+
+@receiver(post_save, sender=UserOpenAccount)
+@receiver(post_delete, sender=UserOpenAccount)
+def invalidate_open_account_principal(sender, instance, **kwargs):
+    invalidate_open_accounts([instance])
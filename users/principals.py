@@ -0,0 +1,127 @@
+"""
+Cached principals for token authentication.
+
+Once a token is verified, users/auth_context.py still needs the User behind a
+user token, or the UserOpenAccount behind a guest token. Both are cached in two
+tiers:
+
+    a process-local LRU, trusted for PRINCIPAL_LOCAL_TTL seconds
+    the default cache (Redis), for PRINCIPAL_CACHE_TIMEOUT seconds
+
+A User is cached with every concrete field except the password hash, so views
+serializing request.user (profile_image, last_login) make no deferred-field
+queries. The hash is only included when tokens are checked against it. An open
+account only carries the fields authorization needs; the rest are deferred and
+load on demand.
+
+Each principal has a generation stamp next to its entry, and an entry is only
+served while the stamp it was stored under is current. The receivers in
+users/principal_signals.py replace the stamp whenever a User or
+UserOpenAccount is saved or deleted, including status changes. That orphans
+the entry, and also any row a concurrent reader loaded before the write and
+stores after it.
+Every process then sees a change such as blocking an account within
+PRINCIPAL_LOCAL_TTL seconds. Writes made with queryset.update() skip the
+signals and are picked up once the Redis entry expires.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework_simplejwt.settings import api_settings
+
+from quiz.utils.lru import LRUCache
+from .models import User, UserOpenAccount
+
+PRINCIPAL_LOCAL_TTL = getattr(settings, 'USER_PRINCIPAL_LOCAL_TTL', 5)
+PRINCIPAL_CACHE_TIMEOUT = getattr(settings, 'USER_PRINCIPAL_CACHE_TIMEOUT', 60 * 5)
+PRINCIPAL_LRU_SIZE = getattr(settings, 'USER_PRINCIPAL_LRU_SIZE', 10000)
+
+USER_FIELDS = tuple(
+    f.attname for f in User._meta.concrete_fields
+    # The hash is only needed to check the token's revoke claim against it
+    if f.attname != 'password' or api_settings.CHECK_REVOKE_TOKEN
+)
+OPEN_ACCOUNT_FIELDS = ('id', 'uuid', 'user_id', 'status')
+
+
+class PrincipalCache:
+    def __init__(self, model, lookup, fields, prefix):
+        self.model = model
+        self.lookup = lookup
+        # from_db() expects values in model field order
+        wanted = {lookup, *fields}
+        self.fields = tuple(f.attname for f in model._meta.concrete_fields if f.attname in wanted)
+        self.prefix = prefix
+        self._local = LRUCache(maxsize=PRINCIPAL_LRU_SIZE, ttl=PRINCIPAL_LOCAL_TTL)
+
+    def _key(self, value):
+        return f"users:principal:{self.prefix}:{value}"
+
+    def _stamp_key(self, value):
+        return f"users:principal:{self.prefix}:{value}:stamp"
+
+    def get(self, value):
+        """A model instance with the cached fields loaded, or None if there is no such row."""
+        value = str(value)
+        row = self._local.get(value)
+        if row is None:
+            row = self._get_shared(value)
+            if row is None:
+                return None
+            self._local.set(value, row)
+        return self.model.from_db(DEFAULT_DB_ALIAS, self.fields, row)
+
+    def _get_shared(self, value):
+        key, stamp_key = self._key(value), self._stamp_key(value)
+        found = cache.get_many([key, stamp_key])
+        stamp, entry = found.get(stamp_key), found.get(key)
+        if entry is not None and stamp is not None and entry[0] == stamp:
+            return entry[1]
+
+        # Take the stamp before reading the row: if a write lands in between it
+        # replaces the stamp, and the entry stored below is never served
+        if stamp is None:
+            cache.add(stamp_key, uuid.uuid4().hex, PRINCIPAL_CACHE_TIMEOUT)
+            stamp = cache.get(stamp_key)
+        row = self.model.objects.filter(**{self.lookup: value}).values_list(*self.fields).first()
+        if row is not None and stamp is not None:
+            cache.set(key, (stamp, row), PRINCIPAL_CACHE_TIMEOUT)
+        return row
+
+    def invalidate(self, values):
+        values = [str(value) for value in values if value is not None]
+        if not values:
+            return
+        for value in values:
+            self._local.delete(value)
+
+        def drop():
+            for value in values:
+                self._local.delete(value)
+            cache.set_many(
+                {self._stamp_key(value): uuid.uuid4().hex for value in values}, PRINCIPAL_CACHE_TIMEOUT,
+            )
+            cache.delete_many([self._key(value) for value in values])
+        transaction.on_commit(drop)
+
+
+users = PrincipalCache(User, api_settings.USER_ID_FIELD, USER_FIELDS, 'user')
+open_accounts = PrincipalCache(UserOpenAccount, 'uuid', OPEN_ACCOUNT_FIELDS, 'guest')
+
+
+def get_user(user_id):
+    return users.get(user_id)
+
+
+def get_open_account(guest_uuid):
+    return open_accounts.get(guest_uuid)
+
+
+def invalidate_user(user):
+    users.invalidate([getattr(user, api_settings.USER_ID_FIELD, None)])
+
+
+def invalidate_open_accounts(accounts):
+    open_accounts.invalidate([account.uuid for account in accounts])
@@ -62,6 +62,14 @@ class UserOpenAccountSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserOpenAccount
         fields = "__all__"
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Live heartbeat values, when the view merged them in (users/heartbeat.py)
+        last_seen = self.context.get("last_seen", {}).get(instance.pk)
+        if last_seen is not None:
+            data["last_seen_at"] = serializers.DateTimeField().to_representation(last_seen)
+        return data
         
         
 class UserProfileSerializer(serializers.ModelSerializer):
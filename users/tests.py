@@ -1,3 +1,97 @@
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipIf
+
+from django.db import DatabaseError
 from django.test import TestCase
 
-# Create your tests here.
+from . import heartbeat
+from .heartbeat import HeartbeatTracker
+from .models import UserOpenAccount
+
+try:
+    import fakeredis
+except ImportError:  # optional, only needed for the heartbeat tests
+    fakeredis = None
+
+T0 = datetime(2026, 1, 1, 12, 0, 0, tzinfo=dt_timezone.utc)
+
+
+@skipIf(fakeredis is None, "fakeredis is not installed")
+class HeartbeatTrackerTests(TestCase):
+    def setUp(self):
+        for _ in range(3):
+            UserOpenAccount.objects.create(uuid=str(uuid.uuid4()))
+        UserOpenAccount.objects.update(last_seen_at=T0 - timedelta(days=1))
+        self.accounts = list(UserOpenAccount.objects.order_by('pk'))
+        self.tracker = HeartbeatTracker(window=60, connection=fakeredis.FakeStrictRedis())
+
+    def stored(self, account):
+        return UserOpenAccount.objects.values_list('last_seen_at', flat=True).get(pk=account.pk)
+
+    def test_beats_within_a_window_are_written_once(self):
+        account = self.accounts[0]
+        for offset in (0, 10, 5):
+            self.tracker.beat({account.pk: T0 + timedelta(seconds=offset)})
+
+        self.assertEqual(self.tracker.flush_due(now=T0 + timedelta(seconds=30)), 0)
+        self.assertEqual(self.stored(account), T0 - timedelta(days=1))
+        self.assertEqual(self.tracker.last_seen(account), T0 + timedelta(seconds=10))
+
+        self.assertEqual(self.tracker.flush_due(now=T0 + timedelta(seconds=60)), 1)
+        self.assertEqual(self.stored(account), T0 + timedelta(seconds=10))
+        self.assertEqual(self.tracker.pending([account.pk]), {})
+
+    def test_window_starts_at_the_first_beat(self):
+        first, second = self.accounts[:2]
+        self.tracker.beat({first.pk: T0})
+        self.tracker.beat({second.pk: T0 + timedelta(seconds=45)})
+        self.tracker.beat({first.pk: T0 + timedelta(seconds=50)})
+
+        self.assertEqual(self.tracker.flush_due(now=T0 + timedelta(seconds=70)), 1)
+        self.assertEqual(self.stored(first), T0 + timedelta(seconds=50))
+        self.assertEqual(self.tracker.pending([first.pk, second.pk]), {second.pk: T0 + timedelta(seconds=45)})
+
+    def test_force_writes_every_dirty_account(self):
+        self.tracker.beat({account.pk: T0 for account in self.accounts})
+        self.assertEqual(self.tracker.flush_due(now=T0, force=True), 3)
+        self.assertEqual({self.stored(account) for account in self.accounts}, {T0})
+
+    def test_failed_write_keeps_the_batch(self):
+        account = self.accounts[0]
+        self.tracker.beat({account.pk: T0})
+        with mock.patch.object(heartbeat, 'persist_last_seen', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.tracker.flush_due(now=T0, force=True)
+        self.assertEqual(self.tracker.pending([account.pk]), {account.pk: T0})
+
+        self.assertEqual(self.tracker.flush_due(now=T0, force=True), 1)
+        self.assertEqual(self.stored(account), T0)
+
+    def test_beat_during_a_flush_stays_dirty(self):
+        account = self.accounts[0]
+        self.tracker.beat({account.pk: T0})
+        persist = heartbeat.persist_last_seen
+
+        def persist_then_beat(last_seen):
+            written = persist(last_seen)
+            self.tracker.beat({account.pk: T0 + timedelta(seconds=1)})
+            return written
+
+        with mock.patch.object(heartbeat, 'persist_last_seen', side_effect=persist_then_beat):
+            self.assertEqual(self.tracker.flush_due(now=T0, force=True), 1)
+        self.assertEqual(self.stored(account), T0)
+        self.assertEqual(self.tracker.pending([account.pk]), {account.pk: T0 + timedelta(seconds=1)})
+
+        # Still dirty since the first beat, so due on the next flush
+        self.assertEqual(self.tracker.flush_due(now=T0 + timedelta(seconds=60)), 1)
+        self.assertEqual(self.stored(account), T0 + timedelta(seconds=1))
+
+    def test_redis_down_writes_straight_to_mysql(self):
+        server = fakeredis.FakeServer()
+        server.connected = False
+        tracker = HeartbeatTracker(connection=fakeredis.FakeStrictRedis(server=server))
+        with self.assertLogs('users.heartbeat', 'WARNING'):
+            tracker.beat({self.accounts[0].pk: T0})
+            self.assertEqual(tracker.flush_due(force=True), 0)
+        self.assertEqual(self.stored(self.accounts[0]), T0)
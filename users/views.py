@@ -10,6 +10,7 @@ from .models import *
 from tournaments.models import *
 from django.db.models import Sum, F, Window
 from django.db.models.functions import Rank
+from quiz.ranking import Ranking
 
 User = get_user_model()
 
@@ -54,6 +55,7 @@ class UserRegistrationView(generics.CreateAPIView):
 
             # Transfer data
             QuizAttempt.objects.filter(guest_user=guest_user, user__isnull=True).update(user=user)
+            ItemParticipantStats.merge_guest(guest_user, user)
             UserActivityLog.objects.filter(user=guest_user, user__isnull=True).update(user=guest_user)
 
         return Response(
@@ -141,10 +143,18 @@ from rest_framework.permissions import IsAdminUser
 from .models import UserOpenAccount
 
 from .serializers import UserOpenAccountSerializer
+from .heartbeat import heartbeats
 class UserOpenAccountViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = UserOpenAccount.objects.all().order_by("-last_seen_at")
     serializer_class = UserOpenAccountSerializer
     permission_classes = [IsAdminUser] 
+
+    def get_serializer(self, *args, **kwargs):
+        if args:
+            accounts = args[0] if kwargs.get("many") else [args[0]]
+            kwargs.setdefault("context", self.get_serializer_context())
+            kwargs["context"]["last_seen"] = heartbeats.last_seen_map(accounts)
+        return super().get_serializer(*args, **kwargs)
     
     
 
@@ -210,49 +220,38 @@ class UserProfileView(APIView):
         # --- Active Tournament Stats ---
         
         # 1. Get all active tournaments
-        # Note: The custom manager should automatically update the status when the queryset is accessed.
-        active_tournaments = Tournament.objects.filter(status='active').prefetch_related('attempts')
+        # Filters on the schedule, so it doesn't matter whether the status scheduler has run yet.
+        active_tournaments = list(Tournament.objects.active())
         
         tournament_stats = []
         
+        # The user's running totals for those tournaments, in one query
+        user_stats = {
+            stats.tournament_id: stats
+            for stats in TournamentParticipantStats.objects.filter(tournament__in=active_tournaments, user=user)
+        }
+
         for tournament in active_tournaments:
             # 2. Get the current user's total score for this specific tournament
-            user_tournament_score = tournament.attempts.filter(user=user).aggregate(
-                total_score=Sum('score')
-            )['total_score'] or 0
-
-            # 3. Calculate all participants' total scores for this tournament
-            # We group by the user who made the attempt and sum their scores.
-            leaderboard_data = TournamentAttempt.objects.filter(
-                tournament=tournament,
-                is_completed=True # Only consider completed attempts for the leaderboard
-            ).values('user').annotate(
-                total_score=Sum('score')
-            ).order_by('-total_score')
-            
-            # Find the user's rank in the aggregated list
+            stats = user_stats.get(tournament.id)
+            user_tournament_score = stats.total_score if stats else 0
+
+            # 3. Rank among all participants; equal totals share a rank.
+            # Counted on tournament_stats_rank_idx instead of walking the leaderboard.
             user_rank = None
-            
-            # Simple ranking implementation (iterating through the data)
-            current_rank = 0
-            previous_score = None
-            
-            for i, entry in enumerate(leaderboard_data):
-                # Handle ties by keeping the same rank for the same score
-                if previous_score is None or entry['total_score'] < previous_score:
-                    current_rank = i + 1
-                
-                if entry['user'] == user.id:
-                    user_rank = current_rank
-                    break
-                
-                previous_score = entry['total_score']
+            if stats is not None:
+                ranking = Ranking(
+                    TournamentParticipantStats.objects.filter(tournament=tournament),
+                    ['-total_score'],
+                    method='rank',
+                )
+                user_rank = ranking.rank_for({'total_score': stats.total_score})
             
             tournament_stats.append({
                 'id': tournament.id,
                 'name': tournament.title,
                 'user_score': user_tournament_score,
-                'user_rank': user_rank or 'N/A' # N/A if user has no completed attempts
+                'user_rank': user_rank or 'N/A' # N/A if the user hasn't played this tournament
             })
 
 
@@ -7,6 +7,7 @@ from .models import WordPuzzle, Word, WordPuzzleAttempt
 from .serializers import *
 import random
 from users.models import *
+from users.auth_context import get_auth_context
 
 
 def get_request_user(request):
@@ -14,6 +15,11 @@ def get_request_user(request):
     if request.user.is_authenticated:
         return request.user, None
 
+    # Guest token, validated once for the request
+    guest = get_auth_context(request).guest
+    if guest is not None:
+        return None, guest
+
     # Guest system
     open_id = request.data.get("open_account_id") or request.query_params.get("open_account_id")
     if not open_id: